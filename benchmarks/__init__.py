@@ -0,0 +1,65 @@
+"""Benchmarks of the engine and the renderer.
+
+`benchmarks.micro` times single operations: board moves, collision, line
+clears, block coordinates and `game.Game.render_frame`. `benchmarks.games`
+plays whole games from the board fixtures of `benchmarks.fixtures` and
+reports games and pieces per second. Run them with
+
+    python -m benchmarks --output results.json --baseline baseline.json
+
+Every result has 'seconds', the best time per unit of work (per operation
+or per piece), which is what runs are compared on.
+"""
+
+import time
+
+
+def measure(op, setup=None, number=1000, repeat=7):
+    """Time an operation.
+
+    Parameters
+    ----------
+    op: callable
+        Called with the value setup returns, or without arguments.
+    setup: callable or None
+        Called before every repeat, outside the timing, to build the state op
+        works on. Operations that change the state, like locking a tetromino,
+        get a fresh one this way.
+    number: int
+        Calls of op per repeat.
+    repeat: int
+        Number of timed repeats. The fastest one counts, the others are
+        noise from the rest of the machine. One more untimed call comes
+        first to warm up caches.
+
+    Returns
+    -------
+    result: dict
+        'seconds' per call of the fastest repeat, 'median' per call over the
+        repeats, 'ops_per_sec', 'number' and 'repeat'.
+    """
+    timer = time.perf_counter
+    if setup is not None:
+        op(setup())
+    else:
+        op()
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            state = setup()
+            start = timer()
+            for _ in range(number):
+                op(state)
+        else:
+            start = timer()
+            for _ in range(number):
+                op()
+        times.append((timer() - start)/number)
+    times.sort()
+    return {
+        'seconds': times[0],
+        'median': times[len(times)//2],
+        'ops_per_sec': 1/times[0] if times[0] > 0 else float('inf'),
+        'number': number,
+        'repeat': repeat,
+    }
@@ -0,0 +1,112 @@
+"""Run the benchmarks and compare them against a baseline.
+
+    python -m benchmarks [--quick] [--only NAME] [--output FILE]
+                         [--baseline FILE] [--threshold FRACTION]
+                         [--save-baseline FILE] [--game-dir DIR]
+
+Results are printed as a table and written as JSON with --output. With
+--baseline every result is compared on 'seconds': slower by more than the
+threshold (0.15 by default) is a regression and makes the exit status 1.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+from benchmarks import micro, games
+
+
+def collect(scale, only=None, game_dir='.'):
+    """Run the benchmarks. Return the results and the reasons of the ones
+    that were skipped, keyed by name."""
+    results = {}
+    skipped = {}
+    results.update(micro.engine(scale))
+    try:
+        results.update(micro.render(scale, game_dir))
+    except Exception as error:  # pygame, a display or the assets missing.
+        skipped['render_frame'] = '%s: %s' % (type(error).__name__, error)
+    results.update(games.run(scale))
+    if only is not None:
+        results = {name: result for name, result in results.items() if only in name}
+    return results, skipped
+
+
+def compare(results, baseline, threshold):
+    """Return (name, ratio, status) for every result also in the baseline,
+    ratio being new over baseline seconds."""
+    rows = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result['seconds']/baseline[name]['seconds']
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 - threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, ratio, status))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('--quick', action='store_true', help='fewer iterations')
+    parser.add_argument('--only', help='only run benchmarks whose name contains this')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='slowdown counted as a regression, as a fraction')
+    parser.add_argument('--save-baseline', help='write the results as a new baseline')
+    parser.add_argument('--game-dir', default='.', help='directory with the game assets')
+    args = parser.parse_args(argv)
+
+    results, skipped = collect(1 if not args.quick else 0.2, args.only, args.game_dir)
+    report = {
+        'meta': {
+            'time': time.time(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'quick': args.quick,
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+
+    for name, result in sorted(results.items()):
+        if 'pieces_per_sec' in result:
+            print('%-42s %10.1f games/s %10.0f pieces/s' %
+                  (name, result['games_per_sec'], result['pieces_per_sec']))
+        else:
+            print('%-42s %10.2f us %12.0f ops/s' %
+                  (name, result['seconds']*1e6, result['ops_per_sec']))
+    for name, reason in skipped.items():
+        print('%-42s skipped, %s' % (name, reason))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as fp:
+                json.dump(report, fp, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        print()
+        if baseline['meta']['quick'] != args.quick:
+            print('warning: the baseline was run %s --quick, timings are not comparable'
+                  % ('with' if baseline['meta']['quick'] else 'without'))
+        rows = compare(results, baseline['results'], args.threshold)
+        for name, ratio, status in rows:
+            print('%-42s %6.2fx %s' % (name, ratio, status))
+        if any(status == 'regression' for _, _, status in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Standard boards the benchmarks start from.
+
+Every fixture is a list of the 23 playfield rows above the floor as 10 bit
+masks, top row first, in the layout of `tetris.zobrist.pack`.
+"""
+
+import numpy as np
+from tetris import zobrist
+from tetris.core import BitBoard
+from tetris.simulator import Simulator
+
+
+ROWS = zobrist.HEIGHT - 1
+FULL = zobrist.PLAYFIELD
+
+
+def _from_heights(heights, holes=0, seed=0):
+    """Return the rows of columns filled up to heights, with a number of
+    random holes punched below the surface."""
+    rng = np.random.RandomState(seed)
+    rows = [0]*ROWS
+    for col, height in enumerate(heights):
+        for r in range(ROWS - height, ROWS):
+            rows[r] |= 1 << col
+    for _ in range(holes):
+        col = rng.randint(len(heights))
+        if heights[col] > 1:
+            r = ROWS - rng.randint(1, heights[col])
+            rows[r] &= ~(1 << col)
+    # Never leave a full row behind, a real board clears them.
+    return [row & ~(1 << (r % 10)) if row == FULL else row for r, row in enumerate(rows)]
+
+
+def empty():
+    """No blocks."""
+    return [0]*ROWS
+
+
+def ragged():
+    """Uneven surface of mid height with a few holes."""
+    return _from_heights([4, 9, 2, 7, 11, 5, 3, 8, 6, 1], holes=6, seed=1)
+
+
+def near_top_out():
+    """Stack 14 rows high, a few pieces from topping out."""
+    return _from_heights([14, 13, 14, 14, 12, 14, 13, 14, 14, 13], holes=10, seed=2)
+
+
+def multi_line():
+    """Bottom four rows full except a well in the last column, cleared by
+    one I piece."""
+    return _from_heights([4]*9 + [0])
+
+
+FIXTURES = {
+    'empty': empty,
+    'ragged': ragged,
+    'near_top_out': near_top_out,
+    'multi_line': multi_line,
+}
+
+
+def simulator(name, board=BitBoard, seed=0):
+    """Return a Simulator reset with seed whose board holds a fixture."""
+    sim = Simulator(board)
+    sim.reset(seed)
+    rows = zobrist.unpack(FIXTURES[name]())
+    sim.board.current_tetromino = None
+    sim.board.load_rows(rows)
+    sim.board.start_game(sim.tetromino)
+    return sim
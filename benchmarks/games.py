@@ -0,0 +1,85 @@
+"""End-to-end benchmarks: whole games from the board fixtures."""
+
+import time
+from benchmarks import fixtures
+from tetris.core import BitBoard
+
+
+def scripted_policy():
+    """Return a policy that spreads the pieces over the board by a fixed
+    script: rotation and column follow from the number of pieces placed.
+
+    It costs next to nothing, so the games measure the engine alone.
+    """
+    state = {'piece': None, 'actions': []}
+
+    def policy(simulator):
+        if state['piece'] != simulator.pieces or not state['actions']:
+            n = simulator.pieces
+            state['piece'] = n
+            shift = (n*3)%10 - 4
+            move = 'move_right' if shift > 0 else 'move_left'
+            state['actions'] = ['rotate_right']*(n%4) + [move]*abs(shift) + ['hard_drop']
+        return state['actions'].pop(0)
+    return policy
+
+
+def greedy_policy():
+    """Return the built-in greedy AI."""
+    from tetris.ai import GreedyAI
+    return GreedyAI()
+
+
+POLICIES = {
+    'scripted': scripted_policy,
+    'greedy': greedy_policy,
+}
+
+
+def play(fixture, policy, games=5, max_pieces=200, board=BitBoard, seed=0, repeat=3):
+    """Play games from a fixture until they top out or placed max_pieces.
+
+    The games are deterministic, so every repeat plays the same ones and
+    the fastest repeat counts.
+
+    Returns
+    -------
+    result: dict
+        'games_per_sec', 'pieces_per_sec', 'seconds' per piece, and the
+        totals 'games', 'pieces', 'lines' and 'elapsed' of one repeat.
+    """
+    times = []
+    for _ in range(repeat):
+        pieces = 0
+        lines = 0
+        elapsed = 0.0
+        for game in range(games):
+            sim = fixtures.simulator(fixture, board, seed + game)
+            act = POLICIES[policy]()
+            start = time.perf_counter()
+            while not sim.board.top_out and sim.pieces < max_pieces:
+                lines += sim.act(act(sim))[1]
+            elapsed += time.perf_counter() - start
+            pieces += sim.pieces
+        times.append(elapsed)
+    elapsed = min(times)
+    return {
+        'seconds': elapsed/max(pieces, 1),
+        'games_per_sec': games/elapsed,
+        'pieces_per_sec': pieces/elapsed,
+        'games': games,
+        'pieces': pieces,
+        'lines': lines,
+        'elapsed': elapsed,
+    }
+
+
+def run(scale=1, policies=None):
+    """Return the end-to-end benchmarks of every fixture and policy, keyed
+    by name."""
+    results = {}
+    for policy in policies or POLICIES:
+        games = max(1, int((10 if policy == 'scripted' else 2)*scale))
+        for fixture in fixtures.FIXTURES:
+            results['games.%s.%s' % (fixture, policy)] = play(fixture, policy, games)
+    return results
@@ -0,0 +1,155 @@
+"""Microbenchmarks of single engine and rendering operations."""
+
+import os
+import tempfile
+from benchmarks import measure
+from benchmarks import fixtures
+from tetris.core import Board, BitBoard
+from tetris.search import placements
+
+
+ENGINES = {'bitboard': BitBoard, 'board': Board}
+
+
+def _moves(board_class, fixture, scale):
+    """Return the timings of the board moves on a fixture."""
+    sim = fixtures.simulator(fixture, board_class)
+    board = sim.board
+    tetromino = sim.tetromino
+    number = int(1000*scale)
+    results = {}
+
+    # Moving back and forth keeps the tetromino in place.
+    def sideways():
+        board.move_left(tetromino)
+        board.move_right(tetromino)
+
+    def rotate():
+        board.rotate_left(tetromino)
+        board.rotate_right(tetromino)
+
+    def soft_drop():
+        board.soft_drop(tetromino)
+        tetromino.row -= 1
+
+    for name, op in (('move_left_right', sideways), ('rotate_left_right', rotate),
+                     ('soft_drop', soft_drop)):
+        results[name] = measure(op, number=number)
+    results['_collision'] = measure(lambda: board._collision(tetromino), number=number)
+    results['block_coordinates'] = measure(tetromino.block_coordinates, number=number)
+
+    results['placements'] = measure(lambda: placements(board, board.current_tetromino),
+                                    number=int(100*scale))
+    placement = placements(board, board.current_tetromino)[0]
+
+    def apply_undo():
+        board.apply(placement)
+        board.undo()
+
+    # Restoring the board does not move the tetromino back, so put it back
+    # by hand to make every call the same move.
+    col = tetromino.col
+
+    def snapshot_restore():
+        snapshot = board.snapshot()
+        board.move_left(tetromino)
+        board.restore(snapshot)
+        tetromino.col = col
+
+    results['apply_undo'] = measure(apply_undo, number=number)
+    results['snapshot_restore'] = measure(snapshot_restore, number=number)
+
+    # Locking changes the board, so every repeat starts from the fixture.
+    def fresh():
+        sim = fixtures.simulator(fixture, board_class)
+        return sim.board, sim.tetromino
+
+    results['hard_drop'] = measure(lambda state: state[0].hard_drop(state[1]),
+                                   setup=fresh, number=1, repeat=int(200*scale))
+    return results
+
+
+def _line_clear(board_class, scale):
+    """Return the timing of clearing the four bottom rows."""
+    def setup():
+        sim = fixtures.simulator('multi_line', board_class)
+        board = sim.board
+        board.current_tetromino = None
+        rows = board.locked_rows()
+        for r in range(board.height - 5, board.height - 1):
+            rows[r] = (1 << board.width) - 1
+        board.load_rows(rows)
+        board.placed_rows = tuple(range(board.height - 5, board.height - 1))
+        return board
+    return measure(lambda board: board._line_clear_check(), setup=setup,
+                   number=1, repeat=int(200*scale))
+
+
+def engine(scale=1, fixture='ragged'):
+    """Return the microbenchmarks of both board engines, keyed by name."""
+    results = {}
+    for name, board_class in ENGINES.items():
+        for op, result in _moves(board_class, fixture, scale).items():
+            results['%s.%s' % (name, op)] = result
+        results['%s._line_clear_check' % name] = _line_clear(board_class, scale)
+    return results
+
+
+def render(scale=1, game_dir='.'):
+    """Return the timings of `game.Game.render_frame` with the SDL dummy
+    video driver.
+
+    game_dir must hold the assets the game loads. The music is not loaded.
+    Raises an ImportError or pygame.error if pygame or the assets are
+    missing.
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    cwd = os.getcwd()
+    os.chdir(game_dir)
+    try:
+        import pygame as pg
+        import game
+        from tetris.settings import DisplaySettings, ScoreSettings
+
+        # Keep the benchmark games out of the score log, and leave out the
+        # music, which is not needed to draw and not shipped in the repo.
+        path = ScoreSettings.path
+        music = pg.mixer.music.load, pg.mixer.music.play
+        ScoreSettings.path = os.path.join(tempfile.mkdtemp(), 'scores.log')
+        pg.mixer.music.load = pg.mixer.music.play = lambda *args, **kwargs: None
+        try:
+            tetris = game.Game(seed=0)
+        finally:
+            ScoreSettings.path = path
+            pg.mixer.music.load, pg.mixer.music.play = music
+        tetris.debug = False
+        tetris.display = pg.display.set_mode((DisplaySettings.width, DisplaySettings.height))
+        tetris.load_assets()
+    finally:
+        os.chdir(cwd)
+
+    board = tetris.board
+    tetromino = tetris.tetromino
+    number = int(200*scale)
+
+    def full():
+        tetris.full_redraw = True
+        tetris.render_frame()
+
+    def moving():
+        board.move_left(tetromino)
+        tetris.render_frame()
+        board.move_right(tetromino)
+        tetris.render_frame()
+
+    results = {'render_frame.full': measure(full, number=number)}
+    if tetris.dirty_rects:
+        results['render_frame.idle'] = measure(tetris.render_frame, number=number)
+        # Two frames per call, halve to get one.
+        result = measure(moving, number=number)
+        result['seconds'] /= 2
+        result['median'] /= 2
+        result['ops_per_sec'] *= 2
+        results['render_frame.moving'] = result
+    return results
@@ -1,12 +1,12 @@
-
 import os
-import pickle
 import pygame as pg
-import numpy as np
-import datetime
 from pygame.locals import *
 from tetris.utils import Timer
-from tetris.core import Tetromino, Board, Score
+from tetris.assets import Assets
+from tetris.telemetry import Telemetry
+from tetris.loop import TickLoop
+from tetris.replay import Recorder, Replay, Player
+from tetris.scores import ScoreLog
 from tetris.settings import *
 
 
@@ -40,6 +40,22 @@ HIGH_SCORE_NUM_LOC = (SCORE_NUM_LOC[0], HIGH_SCORE_FONT_LOC[1] + TILE_SIZE*2)
 LEVEL_FONT_LOC = (SIDE_FONT_LOC[0] + TILE_SIZE*16, HIGH_SCORE_FONT_LOC[1] + TILE_SIZE*5)
 LEVEL_NUM_LOC = (SIDE_FONT_LOC[0] + TILE_SIZE*16, LEVEL_FONT_LOC[1] + TILE_SIZE*2)
 GAME_OVER_FONT_LOC = (DisplaySettings.width//4, DisplaySettings.height//2 - TILE_SIZE)
+DEBUG_RECT = (TILE_SIZE//4, DisplaySettings.height - TILE_SIZE*6, LEFT - TILE_SIZE//2, TILE_SIZE*5)
+TIMING_RECT = (RIGHT + TILE_SIZE//4, DisplaySettings.height - TILE_SIZE*6, LEFT - TILE_SIZE//2, TILE_SIZE*5)
+TIMING_PHASES = ('events', 'logic', 'ai', 'render', 'display', 'idle', 'frame')
+# Timed board methods, see Timer.instrument. Their phases overlap 'logic'
+# and 'ai', and a drop that locks counts towards the lock and clear too.
+BOARD_PHASES = {
+    'move_left': 'board.move',
+    'move_right': 'board.move',
+    'rotate_left': 'board.move',
+    'rotate_right': 'board.move',
+    'soft_drop': 'board.move',
+    'hard_drop': 'board.move',
+    'hold': 'board.move',
+    '_place_tetromino': 'board.lock',
+    '_line_clear_check': 'board.clear',
+}
 
 FONT_SIZE = TILE_SIZE
 GAME_OVER_FONT_SIZE = TILE_SIZE*2
@@ -48,86 +64,145 @@ WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 RED = (220, 0, 0)
 
+KEY_ACTIONS = {
+    pg.K_LEFT: 'move_left',
+    pg.K_RIGHT: 'move_right',
+    pg.K_DOWN: 'soft_drop',
+    pg.K_SPACE: 'hard_drop',
+    pg.K_UP: 'rotate_right',
+    pg.K_z: 'rotate_left',
+    pg.K_x: 'hold',
+}
+
 
 class Game:
     """Class to run Tetris game."""
-    def __init__(self):
+    def __init__(self, seed=None):
         pg.init()
 
-        self.board = Board()
-        self.tetromino = Tetromino()
-        self.score = Score()
+        self.seed = seed
+        self.player = None
+        self.loop = TickLoop(tick_rate=TimerSettings.tick_rate,
+                             drop_interval=TimerSettings.drop_interval,
+                             level_speedup=TimerSettings.level_speedup,
+                             lock_delay=TimerSettings.lock_delay,
+                             repeat_delay=KeyboardSettings.delay,
+                             repeat_interval=KeyboardSettings.interval)
+        self.timer = Timer(TimerSettings.window)
+        self.timed_board = None
+        self.new_game()
+        self.turbo = None       # Ticks per frame, None to follow the clock.
+        self.throttle = True    # Cap the frame rate at DisplaySettings.fps.
+        self.render = True
+        self.pending_ms = 0
+        self.pending_rects = []
         self.debug = True
+        self.telemetry = None
+        self.overlay_version = None
+        self.show_timings = False
+        self.timings_drawn = None
+        self.last_dump = 0
+        self.ai = None
         self.paused = False
         self.display = None
-        self.speed = TimerSettings.drop_interval
-        self.background_img = 'assets/' + str(TILE_SIZE) + '/background.png'
-        self.background_border_img = 'assets/' + str(TILE_SIZE) + '/background_border.png'
-        self.side_background_img = 'assets/' + str(TILE_SIZE) + '/side_background.png'
-        self.side_background_border_img = 'assets/' + str(TILE_SIZE) + '/side_background_border.png'
-
-        self.scores = {str(datetime.datetime.now()):0}
-        if os.path.getsize('scores') > 0:
-            with open ('scores', 'rb') as fp:
-                self.scores = pickle.load(fp)
-        self.high_score = max(self.scores.values())
+        self.dirty_rects = DisplaySettings.dirty_rects
+        self.full_redraw = True
+        self.drawn = None
+        self.number_rects = {}
+
+        self.scores = ScoreLog(ScoreSettings.path, ScoreSettings.top)
+        if len(self.scores) == 0 and os.path.exists(ScoreSettings.legacy_path):
+            self.scores.import_pickle(ScoreSettings.legacy_path)
+        self.high_score = self.scores.high_score
 
         pg.mixer.music.load('music/edm_theme.wav')
-        self.shadow_imgs = {
-            'blue' : pg.image.load('assets/' + str(TILE_SIZE) + '/blue_shadow.png'),
-            'red' : pg.image.load('assets/' + str(TILE_SIZE) + '/red_shadow.png'),
-            'yellow' : pg.image.load('assets/' + str(TILE_SIZE) + '/yellow_shadow.png'),
-            'orange' : pg.image.load('assets/' + str(TILE_SIZE) + '/orange_shadow.png'),
-            'cyan' : pg.image.load('assets/' + str(TILE_SIZE) + '/cyan_shadow.png'),
-            'purple' : pg.image.load('assets/' + str(TILE_SIZE) + '/purple_shadow.png'),
-        }
-        self.tetromino_imgs = {
-            'blue' : pg.image.load('assets/' + str(TILE_SIZE) + '/blue_tile.png'),
-            'red' : pg.image.load('assets/' + str(TILE_SIZE) + '/red_tile.png'),
-            'yellow' : pg.image.load('assets/' + str(TILE_SIZE) + '/yellow_tile.png'),
-            'orange' : pg.image.load('assets/' + str(TILE_SIZE) + '/orange_tile.png'),
-            'cyan' : pg.image.load('assets/' + str(TILE_SIZE) + '/cyan_tile.png'),
-            'purple' : pg.image.load('assets/' + str(TILE_SIZE) + '/purple_tile.png'),
-        }
 
-        self.background = pg.image.load(self.background_img)
-        self.background_border = pg.image.load(self.background_border_img)
-        self.side_background = pg.image.load(self.side_background_img)
-        self.side_background_border = pg.image.load(self.side_background_border_img)
-        self.cover = pg.Surface((LEFT, TOP))
+    def load_assets(self):
+        """Load the images and text. Converting them to the display format
+        needs the display to be set up."""
+        self.assets = Assets.load(TILE_SIZE)
+        self.shadow_imgs = self.assets.shadows
+        self.tetromino_imgs = self.assets.tiles
+
+        self.paint_background()
+        self.background_border = self.assets.images['background_border']
+        self.side_background = self.assets.images['side_background']
+        self.side_background_border = self.assets.images['side_background_border']
+        self.cover = pg.Surface((LEFT, TOP)).convert()
         self.cover.fill(BACKGROUND_COLOR)
 
-        self.font_name = pg.font.match_font('arial', 1)
-        self.held_font = pg.font.Font(self.font_name, FONT_SIZE).render('HOLD', True, WHITE)
-        self.next_font = pg.font.Font(self.font_name, FONT_SIZE).render('NEXT', True, WHITE)
-        self.level_font = pg.font.Font(self.font_name, FONT_SIZE).render('LEVEL', True, WHITE)
-        self.score_font = pg.font.Font(self.font_name, FONT_SIZE).render('SCORE', True, WHITE)
-        self.high_score_font = pg.font.Font(self.font_name, FONT_SIZE).render('HIGH SCORE', True, WHITE)
-        self.game_over_font = pg.font.Font(self.font_name, GAME_OVER_FONT_SIZE).render('GAME OVER', True, RED)
-
-    def debug_print(self):
-        """Print Tetris pieces and relevant information to console."""
-        os.system('cls' if os.name == 'nt' else 'clear')
-
-        print('\nPosition')
-        print(self.tetromino.position())
-        print('\nBlock coordinates')
-        print(self.tetromino.block_coordinates())
-        print('\nBoard')
-        print(self.board)
-        print('\nBoard heights')
-        print(self.board.get_height())
-
-        if self.pause:
-            print('\nPaused')
+        font = self.assets.font(FONT_SIZE)
+        self.held_font = font.render('HOLD', True, WHITE).convert_alpha()
+        self.next_font = font.render('NEXT', True, WHITE).convert_alpha()
+        self.level_font = font.render('LEVEL', True, WHITE).convert_alpha()
+        self.score_font = font.render('SCORE', True, WHITE).convert_alpha()
+        self.high_score_font = font.render('HIGH SCORE', True, WHITE).convert_alpha()
+        self.game_over_font = self.assets.font(GAME_OVER_FONT_SIZE).render('GAME OVER', True, RED).convert_alpha()
+        self.digits = self.assets.number_glyphs(FONT_SIZE, WHITE)
+
+    def record_event(self, event):
+        """Record an event and the state of the game for debugging. The
+        records are written to debug.log and shown in the overlay."""
+        fields = {}
+        if event.type == pg.KEYDOWN:
+            fields['key'] = pg.key.name(event.key)
+        fields['shape'] = self.tetromino.shape
+        fields['position'] = [int(x) for x in self.tetromino.position()]
+        fields['rotation'] = int(self.tetromino.rotation_index)
+        fields['score'] = self.score.score
+        fields['paused'] = self.paused
+        fields['heights'] = self.board.get_height()[0].tolist()
+        self.telemetry.record(pg.event.event_name(event.type), **fields)
+
+    def render_timings(self):
+        """Draw the frame timings if they are shown, or clear them, and
+        return their area."""
+        rect = pg.Rect(TIMING_RECT)
+        self.display.fill(BACKGROUND_COLOR, rect)
+        if self.show_timings:
+            self.display.set_clip(rect)
+            font = self.assets.font(TILE_SIZE//2)
+            phases = self.timer.stats()['phases']
+            rows = [('ms', 'p50', 'p95', 'p99')]
+            for phase in TIMING_PHASES:
+                if phase in phases:
+                    t = phases[phase]
+                    rows.append((phase,) + tuple('%.2f' % t[p] for p in ('p50', 'p95', 'p99')))
+            for i, row in enumerate(rows):
+                for j, cell in enumerate(row):
+                    loc = (rect.x + j*rect.width//4, rect.y + i*font.get_linesize())
+                    self.display.blit(font.render(cell, True, WHITE), loc)
+            self.display.set_clip(None)
+        self.timings_drawn = (self.show_timings, pg.time.get_ticks())
+        return rect
+
+    def timings_changed(self):
+        """Return true if the timing overlay is due for a redraw."""
+        shown, ticks = self.timings_drawn
+        if shown != self.show_timings:
+            return True
+        return shown and pg.time.get_ticks() - ticks >= TimerSettings.overlay_interval
+
+    def render_overlay(self):
+        """Draw the latest debug records and return their area."""
+        rect = pg.Rect(DEBUG_RECT)
+        self.display.fill(BACKGROUND_COLOR, rect)
+        self.display.set_clip(rect)
+        font = self.assets.font(TILE_SIZE//2)
+        for i, line in enumerate(self.telemetry.overlay_text()):
+            self.display.blit(font.render(line, True, WHITE), (rect.x, rect.y + i*font.get_linesize()))
+        self.display.set_clip(None)
+        self.overlay_version = self.telemetry.version
+        return rect
 
     def start(self):
         """Start the game."""
         pg.display.set_caption('Tetris')
         self.display = pg.display.set_mode((DisplaySettings.width, DisplaySettings.height))
-        self.MOVE_DOWN = pg.USEREVENT + 1
-        pg.time.set_timer(self.MOVE_DOWN, self.speed)
-        pg.key.set_repeat(KeyboardSettings.delay, KeyboardSettings.interval)
+        self.load_assets()
+        if self.debug:
+            self.telemetry = Telemetry('debug.log')
+            self.telemetry.start()
         self.clock = pg.time.Clock()
         pg.mixer.music.play(-1)
         self.play()
@@ -162,118 +237,285 @@ class Game:
                     (BACKGROUND_LOC[0] + (x - 3)*TILE_SIZE,
                      BACKGROUND_LOC[1] + (y - 3)*TILE_SIZE))
 
-    def get_new_background(self):
-        self.background = self.display.copy().subsurface((BACKGROUND_LOC), (TILE_SIZE*10, TILE_SIZE*20))
+    def new_game(self):
+        """Start a new game and clear the placed tiles."""
+        if self.player is not None:
+            self.player.reset()
+        else:
+            self.loop.reset(self.seed)
+        self.board = self.loop.simulator.board
+        if TimerSettings.time_board and self.board is not self.timed_board:
+            self.timer.instrument(self.board, BOARD_PHASES)
+            self.timed_board = self.board
+        self.tetromino = self.loop.simulator.tetromino
+        self.score = self.loop.simulator.score
+        self.colors = [[None]*self.board.width for _ in range(self.board.height - 1)]
+
+    def tile_rect(self, row, col):
+        """Return the screen area of a board cell."""
+        return pg.Rect(BACKGROUND_LOC[0] + (col - 3)*TILE_SIZE,
+                       BACKGROUND_LOC[1] + (row - 3)*TILE_SIZE, TILE_SIZE, TILE_SIZE)
+
+    def paint_background(self):
+        """Draw the placed tiles onto a fresh copy of the board background."""
+        self.background = self.assets.images['background'].copy()
+        for row in range(3, self.board.height - 1):
+            for col, color in enumerate(self.colors[row]):
+                if color is not None:
+                    self.background.blit(self.tetromino_imgs[color], ((col - 3)*TILE_SIZE, (row - 3)*TILE_SIZE))
+
+    def lock_tetromino(self, tetromino):
+        """Add the tiles of a locked tetromino to the background and remove
+        the rows it completed."""
+        coords = tetromino.block_coordinates()
+        cells = list(zip(coords[0].tolist(), coords[1].tolist()))
+        for row, col in cells:
+            self.colors[row][col] = tetromino.color
+
+        playfield = range(self.board.left_boundary, self.board.right_boundary + 1)
+        full = {row for row, _ in cells if all(self.colors[row][c] is not None for c in playfield)}
+        if full:
+            kept = [colors for row, colors in enumerate(self.colors) if row not in full]
+            self.colors = [[None]*self.board.width for _ in full] + kept
+            self.paint_background()
+            self.full_redraw = True
+            return
+
+        for row, col in cells:
+            if row >= 3:
+                self.background.blit(self.tetromino_imgs[tetromino.color], ((col - 3)*TILE_SIZE, (row - 3)*TILE_SIZE))
+                self.pending_rects.append(self.tile_rect(row, col))
+
+    def text_values(self):
+        """Return the location and value of every number on screen."""
+        return ((SCORE_NUM_LOC, self.score.score),
+                (HIGH_SCORE_NUM_LOC, max(self.high_score, self.score.score)),
+                (LEVEL_NUM_LOC, self.score.level))
+
+    def render_number(self, loc, value):
+        """Draw a number over the previous one at loc and return the area
+        that changed."""
+        old = self.number_rects.get(loc)
+        if old is not None:
+            self.display.fill(BACKGROUND_COLOR, old)
+        rect = self.digits.blit(self.display, value, loc)
+        self.number_rects[loc] = rect
+        return rect.union(old) if old is not None else rect
 
     def render_text(self):
-        score = pg.font.Font(self.font_name, FONT_SIZE).render(str(self.score.score), True, WHITE)
-        level = pg.font.Font(self.font_name, FONT_SIZE).render(str(self.score.level), True, WHITE)
-        high_score = pg.font.Font(self.font_name, FONT_SIZE).render(str(max(self.high_score, self.score.score)), True, WHITE)
         self.display.blit(self.held_font, HELD_FONT_LOC)
         self.display.blit(self.next_font, SIDE_FONT_LOC)
         self.display.blit(self.level_font, LEVEL_FONT_LOC)
         self.display.blit(self.score_font, SCORE_FONT_LOC)
         self.display.blit(self.high_score_font, HIGH_SCORE_FONT_LOC)
-        self.display.blit(score, SCORE_NUM_LOC)
-        self.display.blit(high_score, HIGH_SCORE_NUM_LOC)
-        self.display.blit(level, LEVEL_NUM_LOC)
+        for loc, value in self.text_values():
+            self.render_number(loc, value)
+
+    def render_side_panel(self, offset, blit_tetromino):
+        """Draw the side panel offset pixels below the next panel and
+        return its area."""
+        self.display.blit(self.side_background, (SIDE_BACKGROUND_LOC[0], SIDE_BACKGROUND_LOC[1] + offset))
+        blit_tetromino()
+        return self.display.blit(self.side_background_border, (SIDE_BACKGROUND_BORDER_LOC[0], SIDE_BACKGROUND_BORDER_LOC[1] + offset))
+
+    def piece_rects(self):
+        """Return the areas of the shadow and tetromino tiles that are
+        inside the board."""
+        area = pg.Rect(BACKGROUND_LOC, (TILE_SIZE*10, TILE_SIZE*20))
+        rects = []
+        for tetromino in (self.board.shadow, self.tetromino):
+            coords = tetromino.block_coordinates()
+            for x, y in zip(coords[1], coords[0]):
+                rect = pg.Rect(BACKGROUND_LOC[0] + (x - 3)*TILE_SIZE,
+                               BACKGROUND_LOC[1] + (y - 3)*TILE_SIZE,
+                               TILE_SIZE, TILE_SIZE).clip(area)
+                if rect.width and rect.height:
+                    rects.append(tuple(rect))
+        return tuple(rects)
+
+    def frame_state(self):
+        """Return what a frame shows, to find the parts that changed."""
+        held = self.board.held_tetromino
+        return {
+            'pieces': (self.piece_rects(), self.tetromino.color),
+            'held': (held.shape, held.color) if held is not None else None,
+            'next': (self.tetromino.next_shape, self.tetromino.next_color),
+            'text': self.text_values(),
+        }
+
+    def render_changes(self):
+        """Redraw what changed since the last frame and return the changed
+        areas."""
+        state = self.frame_state()
+        rects = []
+        if state['pieces'] != self.drawn['pieces'] or self.pending_rects:
+            # Restore the old tiles and the newly placed ones from the
+            # background, then draw the tetromino and shadow.
+            for rect in self.pending_rects + [pg.Rect(rect) for rect in self.drawn['pieces'][0]]:
+                self.display.blit(self.background, rect, rect.move(-BACKGROUND_LOC[0], -BACKGROUND_LOC[1]))
+                rects.append(rect)
+            self.pending_rects = []
+            self.display.set_clip(pg.Rect(BACKGROUND_LOC, (TILE_SIZE*10, TILE_SIZE*20)))
+            self.blit_shadow()
+            self.blit_tetromino()
+            self.display.set_clip(None)
+            rects.extend(pg.Rect(rect) for rect in state['pieces'][0])
+        if state['held'] != self.drawn['held']:
+            rects.append(self.render_side_panel(TILE_SIZE*8, self.blit_held_tetromino))
+        if state['next'] != self.drawn['next']:
+            rects.append(self.render_side_panel(0, self.blit_next_tetromino))
+        for (loc, value), (_, old) in zip(state['text'], self.drawn['text']):
+            if value != old:
+                rects.append(self.render_number(loc, value))
+        if self.telemetry is not None and self.telemetry.version != self.overlay_version:
+            rects.append(self.render_overlay())
+        if self.timings_changed():
+            rects.append(self.render_timings())
+        self.drawn = state
+        return rects
 
     def render_frame(self):
+        """Draw the frame. Return the areas that changed, or None if the
+        whole window was redrawn."""
+        if self.dirty_rects and not self.full_redraw:
+            return self.render_changes()
+
         self.display.fill(BACKGROUND_COLOR)
+        self.number_rects = {}
+        self.pending_rects = []
         self.display.blit(self.background, BACKGROUND_LOC)
         self.blit_shadow()
         self.blit_tetromino()
-        self.display.blit(self.side_background, (SIDE_BACKGROUND_LOC[0], SIDE_BACKGROUND_LOC[1] + TILE_SIZE*8))
-        self.display.blit(self.side_background, SIDE_BACKGROUND_LOC)
-        self.blit_held_tetromino()
-        self.blit_next_tetromino()
+        self.render_side_panel(TILE_SIZE*8, self.blit_held_tetromino)
+        self.render_side_panel(0, self.blit_next_tetromino)
         self.display.blit(self.cover, (LEFT, 0))
         self.display.blit(self.background_border, BACKGROUND_BORDER_LOC)
-        self.display.blit(self.side_background_border, (SIDE_BACKGROUND_BORDER_LOC[0], SIDE_BACKGROUND_BORDER_LOC[1] + TILE_SIZE*8))
-        self.display.blit(self.side_background_border, SIDE_BACKGROUND_BORDER_LOC)
         self.render_text()
-
-    def clear_line(self):
-        chop = pg.transform.chop(self.background,
-                (0, TILE_SIZE*np.min(self.board.filled_rows - 3),
-                    0, TILE_SIZE*self.board.filled_rows.size))
-        self.display.blit(chop,
-                (BACKGROUND_LOC[0], BACKGROUND_LOC[1] +
-                    TILE_SIZE*self.board.filled_rows.size))
-        self.get_new_background()
-        self.board.filled_rows = np.array([])
+        if self.telemetry is not None:
+            self.render_overlay()
+        self.render_timings()
+        self.full_redraw = False
+        self.drawn = self.frame_state()
+        return None
+
+    def record(self, path):
+        """Record the game to a replay file, see tetris.replay. The game
+        starts over so the recording covers it from the first tick."""
+        self.loop.recorder = Recorder(path)
+        self.new_game()
+
+    def watch(self, path):
+        """Play back a replay file in place of the keyboard and the AI."""
+        self.player = Player(Replay.load(path))
+        self.loop = self.player.loop
+        self.new_game()
+
+    def apply_action(self, action):
+        """Apply an action from tetris.simulator.ACTIONS on the next tick."""
+        self.timer.count('moves')
+        self.loop.press(action)
+
+    def end_frame(self):
+        """Finish timing the frame and dump the timings periodically in
+        debug mode."""
+        self.timer.end_frame()
+        ticks = pg.time.get_ticks()
+        if self.debug and ticks - self.last_dump >= TimerSettings.dump_interval:
+            self.timer.dump(TimerSettings.dump_path)
+            self.last_dump = ticks
 
     def reset(self):
-        self.score.reset()
-        self.board.reset()
-        self.tetromino.reset()
-        self.board.start_game(self.tetromino)
-        self.background = pg.image.load(self.background_img)
-
+        self.new_game()
+        self.paint_background()
+        self.full_redraw = True
+
+    def ticks_due(self, elapsed):
+        """Return the number of logic ticks to run in a frame that took
+        elapsed milliseconds."""
+        if self.turbo is not None:
+            return self.turbo
+        self.pending_ms += elapsed
+        ticks = int(self.pending_ms*TimerSettings.tick_rate//1000)
+        if ticks > TimerSettings.max_catch_up:
+            # Too far behind, drop the time instead of catching up.
+            self.pending_ms = 0
+            return TimerSettings.max_catch_up
+        self.pending_ms -= ticks*1000/TimerSettings.tick_rate
+        return ticks
+
+    def run_ticks(self, ticks):
+        """Advance the game logic by a number of ticks."""
+        for _ in range(ticks):
+            if self.board.top_out:
+                break
+            # A replay or the AI plays in place of the keyboard.
+            if self.player is not None:
+                self.player.feed(self.loop)
+            elif self.ai is not None:
+                action = self.ai.next_action(self.board, self.tetromino)
+                self.timer.lap('ai')
+                self.timer.count('moves')
+                self.loop.press(action, repeat=False)
+
+            placed, lines, _ = self.loop.tick()
+            for tetromino in placed:
+                self.lock_tetromino(tetromino)
+            self.timer.count('ticks')
+            self.timer.count('locks', len(placed))
+            if lines:
+                self.timer.count('clears')
+                self.timer.count('lines', lines)
+            self.timer.lap('logic')
 
     def play(self):
         """Begin game and check for keyboard inputs."""
-        self.board.start_game(self.tetromino)
-        self.render_text()
-
         while True:
             if self.board.top_out:
                 self.game_over()
 
-            if self.board.filled_rows.size != 0:
-                if self.score.add_score(self.board.filled_rows.size):
-                    self.speed -= 75
-                    pg.time.set_timer(self.MOVE_DOWN, self.speed)
-                self.clear_line()
-                self.render_text()
-
-            self.clock.tick(DisplaySettings.fps)
-            self.render_frame()
-            pg.display.update()
+            if self.throttle:
+                self.clock.tick(DisplaySettings.fps)
+            else:
+                self.clock.tick()
+            self.timer.lap('idle')
 
             for event in pg.event.get():
-                if self.debug:
-                    self.debug_print()
-                if event.type == self.MOVE_DOWN and not self.board.top_out:
-                    if self.board.soft_drop(self.tetromino):
-                        self.get_new_background()
+                if self.telemetry is not None:
+                    self.record_event(event)
 
                 if event.type == pg.QUIT:
                     self.quit()
 
                 if event.type == pg.KEYDOWN:
 
-                    if event.key == pg.K_DOWN:
-                        if self.board.soft_drop(self.tetromino):
-                            self.get_new_background()
-                        pg.time.set_timer(self.MOVE_DOWN, self.speed)
-
-                    elif event.key == pg.K_LEFT:
-                        self.board.move_left(self.tetromino)
-
-                    elif event.key == pg.K_RIGHT:
-                        self.board.move_right(self.tetromino)
-
-                    elif event.key == pg.K_ESCAPE:
+                    if event.key == pg.K_ESCAPE:
                         self.pause()
+                        self.timer.lap('paused')
+
+                    elif event.key == pg.K_F3:
+                        self.show_timings = not self.show_timings
 
-                    elif event.key == pg.K_x:
-                        self.board.hold(self.tetromino)
+                    elif self.ai is not None or self.player is not None:
+                        pass
 
-                    elif event.key == pg.K_z:
-                        self.board.rotate_left(self.tetromino)
-                        pg.key.set_repeat(KeyboardSettings.delay, KeyboardSettings.interval)
+                    elif event.key in KEY_ACTIONS:
+                        self.apply_action(KEY_ACTIONS[event.key])
 
-                    elif event.key == pg.K_UP:
-                        self.board.rotate_right(self.tetromino)
+                if event.type == pg.KEYUP and event.key in KEY_ACTIONS and self.player is None:
+                    self.loop.release(KEY_ACTIONS[event.key])
+            self.timer.lap('events')
 
-                    elif event.key == pg.K_SPACE:
-                        self.board.hard_drop(self.tetromino)
-                        self.display.blit(self.background, BACKGROUND_LOC)
-                        self.blit_tetromino()
-                        self.board.soft_drop(self.tetromino)
-                        self.get_new_background()
+            self.run_ticks(self.ticks_due(self.clock.get_time()))
 
+            if self.render:
+                rects = self.render_frame()
+                self.timer.lap('render')
+                if rects is None:
+                    pg.display.update()
+                elif rects:
+                    pg.display.update(rects)
+                self.timer.lap('display')
+            self.end_frame()
 
         pg.quit()
 
@@ -285,13 +527,16 @@ class Game:
             self.clock.tick(DisplaySettings.fps)
 
             for event in pg.event.get():
-                if self.debug:
-                    self.debug_print()
+                if self.telemetry is not None:
+                    self.record_event(event)
                 if event.type == pg.QUIT:
                     self.quit()
                 if event.type == pg.KEYDOWN:
                     if event.key == pg.K_ESCAPE:
                         self.paused = False
+                # Keys let go while paused must stop repeating.
+                if event.type == pg.KEYUP and event.key in KEY_ACTIONS and self.player is None:
+                    self.loop.release(KEY_ACTIONS[event.key])
 
     def game_over(self):
         darken = pg.Surface((DisplaySettings.width, DisplaySettings.height))
@@ -299,21 +544,25 @@ class Game:
         darken.fill(BLACK)
         self.display.blit(darken, (0,0))
         self.display.blit(self.game_over_font, GAME_OVER_FONT_LOC)
-        self.scores[str(datetime.datetime.now())] = self.score.score
-        with open('scores', 'wb') as fp:
-            pickle.dump(self.scores, fp)
+        self.scores.add(self.score.score, self.loop.lines, self.score.level)
 
         while True:
             pg.display.update()
             self.clock.tick(DisplaySettings.fps)
 
             for event in pg.event.get():
-                if self.debug:
-                    self.debug_print()
+                if self.telemetry is not None:
+                    self.record_event(event)
                 if event.type == pg.QUIT:
                     self.quit()
 
     def quit(self):
         """Quit the program."""
+        recorder = self.loop.recorder
+        if recorder is not None and recorder.top_out_tick < 0:
+            recorder.save()
+        if self.telemetry is not None:
+            self.telemetry.stop()
+        self.scores.save_index()
         pg.quit()
         quit()
@@ -1,10 +1,71 @@
+import sys
 
-import game
+
+def option(name, default=None, type=int):
+    """Return the value following a command line flag."""
+    if name in sys.argv:
+        return type(sys.argv[sys.argv.index(name) + 1])
+    return default
 
 
 def main():
-    Tetris = game.Game()
+    ai = None
+    if '--ai' in sys.argv:
+        from tetris.ai import GreedyAI
+        ai = GreedyAI()
+    elif '--beam' in sys.argv:
+        from tetris.planner import BeamPlanner
+        ai = BeamPlanner()
+    seed = option('--seed')
+    record = option('--record', type=str)
+    replay = option('--replay', type=str)
+
+    port = option('--port', 7777)
+    socket = option('--socket', type=str)
+    if '--serve' in sys.argv:
+        from tetris import server
+        server.serve(port, socket, option('--turbo', 1))
+        return
+    if '--bots' in sys.argv:
+        from tetris import server
+        print(server.run_bots(option('--bots'), port, socket))
+        return
+
+    export = option('--export', type=str)
+    if export is not None:
+        # Export every step of headless games as training data.
+        from tetris import dataset
+        from tetris.runner import random_policy
+        policy = ai if ai is not None else random_policy
+        print(dataset.generate(export, option('--games', 100), policy, seed or 0), 'records')
+        return
+
+    if '--headless' in sys.argv:
+        # Play one game as fast as possible without pygame.
+        from tetris import replay as replays
+        if replay is not None:
+            print(replays.Player(replays.Replay.load(replay)).run(verify=True))
+            return
+        from tetris.loop import TickLoop
+        loop = TickLoop()
+        if record is not None:
+            loop.recorder = replays.Recorder(record)
+        print(loop.run(ai, seed=seed, max_ticks=option('--ticks')))
+        if record is not None and loop.recorder.top_out_tick < 0:
+            loop.recorder.save()
+        return
+
+    import game
+    Tetris = game.Game(seed)
+    if replay is not None:
+        Tetris.watch(replay)
+    elif record is not None:
+        Tetris.record(record)
     Tetris.debug = True
+    Tetris.ai = ai
+    Tetris.turbo = option('--turbo')
+    Tetris.throttle = '--unthrottled' not in sys.argv
+    Tetris.render = '--no-render' not in sys.argv
     Tetris.start()
 
 if __name__ == "__main__":
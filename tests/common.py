@@ -0,0 +1,72 @@
+"""Helpers shared by the tests."""
+
+import random
+from tetris.ai import GreedyAI
+from tetris.core import Tetromino
+from tetris.simulator import Simulator, ACTIONS
+
+
+# Random play with more moves and drops than holds, so the pieces spread
+# over the whole board.
+MOVES = ACTIONS + ('move_left', 'move_right', 'soft_drop', 'hard_drop')
+
+
+class FixedPieces:
+    """Stand-in for `PieceGenerator` that deals a given list of shapes."""
+
+    def __init__(self, shapes, color=Tetromino.COLORS[0]):
+        self.shapes = list(shapes)
+        self.color = color
+        self.pos = 0
+
+    def next(self):
+        self.pos += 1
+        return self.shapes[self.pos - 1], self.color
+
+    def peek(self, i=0):
+        return self.shapes[self.pos + i], self.color
+
+    def preview(self, n=None):
+        return self.shapes[self.pos:self.pos + (n or 6)]
+
+
+def simulator(board, seed, randomizer='uniform'):
+    """Return a Simulator reset with a seed."""
+    sim = Simulator(board, randomizer)
+    sim.reset(seed)
+    return sim
+
+
+def random_actions(seed, n):
+    """Return n random actions of a seeded game."""
+    rng = random.Random(seed)
+    return [rng.choice(MOVES) for _ in range(n)]
+
+
+def noisy_ai(seed, noise=0.05):
+    """Return a policy that plays the greedy AI with some random actions
+    mixed in, so games clear lines and still reach odd positions."""
+    rng = random.Random(seed)
+    ai = GreedyAI()
+
+    def policy(sim):
+        if rng.random() < noise:
+            return rng.choice(MOVES)
+        return ai(sim) or 'soft_drop'
+    return policy
+
+
+def state(sim):
+    """Return everything a player could observe of a simulator, to compare
+    engines and restored states."""
+    board = sim.board
+    current = board.current_tetromino
+    held = board.held_tetromino
+    shadow = board.shadow
+    return (board.locked_rows(), board.hash, board.board.tolist(),
+            board.fill_height.tolist(), board.holes.tolist(), board.row_fill.tolist(),
+            board.bumpiness, board.wells, board.holding, board.top_out,
+            (current.shape, current.rotation_index, current.row, current.col) if current else None,
+            (shadow.row, shadow.col) if current and shadow else None,
+            (held.shape, held.color) if held else None,
+            sim.score.score, sim.score.line_count, sim.score.level)
@@ -0,0 +1,73 @@
+import random
+import numpy as np
+import pytest
+from tetris.batch import BatchBoard, SHAPE_NAMES, HARD_DROP
+from tetris.core import Board, BitBoard, Tetromino
+from tetris.simulator import Simulator, ACTIONS
+from tests.common import FixedPieces, noisy_ai
+
+
+ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+
+
+class DealtBatch(BatchBoard):
+    """BatchBoard dealing every game a given list of shapes."""
+
+    def __init__(self, sequences):
+        self.dealt = [iter(shapes) for shapes in sequences]
+        super().__init__(len(sequences))
+
+    def _draw(self, games):
+        return np.array([SHAPE_NAMES.index(next(self.dealt[g])) for g in games], dtype=int)
+
+
+def dealt_simulator(cls, shapes):
+    sim = Simulator(cls)
+    sim.board.reset()
+    sim.tetromino = Tetromino(FixedPieces(shapes))
+    sim.board.start_game(sim.tetromino)
+    return sim
+
+
+@pytest.mark.parametrize('cls, seed', [(BitBoard, 0), (BitBoard, 1), (Board, 2)])
+def test_batch_plays_like_simulator(cls, seed):
+    n = 8
+    rng = random.Random(seed)
+    sequences = [[rng.choice(SHAPE_NAMES) for _ in range(5000)] for _ in range(n)]
+    batch = DealtBatch(sequences)
+    sims = [dealt_simulator(cls, shapes) for shapes in sequences]
+    policies = [noisy_ai(seed*n + g, noise=0.1) for g in range(n)]
+    alive = np.ones(n, dtype=bool)
+    for _ in range(3000):
+        # Games that are over in the simulators keep playing in the batch.
+        actions = np.array([ACTION_INDEX[policies[g](sims[g])] if alive[g] else HARD_DROP
+                            for g in range(n)])
+        _, lines, done = batch.step(actions)
+        for g in np.flatnonzero(alive):
+            sim = sims[g]
+            _, sim_lines, sim_done = sim.step(ACTIONS[actions[g]])
+            assert done[g] == sim_done
+            if sim_done:
+                assert batch.final_score[g] == sim.score.score
+                alive[g] = False
+                continue
+            tetromino = sim.tetromino
+            held = sim.board.held_tetromino
+            assert (SHAPE_NAMES[batch.shape[g]], batch.rotation[g], batch.row[g], batch.col[g]) == \
+                (tetromino.shape, tetromino.rotation_index, tetromino.row, tetromino.col)
+            assert batch.held_shape[g] == (SHAPE_NAMES.index(held.shape) if held else -1)
+            assert (lines[g], batch.score[g]) == (sim_lines, sim.score.score)
+            rows = sim.board.locked_rows()
+            assert np.array_equal(batch.boards[g], np.array(rows)[:, None] >> np.arange(16) & 1)
+            assert batch.shadow_rows()[g] == sim.board.shadow.row
+        if not alive.any():
+            break
+
+
+def test_hold_collides_at_spawn():
+    batch = DealtBatch([['T', 'I', 'O', 'S']])
+    batch.boards[0, 3:7, 4:13] = True
+    batch.row[0] = 12
+    batch.step(np.array([ACTIONS.index('hold')]))
+    assert (batch.shape[0], batch.row[0], batch.held_shape[0]) == (SHAPE_NAMES.index('T'), 12, -1)
+    assert not batch.holding[0]
@@ -0,0 +1,132 @@
+import copy
+import random
+import pytest
+from tetris import zobrist
+from tetris.core import Board, BitBoard, Piece
+from tetris.search import placements
+from tests.common import simulator, noisy_ai, random_actions, state
+
+
+def features(board):
+    return (board.hash, board.fill_height.tolist(), board.holes.tolist(),
+            board.row_fill.tolist(), board.bumpiness, board.wells)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_bitboard_plays_like_board(seed):
+    sims = [simulator(Board, seed), simulator(BitBoard, seed)]
+    policy = noisy_ai(seed)
+    for _ in range(3000):
+        action = policy(sims[0])
+        results = [sim.act(action) for sim in sims]
+        assert results[0] == results[1]
+        assert state(sims[0]) == state(sims[1])
+        if sims[0].board.top_out:
+            break
+
+
+@pytest.mark.parametrize('cls', [Board, BitBoard])
+def test_features_match_a_loaded_board(cls):
+    sim = simulator(cls, 3)
+    policy = noisy_ai(3)
+    for i in range(3000):
+        sim.act(policy(sim))
+        if sim.board.top_out:
+            break
+        if i % 25 == 0:
+            board = sim.board
+            fresh = cls()
+            fresh.load_rows(board.locked_rows())
+            assert features(fresh) == features(board)
+            assert board.hash == zobrist.board_hash(board.locked_rows())
+
+
+@pytest.mark.parametrize('cls', [Board, BitBoard])
+def test_undo_restores_nested_applies(cls):
+    sim = simulator(cls, 5)
+    board = sim.board
+    rng = random.Random(5)
+    for step in range(150):
+        if board.top_out:
+            break
+        before = state(sim)
+        played = copy.deepcopy(sim)
+        applied = 0
+        for depth in range(rng.randint(1, 3)):
+            piece = board.current_tetromino if depth == 0 else Piece(rng.choice('IOTSZJL'), 'red')
+            options = placements(board, piece) if piece is not None else []
+            if not options:
+                break
+            placement = rng.choice(options)
+            board.apply(placement, hold=piece if rng.random() < 0.3 else None, score=sim.score)
+            applied += 1
+            fresh = cls()
+            fresh.load_rows(board.locked_rows())
+            assert features(fresh) == features(board)
+            if depth == 0:
+                for key in placement.keys:
+                    played.act(key)
+                assert played.board.locked_rows() == board.locked_rows()
+        for _ in range(applied):
+            board.undo()
+        assert state(sim) == before
+        sim.act(rng.choice(('hard_drop', 'move_left', 'move_right', 'rotate_right')))
+
+
+@pytest.mark.parametrize('cls', [Board, BitBoard])
+def test_restore_returns_to_snapshot(cls):
+    sim = simulator(cls, 7)
+    board = sim.board
+    for action in random_actions(7, 40):
+        sim.act(action)
+    snapshot = board.snapshot()
+    rows = board.locked_rows()
+    features_before = features(board)
+    for _ in range(4):
+        sim.act('hard_drop')
+    assert board.locked_rows() != rows
+    board.restore(snapshot)
+    assert board.locked_rows() == rows
+    assert features(board) == features_before
+    # A snapshot can be restored more than once.
+    sim.act('hard_drop')
+    board.restore(snapshot)
+    assert board.locked_rows() == rows
+
+
+@pytest.mark.parametrize('cls', [Board, BitBoard])
+def test_add_garbage_pushes_rows_up(cls):
+    sim = simulator(cls, 2)
+    for _ in range(3):
+        sim.act('hard_drop')
+    rows = sim.board.locked_rows()
+    sim.board.add_garbage(sim.tetromino, [4, 4])
+    garbage = sim.board.locked_rows()
+    assert garbage[:-3] == rows[2:-1]
+    hole = 1 << (zobrist.LEFT + 4)
+    assert garbage[-3] == garbage[-2] == rows[-1] & ~hole
+    assert sim.board.hash == zobrist.board_hash(garbage)
+
+
+@pytest.mark.parametrize('cls', [Board, BitBoard])
+def test_hold_collides_at_spawn(cls):
+    sim = simulator(cls, 0)
+    board = sim.board
+    tetromino = sim.tetromino
+    # Fill the spawn rows except the leftmost column and move the current
+    # tetromino below them.
+    rows = board.locked_rows()
+    for r in range(3, 7):
+        rows[r] = rows[-1] & ~(1 << zobrist.LEFT)
+    board.current_tetromino = None
+    board.load_rows(rows)
+    tetromino.row = 12
+    board.start_game(tetromino)
+
+    assert not board.can_hold(tetromino)
+    assert 'hold' not in sim.legal_actions()
+    shape, next_shape = tetromino.shape, tetromino.next_shape
+    sim.act('hold')
+    assert board.held_tetromino is None
+    assert not board.holding
+    assert (tetromino.shape, tetromino.row, tetromino.next_shape) == (shape, 12, next_shape)
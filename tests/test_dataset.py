@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from tetris import zobrist
+from tetris.core import BitBoard
+from tetris.dataset import ShardWriter, ShardReader, generate, observe, unpack_boards, ACTION_INDEX
+from tetris.simulator import ACTIONS
+from tests.common import simulator, noisy_ai
+
+
+@pytest.fixture
+def export(tmp_path):
+    directory = str(tmp_path / 'export')
+    generate(directory, 2, noisy_ai(0), seed=5, max_steps=400, shard_size=250, chunk_size=64)
+    return directory
+
+
+def test_generate_round_trip(export):
+    reader = ShardReader(export)
+    assert len(reader) == reader.manifest['records']
+    assert reader.sizes[:-1].tolist() == [250]*(len(reader.sizes) - 1)
+
+    # Playing the recorded actions again gives the recorded states.
+    index = 0
+    for game in range(2):
+        sim = simulator(BitBoard, 5 + game)
+        for _ in range(400):
+            record = reader[index]
+            rows, shape, rotation, row, col, next_shape, held = observe(sim)
+            assert np.array_equal(record['board'], zobrist.pack(rows))
+            assert np.array_equal(unpack_boards(record['board']),
+                                  np.array(rows[:-1])[:, None] >> np.arange(3, 13) & 1)
+            assert (record['shape'], record['rotation'], record['row'], record['col'],
+                    record['next'], record['held']) == (shape, rotation, row, col, next_shape, held)
+            score = sim.score.score
+            lines = sim.act(ACTIONS[record['action']])[1]
+            assert (record['lines'], record['score_delta']) == (lines, sim.score.score - score)
+            index += 1
+            if sim.board.top_out:
+                break
+    assert index == len(reader)
+
+
+def test_append_matches_append_fields(tmp_path):
+    sim = simulator(BitBoard, 1)
+    policy = noisy_ai(1)
+    with ShardWriter(str(tmp_path / 'fields'), chunk_size=16) as fields, \
+            ShardWriter(str(tmp_path / 'records'), chunk_size=16) as records:
+        for step in range(100):
+            action = policy(sim)
+            rows, *state = observe(sim)
+            fields.append_fields(rows, *state, ACTION_INDEX[action], 0, step)
+            records.append((zobrist.pack(rows),) + tuple(state) + (ACTION_INDEX[action], 0, step))
+            sim.act(action)
+    a = ShardReader(str(tmp_path / 'fields'))
+    b = ShardReader(str(tmp_path / 'records'))
+    assert np.array_equal(a.shards[0], b.shards[0])
+
+
+def test_sample_and_batches_keep_order(export):
+    reader = ShardReader(export)
+    records = np.concatenate([np.asarray(shard) for shard in reader.shards])
+    indices = np.random.RandomState(0).randint(0, len(reader), size=300)
+    assert np.array_equal(reader.sample(300, np.random.RandomState(0)), records[indices])
+
+    order = np.random.RandomState(1).permutation(len(reader))
+    batches = list(reader.batches(64, np.random.RandomState(1)))
+    assert [len(batch) for batch in batches[:-1]] == [64]*(len(batches) - 1)
+    assert np.array_equal(np.concatenate(batches), records[order])
+
+
+def test_writer_keeps_listed_shards(export):
+    before = len(ShardReader(export))
+    sim = simulator(BitBoard, 0)
+    with ShardWriter(export, shard_size=250) as writer:
+        writer.append_fields(*observe(sim), 0, 0, 0)
+    assert len(ShardReader(export)) == before + 1
+
+
+def test_empty_export(tmp_path):
+    directory = str(tmp_path / 'empty')
+    with ShardWriter(directory):
+        pass
+    reader = ShardReader(directory)
+    assert len(reader) == 0
+    assert list(reader.batches(16)) == []
+    with pytest.raises(ValueError):
+        reader.sample(16)
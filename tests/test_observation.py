@@ -0,0 +1,71 @@
+import numpy as np
+from tetris import observation
+from tetris.batch import BatchBoard, SHAPE_NAMES
+from tetris.core import Board, BitBoard, Piece, Tetromino
+from tests.common import FixedPieces, simulator, noisy_ai
+
+
+def test_packed_matches_unpacked():
+    sims = [simulator(Board, 1), simulator(BitBoard, 1)]
+    policy = noisy_ai(1)
+    outs = [observation.allocate(2, dtype=np.uint8),
+            observation.allocate(2, packed=True)]
+    for step in range(2000):
+        action = policy(sims[0])
+        for sim in sims:
+            sim.act(action)
+        if sims[0].board.top_out:
+            break
+        if step % 5:
+            continue
+        tetrominos = [sim.tetromino for sim in sims]
+        observation.encode_batch([sim.board for sim in sims], tetrominos, outs[0])
+        observation.encode_batch([sim.board for sim in sims], tetrominos, outs[1], packed=True)
+        for key in ('next', 'held', 'fill_height'):
+            assert np.array_equal(outs[0][key], outs[1][key])
+        assert np.array_equal(outs[0]['planes'], observation.unpack_planes(outs[1]['planes']))
+        # Both engines give the same observation.
+        assert np.array_equal(outs[0]['planes'][0], outs[0]['planes'][1])
+    assert step > 200
+
+
+def test_planes_show_board_piece_and_shadow():
+    sim = simulator(BitBoard, 2)
+    for _ in range(5):
+        sim.act('hard_drop')
+    out = observation.allocate()
+    observation.encode(sim.board, sim.tetromino, out)
+    board = sim.board
+    assert np.array_equal(out['planes'][0], np.array(board.locked_rows()[3:23])[:, None]
+                          >> np.arange(3, 13) & 1)
+    for plane, piece in ((1, board.current_tetromino), (2, board.shadow)):
+        rows, cols = piece.block_coordinates()
+        visible = rows >= 3
+        expected = np.zeros((20, 10))
+        expected[rows[visible] - 3, cols[visible] - 3] = 1
+        assert np.array_equal(out['planes'][plane], expected)
+    assert out['next'].argmax() == observation.SHAPE_INDEX[sim.tetromino.next_shape]
+    assert np.array_equal(out['fill_height'], board.fill_height[0, 3:13])
+
+
+def test_batch_board_matches_bitboard():
+    batch = BatchBoard(16, seed=0)
+    rng = np.random.RandomState(0)
+    out = observation.allocate(batch.n)
+    expected = observation.allocate()
+    for _ in range(300):
+        batch.step(rng.choice([0, 1, 2, 3, 4, 4, 5, 6], size=batch.n))
+        observation.encode_batch_board(batch, out)
+        for g in range(0, batch.n, 5):
+            board = BitBoard()
+            board.load_rows((batch.boards[g] << np.arange(batch.width)).sum(axis=1).tolist())
+            tetromino = Tetromino(FixedPieces([SHAPE_NAMES[batch.shape[g]],
+                                               SHAPE_NAMES[batch.next_shape[g]]]))
+            tetromino.rotation_index, tetromino.row, tetromino.col = \
+                batch.rotation[g], batch.row[g], batch.col[g]
+            board.start_game(tetromino)
+            if batch.held_shape[g] >= 0:
+                board.held_tetromino = Piece(SHAPE_NAMES[batch.held_shape[g]], None)
+            observation.encode(board, tetromino, expected)
+            for key, value in expected.items():
+                assert np.array_equal(out[key][g], value), key
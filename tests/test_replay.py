@@ -0,0 +1,61 @@
+import random
+import pytest
+from tetris import zobrist
+from tetris.core import Board, BitBoard
+from tetris.loop import TickLoop, REPEATABLE
+from tetris.replay import Recorder, Replay, Player, scan
+from tetris.simulator import Simulator
+from tests.common import noisy_ai
+
+
+def observe(loop):
+    sim = loop.simulator
+    board = sim.board
+    tetromino = sim.tetromino
+    return (zobrist.pack(board.locked_rows()).tobytes(), board.hash,
+            tetromino.shape, tetromino.rotation_index, tetromino.row, tetromino.col,
+            sim.score.score, loop.lines)
+
+
+def record(path, seed, cls, randomizer, lock_delay, max_ticks=6000):
+    """Record a game with held keys and releases, return the state at the
+    start of every tick."""
+    loop = TickLoop(Simulator(cls, randomizer), lock_delay=lock_delay)
+    loop.recorder = Recorder(path, keyframe_interval=40)
+    loop.reset(seed)
+    rng = random.Random(seed)
+    policy = noisy_ai(seed)
+    states = {}
+    while not loop.simulator.board.top_out and loop.tick_count < max_ticks:
+        states[loop.tick_count] = observe(loop)
+        roll = rng.random()
+        if roll < 0.005:
+            loop.press(rng.choice(REPEATABLE), repeat=True)
+        elif roll < 0.01:
+            loop.release(rng.choice(REPEATABLE))
+        else:
+            loop.press(policy(loop.simulator), repeat=False)
+        loop.tick()
+    if not loop.simulator.board.top_out:
+        loop.recorder.save()
+    return states
+
+
+@pytest.mark.parametrize('cls, randomizer, lock_delay, max_ticks', [
+    (BitBoard, 'uniform', 0, 6000), (BitBoard, 'bag', 500, 6000), (Board, 'uniform', 0, 6000),
+    (BitBoard, 'uniform', 0, 150)])
+def test_replay_round_trip(tmp_path, cls, randomizer, lock_delay, max_ticks):
+    path = str(tmp_path / 'game.trpl')
+    states = record(path, 4, cls, randomizer, lock_delay, max_ticks)
+    player = Player(Replay.load(path))
+    result = player.run(verify=True)
+    header = scan(path)
+    assert result['ticks'] == header['ticks'] == max(states) + 1
+    assert (result['score'], result['lines']) == (header['score'], header['lines'])
+    assert (header['top_out_tick'] == -1) == (max_ticks == len(states))
+
+    ticks = sorted(states)
+    for tick in (ticks[len(ticks)//2], 0, 41, ticks[-1], 80, 37):
+        player.seek(tick)
+        assert observe(player.loop) == states[tick]
+    player.run(verify=True)
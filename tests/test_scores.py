@@ -0,0 +1,55 @@
+import datetime
+import pickle
+import time
+import numpy as np
+import pytest
+from tetris.scores import ScoreLog
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_best_per_day_follows_dst(tmp_path, new_york):
+    log = ScoreLog(str(tmp_path / 'scores.log'))
+    rng = np.random.RandomState(0)
+    # Games every few hours around the spring and fall clock changes.
+    start = datetime.datetime(2024, 3, 8).timestamp()
+    times = [start + i*3.5*3600 for i in range(40)]
+    start = datetime.datetime(2024, 11, 1).timestamp()
+    times += [start + i*3.5*3600 for i in range(40)]
+    best = {}
+    for when in times:
+        score = int(rng.randint(10000))
+        log.add(score, when=when)
+        day = datetime.date.fromtimestamp(when)
+        best[day] = max(best.get(day, 0), score)
+    assert log.best_per_day() == sorted(best.items())
+
+
+def test_top_survives_reopening(tmp_path):
+    path = str(tmp_path / 'scores.log')
+    log = ScoreLog(path, top=3)
+    scores = [5, 50, 7, 900, 12, 300, 44]
+    for score in scores:
+        log.add(score, when=1e9)
+    assert log.top()['score'].tolist() == [900, 300, 50]
+    assert ScoreLog(path, top=3).top(5)['score'].tolist() == [900, 300, 50, 44, 12]
+    assert log.percentile(50) == np.percentile(scores, 50)
+
+
+def test_import_pickle(tmp_path):
+    log = ScoreLog(str(tmp_path / 'scores.log'))
+    empty = tmp_path / 'empty.pkl'
+    empty.write_bytes(b'')
+    assert log.import_pickle(str(empty)) == 0
+    old = tmp_path / 'old.pkl'
+    old.write_bytes(pickle.dumps({'2020-01-02 03:04:05.000006': 120, 'bad': 7}))
+    assert log.import_pickle(str(old)) == 2
+    assert log.high_score == 120
+    assert len(log) == 2
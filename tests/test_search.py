@@ -0,0 +1,74 @@
+import copy
+import pytest
+from tetris.core import Board, BitBoard, Piece
+from tetris.search import placements
+from tests.common import simulator, noisy_ai
+
+
+# Column, rotation and row shift of the moves the search follows.
+MOVES = ((-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0), (0, 0, 1))
+
+
+def cells(shape, rotation, row, col):
+    rows, cols = Piece(shape, None, rotation, row, col).block_coordinates()
+    return frozenset(zip(rows.tolist(), cols.tolist()))
+
+
+def brute_force(board, tetromino):
+    """Return {cells: fewest keys} of every lock the tetromino can reach, by
+    a breadth first search that tries every move with `Board._fits`."""
+    seen = {(tetromino.rotation_index, tetromino.row, tetromino.col)}
+    frontier = [Piece.of(tetromino)]
+    best = {}
+    keys = 0
+    while frontier:
+        keys += 1
+        found = []
+        for piece in frontier:
+            landed = piece.copy()
+            while board._fits(landed):
+                landed.row += 1
+            best.setdefault(cells(piece.shape, piece.rotation_index, landed.row - 1, piece.col), keys)
+            for dcol, drot, drow in MOVES:
+                moved = piece.copy()
+                moved.col += dcol
+                moved.rotation_index = (moved.rotation_index + drot)%4
+                moved.row += drow
+                if drot:
+                    board._kick(moved)
+                position = (moved.rotation_index, moved.row, moved.col)
+                if position not in seen and board._fits(moved):
+                    seen.add(position)
+                    found.append(moved)
+        frontier = found
+    return best
+
+
+def play(sim, keys):
+    """Play keys on a copy of a simulator, return the locked piece."""
+    sim = copy.deepcopy(sim)
+    for key in keys:
+        placed = sim.act(key)[0]
+    assert placed
+    return sim.board.placed_tetromino
+
+
+@pytest.mark.parametrize('cls, seed', [(BitBoard, 0), (BitBoard, 1), (BitBoard, 2), (Board, 3)])
+def test_placements_match_brute_force(cls, seed):
+    sim = simulator(cls, seed)
+    policy = noisy_ai(seed, noise=0.2)
+    checked = 0
+    while checked < 20:
+        for _ in range(10):
+            sim.act(policy(sim))
+        if sim.board.top_out:
+            break
+        found = placements(sim.board, sim.tetromino)
+        expected = brute_force(sim.board, sim.tetromino)
+        assert {cells(p.shape, p.rotation, p.row, p.col): len(p.keys) for p in found} == expected
+        for p in found:
+            piece = play(sim, p.keys)
+            assert cells(piece.shape, piece.rotation_index, piece.row, piece.col) == \
+                cells(p.shape, p.rotation, p.row, p.col)
+        checked += 1
+    assert checked >= 10
@@ -0,0 +1,53 @@
+import json
+from tetris import zobrist
+from tetris.core import BitBoard
+from tetris.server import Session, Match
+from tests.common import noisy_ai
+
+
+class Writer:
+    """Collects the messages a session sends."""
+
+    def __init__(self):
+        self.messages = []
+
+    def write(self, data):
+        self.messages.append(json.loads(data))
+
+
+def test_versus_garbage_and_rows():
+    a, b = Session(0, Writer()), Session(1, Writer())
+    match = Match([a, b], 5)
+    # Only a plays, so b gets every row a sends until it tops out.
+    policy = noisy_ai(0, noise=0)
+    received = 0
+    for _ in range(20000):
+        a.loop.press(policy(a.loop.simulator), repeat=False)
+        waiting = len(b.garbage)
+        lost = match.tick()
+        received += max(0, len(b.garbage) - waiting)
+        if lost:
+            break
+    assert lost == [b]
+    assert received > 0
+
+    for session in (a, b):
+        states = [message for message in session.writer.messages if message['type'] == 'state']
+        assert states[0]['tick'] == 1 and 'rows' in states[0]
+        board = BitBoard()
+        board.load_rows(zobrist.unpack([m for m in states if 'rows' in m][-1]['rows']))
+        assert board.hash == session.loop.simulator.board.hash
+
+    match.finish(lost)
+    assert a.writer.messages[-1]['winner'] == b.writer.messages[-1]['winner'] == 0
+
+
+def test_garbage_cancels_waiting_rows():
+    a, b = Session(0, Writer()), Session(1, Writer())
+    match = Match([a, b], 0)
+    a.garbage = [3]
+    match.send_garbage(a, 4)
+    assert a.garbage == []
+    assert len(b.garbage) == 3 and len(set(b.garbage)) == 1
+    match.send_garbage(b, 1)
+    assert len(b.garbage) == 3
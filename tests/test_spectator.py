@@ -0,0 +1,52 @@
+import random
+import pytest
+from tetris.core import Board, BitBoard
+from tetris.loop import TickLoop
+from tetris.simulator import Simulator
+from tetris.spectator import Encoder, Decoder
+from tests.common import noisy_ai
+
+
+def assert_synced(decoder, loop):
+    sim = loop.simulator
+    board = sim.board
+    assert (decoder.board == board.board[3:, 3:-3]).all()
+    assert (decoder.score, decoder.lines, decoder.level) == (sim.score.score, loop.lines,
+                                                             sim.score.level)
+    held = board.held_tetromino
+    assert (decoder.held.shape if decoder.held else None) == (held.shape if held else None)
+    if board.current_tetromino is not None:
+        assert decoder.shadow.row == board.shadow.row
+
+
+@pytest.mark.parametrize('cls', [Board, BitBoard])
+def test_decoder_follows_game(cls):
+    loop = TickLoop(Simulator(cls))
+    loop.reset(3)
+    sim = loop.simulator
+    encoder = Encoder(keyframe_interval=97)
+    decoder = Decoder()
+    late = Decoder()
+    policy = noisy_ai(3)
+    rng = random.Random(3)
+    for tick in range(3000):
+        loop.press(policy(sim), repeat=False)
+        loop.tick()
+        if tick % 200 == 100 and not sim.board.top_out:
+            sim.board.add_garbage(sim.tetromino, [rng.randrange(10)]*2)
+        frame = encoder.encode(sim.board, sim.score, loop.lines)
+        # Frames may arrive split across reads.
+        half = len(frame)//2
+        decoder.feed(frame[:half])
+        decoder.feed(frame[half:])
+        assert_synced(decoder, loop)
+        # A viewer joining late only needs the current keyframe.
+        if tick == 150:
+            late.feed(encoder.keyframe())
+        elif tick > 150:
+            late.feed(frame)
+        if tick >= 150:
+            assert_synced(late, loop)
+        if sim.board.top_out:
+            break
+    assert tick > 300
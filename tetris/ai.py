@@ -0,0 +1,169 @@
+"""Heuristic evaluation of placements and a greedy AI player.
+
+Every candidate placement of the current tetromino is written onto its own
+copy of the board and all copies are scored together with numpy reductions
+over the stack.
+"""
+
+import numpy as np
+from tetris.batch import clear_lines
+from tetris.search import placements
+from tetris.utils import GEOMETRY
+
+
+FEATURES = ('height', 'holes', 'bumpiness', 'row_transitions',
+            'column_transitions', 'wells', 'lines')
+
+DEFAULT_WEIGHTS = {
+    'height': -0.51,
+    'holes': -0.36,
+    'bumpiness': -0.18,
+    'row_transitions': -0.1,
+    'column_transitions': -0.2,
+    'wells': -0.1,
+    'lines': 0.76,
+}
+
+
+def features(boards, lines):
+    """Compute the features of a stack of boards.
+
+    Parameters
+    ----------
+    boards: numpy boolean array of shape (K, R, C)
+        Playfields with the full rows already cleared.
+    lines: numpy array of shape (K,)
+        Lines cleared to reach every board.
+
+    Returns
+    -------
+    features: numpy array of shape (K, len(FEATURES))
+        Aggregate column height, holes, bumpiness, row and column
+        transitions, well depth and lines cleared of every board.
+    """
+    k, rows, cols = boards.shape
+    filled = boards.any(axis=1)
+    heights = np.where(filled, rows - boards.argmax(axis=1), 0)
+
+    holes = heights.sum(axis=1) - boards.sum(axis=(1, 2))
+    bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+
+    # The walls count as filled cells for transitions and wells.
+    walls = np.ones((k, rows, 1), dtype=bool)
+    sides = np.concatenate((walls, boards, walls), axis=2)
+    row_transitions = (sides[:, :, 1:] != sides[:, :, :-1]).sum(axis=(1, 2))
+    floor = np.ones((k, 1, cols), dtype=bool)
+    bottom = np.concatenate((boards, floor), axis=1)
+    column_transitions = (bottom[:, 1:] != bottom[:, :-1]).sum(axis=(1, 2))
+
+    edges = np.full((k, 1), rows)
+    padded = np.concatenate((edges, heights, edges), axis=1)
+    wells = np.maximum(np.minimum(padded[:, :-2], padded[:, 2:]) - heights, 0).sum(axis=1)
+
+    return np.stack((heights.sum(axis=1), holes, bumpiness, row_transitions,
+                     column_transitions, wells, lines), axis=1)
+
+
+def candidate_boards(board, candidates):
+    """Lock every candidate placement onto its own copy of the board.
+
+    Parameters
+    ----------
+    board: Board
+        Board the placements were found on.
+    candidates: list of Placement
+        Placements to lock.
+
+    Returns
+    -------
+    boards: numpy boolean array of shape (K, height - 1, width - 6)
+        The playfield including the spawn rows after every placement, with
+        the full rows cleared.
+    lines: numpy array of shape (K,)
+        Lines cleared by every placement.
+    """
+    rows = np.array(board.locked_rows()[:board.height-1])
+    playfield = (rows[:, None] >> np.arange(3, board.width - 3) & 1).astype(bool)
+    boards = np.repeat(playfield[None], len(candidates), axis=0)
+
+    cell_rows = np.array([GEOMETRY[p.shape][p.rotation].rows + p.row for p in candidates])
+    cell_cols = np.array([GEOMETRY[p.shape][p.rotation].cols + p.col - 3 for p in candidates])
+    boards[np.arange(len(candidates))[:, None], cell_rows, cell_cols] = True
+
+    full = boards.all(axis=2)
+    lines = full.sum(axis=1)
+    if lines.any():
+        boards = clear_lines(boards, full, np.zeros(boards.shape[2], dtype=bool))
+    return boards, lines
+
+
+class Evaluator:
+    """Linear heuristic over FEATURES."""
+
+    def __init__(self, weights=None):
+        """Set the weights.
+
+        Parameters
+        ----------
+        weights: dict or None
+            Weight of every feature name, missing features keep their
+            DEFAULT_WEIGHTS value.
+        """
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights is not None:
+            self.weights.update(weights)
+        self.vector = np.array([self.weights[name] for name in FEATURES], dtype=float)
+
+    def evaluate(self, boards, lines):
+        """Return the value of every board in a stack."""
+        return features(boards, lines).dot(self.vector)
+
+
+class GreedyAI:
+    """Plays the best placement of the current tetromino by the evaluator.
+
+    Actions are handed out one at a time by `next_action`, so the AI can
+    drive `game.Game` in place of the keyboard. Calling the AI with a
+    `Simulator` does the same, which makes it a policy for
+    `tetris.runner.run`.
+    """
+
+    def __init__(self, weights=None):
+        self.evaluator = Evaluator(weights)
+        self.keys = []
+        self.tetromino = None
+        self.placed = None
+
+    def choose(self, board, tetromino):
+        """Return the best Placement of the tetromino, or None if it does
+        not fit."""
+        candidates = placements(board, tetromino)
+        if not candidates:
+            return None
+        boards, lines = candidate_boards(board, candidates)
+        return candidates[int(np.argmax(self.evaluator.evaluate(boards, lines)))]
+
+    def plan(self, board, tetromino):
+        """Return the actions that lock the tetromino into the best
+        placement."""
+        placement = self.choose(board, tetromino)
+        return list(placement.keys) if placement is not None else ['hard_drop']
+
+    def next_action(self, board, tetromino):
+        """Return the next action towards the best placement."""
+        # The same Tetromino object carries on with the next piece, so a
+        # piece locked by gravity before the plan ran out shows as a new
+        # placed tetromino on the board.
+        if (not self.keys or self.tetromino is not tetromino
+                or board.placed_tetromino is not self.placed):
+            self.keys = self.plan(board, tetromino)
+            self.tetromino = tetromino
+            self.placed = board.placed_tetromino
+        action = self.keys.pop(0)
+        if action == 'hard_drop':
+            self.keys = []
+        return action
+
+    def __call__(self, simulator):
+        """Return the next action for a Simulator."""
+        return self.next_action(simulator.board, simulator.tetromino)
@@ -0,0 +1,104 @@
+"""Images and fonts of the game, loaded once and converted to the display
+format.
+
+The tiles and shadows of every color share one sprite atlas per tile size,
+and numbers are drawn from pre-rendered digit glyphs instead of rendering a
+new string every time they change.
+"""
+
+import pygame as pg
+
+
+COLORS = ('blue', 'red', 'yellow', 'orange', 'cyan', 'purple')
+IMAGES = ('background', 'background_border', 'side_background',
+          'side_background_border')
+
+# Assets already loaded, keyed by (root, tile size).
+_loaded = {}
+
+
+def _convert(image):
+    """Convert an image to the display format, keeping per pixel alpha only
+    if the image has transparent pixels."""
+    if image.get_flags() & pg.SRCALPHA:
+        if pg.surfarray.pixels_alpha(image).min() < 255:
+            return image.convert_alpha()
+    return image.convert()
+
+
+class Glyphs:
+    """Pre-rendered digits of a font, to draw numbers without rendering
+    text."""
+
+    def __init__(self, font, color):
+        self.digits = [font.render(str(d), True, color).convert_alpha() for d in range(10)]
+        self.minus = font.render('-', True, color).convert_alpha()
+        self.height = max(glyph.get_height() for glyph in self.digits)
+
+    def blit(self, surface, value, loc):
+        """Draw an integer onto surface with its top left corner at loc and
+        return the area drawn."""
+        x, y = int(loc[0]), int(loc[1])
+        for char in str(value):
+            glyph = self.minus if char == '-' else self.digits[ord(char) - 48]
+            surface.blit(glyph, (x, y))
+            x += glyph.get_width()
+        return pg.Rect(int(loc[0]), y, x - int(loc[0]), self.height)
+
+
+class Assets:
+    """Images, tiles and fonts for one tile size.
+
+    Use `load`, which needs the display mode to be set already.
+
+    Attributes
+    ----------
+    atlas: pygame.Surface
+        Tiles in the first row and shadows in the second, one column per
+        color of COLORS.
+    tiles, shadows: dict
+        Subsurfaces of the atlas keyed by color.
+    images: dict
+        Backgrounds and borders keyed by the names of IMAGES.
+    """
+
+    def __init__(self, tile_size, root='assets'):
+        self.tile_size = tile_size
+        self.path = root + '/' + str(tile_size) + '/'
+        self.font_name = pg.font.match_font('arial', 1)
+        self.fonts = {}
+        self.glyphs = {}
+
+        size = tile_size
+        atlas = pg.Surface((size*len(COLORS), size*2), pg.SRCALPHA)
+        for i, color in enumerate(COLORS):
+            atlas.blit(pg.image.load(self.path + color + '_tile.png'), (i*size, 0))
+            atlas.blit(pg.image.load(self.path + color + '_shadow.png'), (i*size, size))
+        self.atlas = atlas.convert_alpha()
+        self.tiles = {color: self.atlas.subsurface((i*size, 0, size, size))
+                      for i, color in enumerate(COLORS)}
+        self.shadows = {color: self.atlas.subsurface((i*size, size, size, size))
+                        for i, color in enumerate(COLORS)}
+        self.images = {name: _convert(pg.image.load(self.path + name + '.png'))
+                       for name in IMAGES}
+
+    @classmethod
+    def load(cls, tile_size, root='assets'):
+        """Return the assets of a tile size, loading them the first time."""
+        key = (root, tile_size)
+        if key not in _loaded:
+            _loaded[key] = cls(tile_size, root)
+        return _loaded[key]
+
+    def font(self, size):
+        """Return the font of a size, created once."""
+        if size not in self.fonts:
+            self.fonts[size] = pg.font.Font(self.font_name, size)
+        return self.fonts[size]
+
+    def number_glyphs(self, size, color):
+        """Return the digit glyphs of a font size and color."""
+        key = (size, color)
+        if key not in self.glyphs:
+            self.glyphs[key] = Glyphs(self.font(size), color)
+        return self.glyphs[key]
@@ -0,0 +1,321 @@
+"""Batched Tetris engine.
+
+Keeps N games in one (N, 24, 16) boolean array and applies one action per
+game with numpy array operations, so the per-move Python overhead is paid
+once per batch instead of once per game.
+"""
+
+import numpy as np
+from tetris.core import Score
+from tetris.utils import GEOMETRY
+from tetris.simulator import ACTIONS
+
+
+SHAPE_NAMES = tuple(GEOMETRY.keys())
+
+MOVE_LEFT = ACTIONS.index('move_left')
+MOVE_RIGHT = ACTIONS.index('move_right')
+ROTATE_LEFT = ACTIONS.index('rotate_left')
+ROTATE_RIGHT = ACTIONS.index('rotate_right')
+SOFT_DROP = ACTIONS.index('soft_drop')
+HARD_DROP = ACTIONS.index('hard_drop')
+HOLD = ACTIONS.index('hold')
+
+# Score of 0 to 4 line clears at level 0.
+LC_SCORE = np.array([0] + [Score.LC_SCORE[n] for n in range(1, 5)])
+
+
+def _geometry_arrays():
+    """Return the block offsets and column extents of every shape and
+    rotation as arrays indexed by [shape index, rotation index]."""
+    cells = np.zeros((len(SHAPE_NAMES), 4, 4, 2), dtype=int)
+    extents = np.zeros((len(SHAPE_NAMES), 4, 2), dtype=int)
+    for s, shape in enumerate(SHAPE_NAMES):
+        for r, geometry in enumerate(GEOMETRY[shape]):
+            cells[s, r, :, 0] = geometry.rows
+            cells[s, r, :, 1] = geometry.cols
+            extents[s, r] = geometry.left, geometry.right
+    return cells, extents
+
+
+CELLS, EXTENTS = _geometry_arrays()
+
+
+def clear_lines(rows, full, empty_row):
+    """Remove the full rows of a stack of boards.
+
+    Parameters
+    ----------
+    rows: numpy array of shape (M, R, W)
+        Rows of M boards, not including the floor.
+    full: numpy boolean array of shape (M, R)
+        True for the rows to remove.
+    empty_row: numpy array of shape (W,)
+        Row inserted at the top for every removed row.
+
+    Returns
+    -------
+    rows: numpy array of shape (M, R, W)
+        The boards with the remaining rows moved down.
+    """
+    # A stable sort moves the removed rows to the top and keeps the order of
+    # the remaining rows.
+    order = np.argsort(~full, axis=1, kind='stable')
+    rows = rows[np.arange(rows.shape[0])[:, None], order]
+    rows[np.arange(rows.shape[1]) < full.sum(axis=1)[:, None]] = empty_row
+    return rows
+
+
+class BatchBoard:
+    """N games of Tetris stepped together.
+
+    Boards are stored as one boolean array with the walls and floor preset,
+    like `BitBoard`. Actions are the indices of `tetris.simulator.ACTIONS`. A
+    'hard_drop' locks the tetromino and games that top out are reset
+    automatically. A 'hold' does nothing if the tetromino coming out of the
+    hold would collide at the spawn position, like `Board.hold`.
+    """
+
+    def __init__(self, n, seed=None):
+        """Create n games.
+
+        Parameters
+        ----------
+        n: int
+            Number of games.
+        seed: int or None
+            Seed of the shared tetromino generator.
+        """
+        self.n = n
+        self.width = 10 + 6   # Accommodate for sides.
+        self.height = 20 + 4  # Accommodate for base and spawn.
+        self.left_boundary = 3
+        self.right_boundary = self.width - 4
+        self.spawn = (3, self.width//2 - 2)
+        self.rng = np.random.RandomState(seed)
+        self.games = np.arange(n)
+
+        self.empty_row = np.ones(self.width, dtype=bool)
+        self.empty_row[self.left_boundary:self.right_boundary+1] = False
+
+        self.boards = np.empty((n, self.height, self.width), dtype=bool)
+        self.shape = np.zeros(n, dtype=int)
+        self.next_shape = np.zeros(n, dtype=int)
+        self.held_shape = np.zeros(n, dtype=int)
+        self.holding = np.zeros(n, dtype=bool)
+        self.rotation = np.zeros(n, dtype=int)
+        self.row = np.zeros(n, dtype=int)
+        self.col = np.zeros(n, dtype=int)
+
+        self.score = np.zeros(n, dtype=np.int64)
+        self.level = np.zeros(n, dtype=int)
+        self.line_count = np.zeros(n, dtype=int)
+        self.lines = np.zeros(n, dtype=np.int64)
+        self.pieces = np.zeros(n, dtype=np.int64)
+
+        # Totals of the last finished game of every game slot, kept when a
+        # game that topped out is reset.
+        self.final_score = np.zeros(n, dtype=np.int64)
+        self.final_level = np.zeros(n, dtype=int)
+        self.final_lines = np.zeros(n, dtype=np.int64)
+        self.final_pieces = np.zeros(n, dtype=np.int64)
+        self.reset()
+
+    def reset(self, games=None):
+        """Reset the given games, all of them by default.
+
+        Parameters
+        ----------
+        games: numpy array of integers or None
+            Indices of the games to reset.
+        """
+        if games is None:
+            games = self.games
+        self.boards[games] = self.empty_row
+        self.boards[games, self.height-1] = True
+        self.shape[games] = self._draw(games)
+        self.next_shape[games] = self._draw(games)
+        self.held_shape[games] = -1
+        self.holding[games] = False
+        self.rotation[games] = 0
+        self.row[games] = self.spawn[0]
+        self.col[games] = self.spawn[1]
+
+        self.score[games] = 0
+        self.level[games] = 0
+        self.line_count[games] = 0
+        self.lines[games] = 0
+        self.pieces[games] = 0
+
+    def playfield(self):
+        """Return a view of the visible 20x10 playfield of every game, not
+        including the current tetromino."""
+        return self.boards[:, 3:self.height-1, 3:self.width-3]
+
+    def _draw(self, games):
+        """Return a random shape index for every given game."""
+        return self.rng.randint(0, len(SHAPE_NAMES), size=len(games))
+
+    def _collision(self, games, shape, rotation, row, col):
+        """Return true for every game where the tetromino collides with a
+        wall, the floor or a placed tetromino."""
+        cells = CELLS[shape, rotation]
+        rows = row[:, None] + cells[:, :, 0]
+        cols = col[:, None] + cells[:, :, 1]
+        return self.boards[games[:, None], rows, cols].any(axis=1)
+
+    def shadow_rows(self):
+        """Return the row of the shadow of every game's tetromino, the
+        lowest row it can drop to."""
+        return self._drop_row(self.games)
+
+    def _drop_row(self, games):
+        """Return the lowest row the tetromino of every game can drop to."""
+        shape = self.shape[games]
+        rotation = self.rotation[games]
+        row = self.row[games]
+        col = self.col[games]
+
+        # The landing row follows from the top of every column unless the
+        # tetromino is tucked under an overhang.
+        tops = self.boards[games, :, self.left_boundary:self.right_boundary+1].argmax(axis=1)
+        cells = CELLS[shape, rotation]
+        cell_tops = np.take_along_axis(tops, col[:, None] + cells[:, :, 1] - self.left_boundary, axis=1)
+        landing = (cell_tops - cells[:, :, 0]).min(axis=1) - 1
+
+        tucked = landing < row
+        if tucked.any():
+            landing[tucked] = row[tucked]
+            falling = np.flatnonzero(tucked)
+            while falling.size:
+                hit = self._collision(games[falling], shape[falling], rotation[falling],
+                                      landing[falling] + 1, col[falling])
+                falling = falling[~hit]
+                landing[falling] += 1
+        return landing
+
+    def step(self, actions):
+        """Apply one action to the tetromino of every game.
+
+        Parameters
+        ----------
+        actions: numpy array of integers of shape (N,)
+            Index into ACTIONS for every game.
+
+        Returns
+        -------
+        boards: numpy array
+            The live (N, 24, 16) board array, not including the tetrominos.
+        lines: numpy array of integers
+            Number of lines cleared in every game.
+        done: numpy boolean array
+            True for the games that topped out and were reset. Their score,
+            level, lines and pieces at the top out are in final_score,
+            final_level, final_lines and final_pieces.
+        """
+        actions = np.asarray(actions)
+        games = self.games
+        lines = np.zeros(self.n, dtype=int)
+        done = np.zeros(self.n, dtype=bool)
+
+        shape = self.shape.copy()
+        rotation = self.rotation.copy()
+        row = self.row.copy()
+        col = self.col.copy()
+
+        col[actions == MOVE_LEFT] -= 1
+        col[actions == MOVE_RIGHT] += 1
+        rotation[actions == ROTATE_LEFT] -= 1
+        rotation[actions == ROTATE_RIGHT] += 1
+        rotation %= 4
+        row[actions == SOFT_DROP] += 1
+
+        # Ensure none of the tetromino's blocks surpass the boundaries when
+        # rotating.
+        rotating = (actions == ROTATE_LEFT) | (actions == ROTATE_RIGHT)
+        extents = EXTENTS[shape, rotation]
+        over = rotating & (col + extents[:, 1] >= self.right_boundary)
+        col[over] -= col[over] + extents[over, 1] - self.right_boundary
+        under = rotating & (col + extents[:, 0] <= self.left_boundary)
+        col[under] += self.left_boundary - col[under] - extents[under, 0]
+
+        # Holding brings back the held tetromino, or the next one if nothing
+        # is held yet, at the spawn position.
+        hold = (actions == HOLD) & ~self.holding
+        held = self.held_shape[hold]
+        shape[hold] = np.where(held < 0, self.next_shape[hold], held)
+        rotation[hold] = 0
+        row[hold] = self.spawn[0]
+        col[hold] = self.spawn[1]
+
+        hit = self._collision(games, shape, rotation, row, col)
+        moved = ~hit & (actions != HARD_DROP)
+        self.rotation[moved] = rotation[moved]
+        self.row[moved] = row[moved]
+        self.col[moved] = col[moved]
+
+        hold &= moved
+        if hold.any():
+            first = hold & (self.held_shape < 0)
+            self.held_shape[hold] = self.shape[hold]
+            self.shape[hold] = shape[hold]
+            self.next_shape[first] = self._draw(games[first])
+            self.holding[hold] = True
+
+        drop = actions == HARD_DROP
+        if drop.any():
+            self.row[drop] = self._drop_row(games[drop])
+
+        lock = drop | ((actions == SOFT_DROP) & hit)
+        if lock.any():
+            locked = games[lock]
+            lines[locked], done[locked] = self._lock(locked)
+        return self.boards, lines, done
+
+    def _lock(self, games):
+        """Place the tetromino of the given games, clear lines, score them
+        and spawn the next tetromino. Games that top out keep their totals
+        in the final arrays and are reset.
+
+        Returns the number of lines cleared and the top outs of the games.
+        """
+        cells = CELLS[self.shape[games], self.rotation[games]]
+        rows = self.row[games, None] + cells[:, :, 0]
+        cols = self.col[games, None] + cells[:, :, 1]
+        self.boards[games[:, None], rows, cols] = True
+        self.pieces[games] += 1
+
+        playfield = self.boards[games, :self.height-1, self.left_boundary:self.right_boundary+1]
+        full = playfield.all(axis=2)
+        lines = full.sum(axis=1)
+        cleared = lines > 0
+        if cleared.any():
+            scoring = games[cleared]
+            self.boards[scoring, :self.height-1] = clear_lines(
+                self.boards[scoring, :self.height-1], full[cleared], self.empty_row)
+
+            # Same rules as Score.add_score.
+            self.score[scoring] += LC_SCORE[lines[cleared]]*(self.level[scoring] + 1)
+            self.lines[scoring] += lines[cleared]
+            self.line_count[scoring] += lines[cleared]
+            level_up = scoring[(self.level[scoring] != 10) & (self.line_count[scoring] >= 10)]
+            self.line_count[level_up] = 0
+            self.level[level_up] += 1
+
+        self.shape[games] = self.next_shape[games]
+        self.next_shape[games] = self._draw(games)
+        self.holding[games] = False
+        self.rotation[games] = 0
+        self.row[games] = self.spawn[0]
+        self.col[games] = self.spawn[1]
+
+        top_out = self._collision(games, self.shape[games], self.rotation[games],
+                                  self.row[games], self.col[games])
+        if top_out.any():
+            ended = games[top_out]
+            self.final_score[ended] = self.score[ended]
+            self.final_level[ended] = self.level[ended]
+            self.final_lines[ended] = self.lines[ended]
+            self.final_pieces[ended] = self.pieces[ended]
+            self.reset(ended)
+        return lines, top_out
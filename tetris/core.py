@@ -1,8 +1,7 @@
-
-import random
 import numpy as np
 import copy
-from tetris.utils import SHAPES
+from tetris.utils import SHAPES, GEOMETRY
+from tetris import zobrist
 
 
 class Board:
@@ -19,6 +18,14 @@ class Board:
         self.board = np.zeros((self.height, self.width), dtype=int)
         self.board[self.height-1, :] = np.ones(self.width)*9
         self.filled_rows = np.array([])
+        self.placed_tetromino = None
+        self.hash = 0  # Zobrist hash of the placed blocks.
+
+        # Stats kept up to date on every lock and line clear.
+        self.holes = np.zeros((1, self.width), dtype=int)
+        self.row_fill = np.zeros(self.height - 1, dtype=int)
+        self.bumpiness = 0
+        self.wells = 0
 
         self.top_out = False
         self.current_tetromino = None
@@ -27,6 +34,9 @@ class Board:
         self.holding = False
         self.held_tetromino = None
 
+        self._shared = False  # Storage is shared with a snapshot.
+        self._undo = []
+
     def reset(self):
         """Reset the board."""
         self.__init__()
@@ -39,6 +49,315 @@ class Board:
         """Return height list of board."""
         return self.fill_height[:, 3:self.width-3]
 
+    def get_holes(self):
+        """Return the number of holes in every column of the board."""
+        return self.holes[:, 3:self.width-3]
+
+    def get_row_fill(self):
+        """Return the number of filled cells in every row above the floor."""
+        return self.row_fill
+
+    def get_features(self):
+        """Return the stats of the placed blocks.
+
+        Returns
+        -------
+        features: dict
+            'heights', 'holes' and 'row_fill' as returned by `get_height`,
+            `get_holes` and `get_row_fill`, the totals 'height' and
+            'hole_count', and 'bumpiness' and 'wells', the summed height
+            difference of neighbouring columns and the summed depth of the
+            columns lower than both neighbours, the walls counting as full.
+        """
+        heights = self.get_height()
+        holes = self.get_holes()
+        return {
+            'heights': heights,
+            'holes': holes,
+            'row_fill': self.row_fill,
+            'height': int(heights.sum()),
+            'hole_count': int(holes.sum()),
+            'bumpiness': self.bumpiness,
+            'wells': self.wells,
+        }
+
+    def _is_filled(self, row, col):
+        """Return true if a block is placed at row, col."""
+        return self.board[row, col] != 0
+
+    def _surface(self, heights, cols):
+        """Return the bumpiness and well terms that involve the given
+        columns, for a list of column heights."""
+        left = self.left_boundary
+        right = self.right_boundary
+        edge = self.height - 1
+        h = [edge] + heights[left:right+1] + [edge]
+
+        bumpiness = 0
+        wells = 0
+        pairs = {c + d - left for c in cols for d in (-1, 0)}
+        for i in pairs:
+            if 0 <= i < right - left:
+                bumpiness += abs(h[i+2] - h[i+1])
+        for i in {c + d - left for c in cols for d in (-1, 0, 1)}:
+            if 0 <= i <= right - left:
+                wells += max(min(h[i], h[i+2]) - h[i+1], 0)
+        return bumpiness, wells
+
+    def _add_blocks(self, rows, cols):
+        """Update the stats after blocks were placed at rows, cols."""
+        heights = self.fill_height[0]
+        before = heights.tolist()
+        for r, c in zip(rows, cols):
+            self.row_fill[r] += 1
+            self.holes[0, c] -= 1
+            if self.height - r - 1 > heights[c]:
+                heights[c] = self.height - r - 1
+
+        # Holes grow by the height gained beyond the new blocks.
+        changed = set(cols)
+        for c in changed:
+            self.holes[0, c] += heights[c] - before[c]
+        old = self._surface(before, changed)
+        new = self._surface(heights.tolist(), changed)
+        self.bumpiness += new[0] - old[0]
+        self.wells += new[1] - old[1]
+
+    def _remove_rows(self):
+        """Update the stats after the filled rows were removed."""
+        lines = len(self.filled_rows)
+        heights = self.fill_height[0]
+        for c in range(self.left_boundary, self.right_boundary + 1):
+            # A column whose top block was cleared may have holes beneath it.
+            height = heights[c] - lines
+            while height > 0 and not self._is_filled(self.height - height - 1, c):
+                height -= 1
+            self.holes[0, c] += height - heights[c] + lines
+            heights[c] = height
+
+        self.row_fill = np.concatenate((np.zeros(lines, dtype=int),
+                                        np.delete(self.row_fill, self.filled_rows)))
+        playfield = range(self.left_boundary, self.right_boundary + 1)
+        self.bumpiness, self.wells = self._surface(heights.tolist(), playfield)
+
+    def _recompute(self):
+        """Recompute the hash and the stats of the placed blocks from
+        scratch."""
+        rows = self.locked_rows()
+        self.hash = zobrist.board_hash(rows)
+        self.fill_height[:] = 0
+        self.holes[:] = 0
+        self.row_fill[:] = 0
+        heights = self.fill_height[0]
+        playfield = range(self.left_boundary, self.right_boundary + 1)
+        for r in range(self.height - 1):
+            for c in playfield:
+                if rows[r] >> c & 1:
+                    self.row_fill[r] += 1
+                    if heights[c] == 0:
+                        heights[c] = self.height - r - 1
+                elif heights[c] != 0:
+                    self.holes[0, c] += 1
+        self.bumpiness, self.wells = self._surface(heights.tolist(), playfield)
+
+    def load_rows(self, rows):
+        """Replace the placed blocks by a list of row bitmasks laid out like
+        `locked_rows` returns them. The board must not have a current
+        tetromino, call `start_game` afterwards."""
+        self._own()
+        weights = 1 << np.arange(self.width)
+        playfield = np.zeros(self.width, dtype=bool)
+        playfield[self.left_boundary:self.right_boundary+1] = True
+        blocks = (np.array(rows[:self.height-1])[:, None] & weights) != 0
+        self.board[:self.height-1] = blocks & playfield
+        self._recompute()
+
+    def add_garbage(self, tetromino, holes):
+        """Push the placed blocks up by one row per entry of holes and fill
+        the rows freed at the bottom, leaving a gap at each hole column
+        (0 to 9 across the playfield).
+
+        The tetromino moves up if the garbage reaches it. The game tops out
+        if blocks are pushed off the top or the tetromino no longer fits.
+        """
+        self._own()
+        if self.current_tetromino is not None:
+            self._paint_current(0)
+            self.current_tetromino = None
+        rows = self.locked_rows()
+        floor = rows.pop()
+        full = (1 << self.width) - 1
+        playfield = full & ~(((1 << self.left_boundary) - 1) |
+                             (full << (self.right_boundary + 1)) & full)
+        n = len(holes)
+        if any(row & playfield for row in rows[:n]):
+            self.top_out = True
+        garbage = [full & ~(1 << (self.left_boundary + hole)) for hole in holes]
+        self.load_rows(rows[n:] + garbage + [floor])
+
+        while not self._fits(tetromino) and tetromino.row > 0:
+            tetromino.row -= 1
+        if not self._fits(tetromino):
+            self.top_out = True
+        if not self.top_out:
+            self.start_game(tetromino)
+
+    # Attributes saved by `apply` and put back by `undo`.
+    _UNDO_FIELDS = ('hash', 'bumpiness', 'wells', 'holding', 'held_tetromino',
+                    'current_tetromino', 'shadow', 'placed_tetromino', 'filled_rows')
+
+    def _copy_storage(self):
+        """Copy the placed blocks."""
+        self.board = self.board.copy()
+
+    def _own(self):
+        """Copy the storage shared with a snapshot before changing it."""
+        if self._shared:
+            self._copy_storage()
+            self.fill_height = self.fill_height.copy()
+            self.holes = self.holes.copy()
+            self.row_fill = self.row_fill.copy()
+            if self.current_tetromino is not None:
+                self.current_tetromino = self.current_tetromino.copy()
+            if self.shadow is not None:
+                self.shadow = self.shadow.copy()
+            self._shared = False
+
+    def snapshot(self):
+        """Return the state of the board, to go back to with `restore`.
+
+        Nothing is copied: the board shares its storage with the snapshot
+        and copies it the next time it changes.
+        """
+        self._shared = True
+        return dict(self.__dict__), len(self._undo)
+
+    def restore(self, snapshot):
+        """Return the board to a snapshot. Applies made after the snapshot
+        was taken can no longer be undone."""
+        state, depth = snapshot
+        undo = self._undo
+        self.__dict__.update(state)
+        self._undo = undo
+        del undo[depth:]
+        self._shared = True
+
+    def _row_slice(self, start, stop):
+        """Return a copy of the placed blocks of rows start to stop."""
+        return self.board[start:stop].copy()
+
+    def _write_rows(self, start, rows):
+        """Write rows returned by `_row_slice` back from row start."""
+        self.board[start:start+len(rows)] = rows
+
+    def _paint_current(self, value):
+        """Write value into the cells of the current tetromino."""
+        p = self.current_tetromino.block_coordinates()
+        self.board[p[0], p[1]] = value
+
+    def apply(self, placement, hold=None, color=None, score=None):
+        """Lock a tetromino at a placement and clear the lines it completes,
+        so `undo` can take it back.
+
+        The current tetromino is taken off the board until the undo. Applies
+        can be nested and undone in reverse order, with no other changes to
+        the board in between.
+
+        Parameters
+        ----------
+        placement: tetris.search.Placement
+            Shape, rotation, row and column of the tetromino to lock.
+        hold: Piece, Tetromino or None
+            Tetromino put into hold by the move, None leaves the hold as it
+            is.
+        color: str or None
+            Color of the locked tetromino, the current one's by default.
+        score: Score or None
+            Score credited with the cleared lines.
+
+        Returns
+        -------
+        lines: int
+            Number of lines cleared.
+        """
+        self._own()
+        current = self.current_tetromino
+        if color is None and current is not None:
+            color = current.color
+        fields = tuple(getattr(self, name) for name in self._UNDO_FIELDS)
+        if current is not None:
+            self._paint_current(0)
+        if hold is not None:
+            self.held_tetromino = Piece(hold.shape, hold.color)
+
+        # Only the rows and columns of the tetromino change when it locks.
+        piece = Piece(placement.shape, color, placement.rotation, placement.row, placement.col)
+        geometry = GEOMETRY[piece.shape][piece.rotation_index]
+        top = piece.row + geometry.top
+        bottom = piece.row + geometry.bottom + 1
+        cols = [piece.col + dc for dc, _ in geometry.bottoms]
+        locked = (top, self._row_slice(top, bottom), self.row_fill[top:bottom].copy(),
+                  cols, self.fill_height[0, cols], self.holes[0, cols])
+        self.current_tetromino = piece
+        self._place_tetromino()
+
+        # A line clear moves every row above the lowest cleared one.
+        cleared = None
+        filled = self._find_line_clear()
+        if filled.size:
+            last = int(filled.max()) + 1
+            cleared = (self._row_slice(0, last), self.row_fill[:last].copy(),
+                       self.fill_height.copy(), self.holes.copy())
+            self._line_clear_check()
+        lines = len(filled)
+
+        scored = None
+        if score is not None:
+            scored = (score, score.score, score.line_count, score.level)
+            if lines:
+                score.add_score(lines)
+        self._undo.append((fields, locked, cleared, scored))
+        return lines
+
+    def undo(self):
+        """Take back the last `apply`."""
+        self._own()
+        fields, locked, cleared, scored = self._undo.pop()
+        if cleared is not None:
+            rows, row_fill, heights, holes = cleared
+            self._write_rows(0, rows)
+            self.row_fill[:len(row_fill)] = row_fill
+            self.fill_height[:] = heights
+            self.holes[:] = holes
+
+        top, rows, row_fill, cols, heights, holes = locked
+        self._write_rows(top, rows)
+        self.row_fill[top:top+len(row_fill)] = row_fill
+        self.fill_height[0, cols] = heights
+        self.holes[0, cols] = holes
+
+        for name, value in zip(self._UNDO_FIELDS, fields):
+            setattr(self, name, value)
+        if self.current_tetromino is not None:
+            self._paint_current(1)
+        if scored is not None:
+            score, score.score, score.line_count, score.level = scored
+
+    def locked_rows(self):
+        """Return the placed blocks as a new list of row bitmasks, laid out
+        like the rows of `BitBoard` with the walls and floor set."""
+        board = self.board[:self.height-1] != 0
+        if self.current_tetromino is not None:
+            p = self.current_tetromino.block_coordinates()
+            board[p[0], p[1]] = False
+
+        full = (1 << self.width) - 1
+        walls = full & ~(((1 << (self.width - 6)) - 1) << 3)
+        weights = 1 << np.arange(self.width)
+        rows = [int(mask) | walls for mask in board.dot(weights)]
+        rows.append(full)
+        return rows
+
     def _find_line_clear(self):
         """Locate the rows that have a line clear.
 
@@ -56,22 +375,26 @@ class Board:
         """Check to see if there is a line clear. If there is, delete the rows
         that contain the line clear are deleted.
         """
+        self._own()
         self.filled_rows = self._find_line_clear()
         if self.filled_rows.size != 0:
+            # Only the rows down to the lowest line clear move.
+            last = int(self.filled_rows.max()) + 1
+            weights = 1 << np.arange(self.width)
+            old = [int(mask) for mask in (self.board[:last] != 0).dot(weights)]
+            new = [0]*len(self.filled_rows) + [mask for r, mask in enumerate(old)
+                                               if r not in self.filled_rows]
+            for r in range(last):
+                if old[r] != new[r]:
+                    self.hash = zobrist.update(self.hash, r, old[r], new[r])
+
             # Delete the rows that have a line clears.
             self.board = np.delete(self.board, self.filled_rows, axis=0)
-            self.fill_height -= self.filled_rows.size
 
             # Pad the top of the board with rows of 0's.
             npad = ((len(self.filled_rows), 0), (0, 0))
             self.board = np.pad(self.board, pad_width=npad, mode='constant')
-
-            # Adjust heights if needed - special case where the line clear is at
-            # the top and there are holes directly beneath the line clear.
-            for i in range(3, self.width-3):
-                if self.height - max(self.filled_rows) - 2 == self.fill_height[0, i]:
-                    while self.board[self.height - self.fill_height[0, i] - 1, i] == 0:
-                        self.fill_height[0, i] -= 1
+            self._remove_rows()
 
     def _collision(self, tetromino):
         """Check to see if tetromino has collided with a placed tetromino."""
@@ -80,26 +403,79 @@ class Board:
             return True
         return False
 
+    def _fits(self, tetromino):
+        """Return true if the tetromino is inside the boundaries and does not
+        collide with a placed tetromino. The current tetromino is ignored."""
+        geometry = GEOMETRY[tetromino.shape][tetromino.rotation_index]
+        if (tetromino.col + geometry.left < self.left_boundary or
+                tetromino.col + geometry.right > self.right_boundary):
+            return False
+        if self.current_tetromino is None:
+            return not self._collision(tetromino)
+
+        p = self.current_tetromino.block_coordinates()
+        self.board[p[0], p[1]] = 0
+        fits = not self._collision(tetromino)
+        self.board[p[0], p[1]] = 1
+        return fits
+
+    def _drop_row(self, tetromino):
+        """Return the lowest row the tetromino can drop to.
+
+        The landing row is found in one step from the lowest block of each
+        column of the tetromino and the column heights. If the tetromino is
+        already below the top of one of its columns (tucked under an overhang)
+        the heights do not apply and it is stepped down instead.
+        """
+        heights = self.fill_height[0]
+        col = tetromino.col
+        row = min(self.height - heights[col + dc] - dr - 2
+                  for dc, dr in GEOMETRY[tetromino.shape][tetromino.rotation_index].bottoms)
+        if row >= tetromino.row:
+            return int(row)
+
+        start = tetromino.row
+        while not self._collision(tetromino):
+            tetromino.row += 1
+        row = tetromino.row - 1
+        tetromino.row = start
+        return row
+
+    def _find_shadow(self, tetromino):
+        """Set the shadow to the tetromino dropped as far down as it can
+        go."""
+        if self.shadow is None:
+            self.shadow = Piece.of(tetromino)
+        else:
+            self.shadow.set(tetromino)
+        self.shadow.row = self._drop_row(tetromino)
+
+    def _set_current(self, tetromino):
+        """Set the current piece to the position of the tetromino."""
+        if self.current_tetromino is None:
+            self.current_tetromino = Piece.of(tetromino)
+        else:
+            self.current_tetromino.set(tetromino)
+
     def start_game(self, new_tetromino):
         """Begin the game with a new tetromino"""
+        self._own()
 
         # Find shadow for new tetromino.
-        self.shadow = copy.deepcopy(new_tetromino)
-        while not self._collision(self.shadow):
-            self.shadow.row += 1
-        self.shadow.row -= 1
+        self._find_shadow(new_tetromino)
 
         # Write the new tetromino with its new position onto the board.
         p = new_tetromino.block_coordinates()
         self.board[p[0], p[1]] = 1
 
         # Save the new tetromino as the current one.
-        self.current_tetromino = copy.deepcopy(new_tetromino)
+        self._set_current(new_tetromino)
 
 
     def _update_board(self, new_tetromino, drop=False):
         """Update the state of the board and the tetromino's position. Return
         true if the tetromino is placed, false otherwise."""
+        self._own()
 
         # Erase image of current tetromino (if it exists).
         if self.current_tetromino is not None:
@@ -125,88 +501,90 @@ class Board:
                 return False
 
         # Find shadow for new tetromino.
-        self.shadow = copy.deepcopy(new_tetromino)
-        while not self._collision(self.shadow):
-            self.shadow.row += 1
-        self.shadow.row -= 1
+        self._find_shadow(new_tetromino)
 
         # Write the new tetromino with its new position onto the board.
         p = new_tetromino.block_coordinates()
         self.board[p[0], p[1]] = 1
 
         # Save the new tetromino as the current one.
-        self.current_tetromino = copy.deepcopy(new_tetromino)
+        self._set_current(new_tetromino)
 
         return False
 
     def _place_tetromino(self):
         """Place the tetromino onto the board."""
+        self._own()
 
         # Integrate tetromino into board & update heights.
         p = self.current_tetromino.block_coordinates()
         self.board[p[0], p[1]] = 1
-
-        for i in np.unique(p[1]):
-            self.fill_height[0, i] = np.maximum(
-                self.fill_height[0, i],
-                self.height - np.min(p[0][np.where(p[1] == i)]) - 1
-                )
+        rows = p[0].tolist()
+        cols = p[1].tolist()
+        for r, c in zip(rows, cols):
+            self.hash ^= zobrist.KEYS[r][c]
+        self._add_blocks(rows, cols)
+        self.placed_tetromino = self.current_tetromino
         self.current_tetromino = None
         self.holding = False
 
+    def can_hold(self, tetromino):
+        """Return true if `hold` would swap the tetromino out."""
+        if self.holding:
+            return False
+        held = self.held_tetromino
+        return self._fits(Piece(held.shape if held is not None else tetromino.next_shape, None))
+
     def hold(self, tetromino):
-        """Hold the tetromino."""
-        if not self.holding:
-            if self.held_tetromino == None:
-                self.held_tetromino = Tetromino()
-                self.held_tetromino.copy_held(tetromino)
+        """Hold the tetromino and bring back the held one, or the next one
+        if nothing is held yet, at the spawn position. Nothing happens if a
+        tetromino was already held since the last lock, or if the one coming
+        out of the hold would collide at the spawn position, like in
+        `tetris.batch.BatchBoard`."""
+        if self.can_hold(tetromino):
+            held = self.held_tetromino
+            self.held_tetromino = Piece(tetromino.shape, tetromino.color)
+            if held is None:
                 tetromino.new_shape()
             else:
-                temp_tet = copy.deepcopy(self.held_tetromino)
-                self.held_tetromino.copy_held(tetromino)
-                tetromino.copy_held(temp_tet)
+                tetromino.copy_held(held)
             self.holding = True
             self._update_board(tetromino)
 
 
+    def _kick(self, tetromino):
+        """Ensure none of the tetromino's blocks surpass the boundaries when
+        rotating."""
+        geometry = GEOMETRY[tetromino.shape][tetromino.rotation_index]
+        if tetromino.col + geometry.right >= self.right_boundary:
+            tetromino.col -= tetromino.col + geometry.right - self.right_boundary
+        if tetromino.col + geometry.left <= self.left_boundary:
+            tetromino.col += self.left_boundary - tetromino.col - geometry.left
+
     def rotate_right(self, tetromino):
         """Rotate the tetromino shape right."""
         tetromino.rotation_index = (tetromino.rotation_index + 1)%4
-        p = tetromino.block_coordinates()
-
-        # Ensure none of the tetromino's blocks surpass the boundaries when
-        # rotating.
-        if np.max(p[1]) >= self.right_boundary:
-            tetromino.col -= np.max(p[1]) - self.right_boundary
-        if np.min(p[1]) <= self.left_boundary:
-            tetromino.col += self.left_boundary - np.min(p[1])
+        self._kick(tetromino)
         self._update_board(tetromino)
 
     def rotate_left(self, tetromino):
         """Rotate the tetromino shape left."""
         tetromino.rotation_index = (tetromino.rotation_index - 1)%4
-        p = tetromino.block_coordinates()
-
-        # Ensure none of the tetromino's blocks surpass the boundaries when
-        # rotating.
-        if np.max(p[1]) >= self.right_boundary:
-            tetromino.col -= np.max(p[1]) - self.right_boundary
-        if np.min(p[1]) <= self.left_boundary:
-            tetromino.col += self.left_boundary - np.min(p[1])
+        self._kick(tetromino)
         self._update_board(tetromino)
 
     def move_right(self, tetromino):
         """Move the tetromino to the right."""
-        p = tetromino.block_coordinates()
-        if np.max(p[1]) >= self.right_boundary:
+        right = GEOMETRY[tetromino.shape][tetromino.rotation_index].right
+        if tetromino.col + right >= self.right_boundary:
             return
         tetromino.col += 1
         self._update_board(tetromino)
 
     def move_left(self, tetromino):
         """Move the tetromino to the left."""
-        p = tetromino.block_coordinates()
-        if np.min(p[1]) <= self.left_boundary:
+        left = GEOMETRY[tetromino.shape][tetromino.rotation_index].left
+        if tetromino.col + left <= self.left_boundary:
             return
         tetromino.col -= 1
         self._update_board(tetromino)
@@ -218,11 +596,10 @@ class Board:
 
     def hard_drop(self, tetromino):
         """Instantly drop the tetromino to the bottom of the board."""
+        self._own()
         p = tetromino.block_coordinates()
         self.board[p[0], p[1]] = 0
-        while not self._collision(tetromino):
-            tetromino.row += 1
-        tetromino.row -= 1
+        tetromino.row = self._drop_row(tetromino)
         self._update_board(tetromino)
 
     def up(self, tetromino):
@@ -231,15 +608,371 @@ class Board:
         self._update_board(tetromino)
 
 
+class BitBoard(Board):
+    """Bitboard engine for the Tetris board.
+
+    Each row of the board is stored as an integer bitmask where bit i is set
+    if column i is filled. The walls and the floor are preset, so collision is
+    a handful of AND operations, a full row is a single comparison and line
+    clears compact the rows in place. The active tetromino is kept out of the
+    rows; `board` renders an array identical to the one `Board` keeps.
+    """
+
+    def __init__(self):
+        """Set the settings for the Tetris board."""
+        self.width = 10 + 6   # Accommodate for sides.
+        self.height = 20 + 4  # Accommodate for base and spawn.
+        self.left_boundary = 3
+        self.right_boundary = self.width - 4
+
+        # Columns outside the playfield are walls, the last row is the floor.
+        self.full_row = (1 << self.width) - 1
+        self.walls = self.full_row & ~(((1 << (self.width - 6)) - 1) << 3)
+
+        self.fill_height = np.zeros((1, self.width), dtype=int)
+        self.rows = [self.walls]*(self.height - 1) + [self.full_row]
+        self.filled_rows = np.array([])
+        self.placed_rows = ()
+        self.placed_tetromino = None
+        self.hash = 0  # Zobrist hash of the placed blocks.
+
+        # Stats kept up to date on every lock and line clear.
+        self.holes = np.zeros((1, self.width), dtype=int)
+        self.row_fill = np.zeros(self.height - 1, dtype=int)
+        self.bumpiness = 0
+        self.wells = 0
+
+        self.top_out = False
+        self.current_tetromino = None
+        self.shadow = None
+
+        self.holding = False
+        self.held_tetromino = None
+
+        self._shared = False  # Storage is shared with a snapshot.
+        self._undo = []
+
+    @property
+    def board(self):
+        """Return the board as a numpy array in the same layout as `Board`."""
+        board = np.empty((self.height, self.width), dtype=int)
+        rows = np.array(self.rows[:-1], dtype=int) & ~self.walls
+        board[:-1] = rows[:, None] >> np.arange(self.width) & 1
+        board[self.height-1, :] = 9
+        if self.current_tetromino is not None:
+            p = self.current_tetromino.block_coordinates()
+            board[p[0], p[1]] = 1
+        return board
+
+    def _find_line_clear(self):
+        """Locate the rows that have a line clear.
+
+        Only the rows the last tetromino was placed on can be full, so each of
+        them is compared against a full row once.
+
+        Returns
+        -------
+        filled_rows: numpy array of integers
+            Contains the rows that have a line clear.
+        """
+        rows = self.rows
+        return np.array([r for r in self.placed_rows if rows[r] == self.full_row],
+                        dtype=int)
+
+    def _line_clear_check(self):
+        """Check to see if there is a line clear. If there is, compact the
+        remaining rows downwards in place.
+        """
+        self._own()
+        self.filled_rows = self._find_line_clear()
+        if self.filled_rows.size != 0:
+            rows = self.rows
+            full = self.full_row
+            h = self.hash
+            write = int(self.filled_rows.max())
+            for read in range(write, -1, -1):
+                if rows[read] != full:
+                    if rows[write] != rows[read]:
+                        h = zobrist.update(h, write, rows[write], rows[read])
+                        rows[write] = rows[read]
+                    write -= 1
+            for r in range(write + 1):
+                if rows[r] != self.walls:
+                    h = zobrist.update(h, r, rows[r], self.walls)
+                    rows[r] = self.walls
+            self.hash = h
+            self._remove_rows()
+
+    def _is_filled(self, row, col):
+        """Return true if a block is placed at row, col."""
+        return self.rows[row] >> col & 1 == 1
+
+    def locked_rows(self):
+        """Return a copy of the rows."""
+        return list(self.rows)
+
+    def load_rows(self, rows):
+        """Replace the placed blocks by a list of row bitmasks. See
+        `Board.load_rows`."""
+        self._own()
+        self.rows = [row | self.walls for row in rows[:self.height-1]] + [self.full_row]
+        self._recompute()
+
+    _UNDO_FIELDS = Board._UNDO_FIELDS + ('placed_rows',)
+
+    def _copy_storage(self):
+        """Copy the rows."""
+        self.rows = list(self.rows)
+
+    def _row_slice(self, start, stop):
+        """Return rows start to stop."""
+        return self.rows[start:stop]
+
+    def _write_rows(self, start, rows):
+        """Write rows returned by `_row_slice` back from row start."""
+        self.rows[start:start+len(rows)] = rows
+
+    def _paint_current(self, value):
+        """The current tetromino is not part of the rows."""
+
+    def _collision(self, tetromino):
+        """Check to see if tetromino has collided with a wall, the floor or a
+        placed tetromino."""
+        rows = self.rows
+        row = tetromino.row
+        col = tetromino.col
+        for dr, mask in GEOMETRY[tetromino.shape][tetromino.rotation_index].masks:
+            if rows[row + dr] & (mask << col):
+                return True
+        return False
+
+    def _fits(self, tetromino):
+        """Return true if the tetromino does not collide with a wall or a
+        placed tetromino."""
+        return not self._collision(tetromino)
+
+    def start_game(self, new_tetromino):
+        """Begin the game with a new tetromino"""
+        self._own()
+        self._find_shadow(new_tetromino)
+        self._set_current(new_tetromino)
+
+    def _update_board(self, new_tetromino, drop=False):
+        """Update the state of the board and the tetromino's position. Return
+        true if the tetromino is placed, false otherwise."""
+        self._own()
+
+        # If the new tetromino has a position that is a collision, place it.
+        if self._collision(new_tetromino):
+            if self.current_tetromino is None:
+                self.top_out = True
+                return True
+            if drop:
+                self._place_tetromino()
+                self._line_clear_check()
+                new_tetromino.new_shape()
+                self._update_board(new_tetromino)
+                return True
+            else:
+                new_tetromino.rotation_index = self.current_tetromino.rotation_index
+                new_tetromino.row = self.current_tetromino.row
+                new_tetromino.col = self.current_tetromino.col
+                return False
+
+        self._find_shadow(new_tetromino)
+        self._set_current(new_tetromino)
+        return False
+
+    def _place_tetromino(self):
+        """Place the tetromino onto the board."""
+        self._own()
+        tetromino = self.current_tetromino
+        row = tetromino.row
+        col = tetromino.col
+        rows = self.rows
+        geometry = GEOMETRY[tetromino.shape][tetromino.rotation_index]
+        placed = []
+        for dr, mask in geometry.masks:
+            old = rows[row + dr]
+            rows[row + dr] = old | mask << col
+            self.hash = zobrist.update(self.hash, row + dr, old, rows[row + dr])
+            placed.append(row + dr)
+        self._add_blocks((geometry.rows + row).tolist(), (geometry.cols + col).tolist())
+        self.placed_rows = tuple(placed)
+        self.placed_tetromino = tetromino
+        self.current_tetromino = None
+        self.holding = False
+
+    def hard_drop(self, tetromino):
+        """Instantly drop the tetromino to the bottom of the board."""
+        tetromino.row = self._drop_row(tetromino)
+        self._update_board(tetromino)
+
+
+class PieceGenerator:
+    """Seeded stream of tetromino shapes and colors.
+
+    Pieces are generated in blocks with numpy from the generator's own
+    RandomState, so the global random module is never touched and the same
+    seed always gives the same sequence. Drawing a piece is a list lookup and
+    the next `preview` pieces can be looked at without drawing them.
+    """
+
+    SHAPE_NAMES = tuple(SHAPES.keys())
+    MODES = ('uniform', 'bag')
+
+    def __init__(self, seed=None, mode='uniform', block=1024, preview=6):
+        """Create the generator.
+
+        Parameters
+        ----------
+        seed: int or None
+            Seed of the sequence, None for a random one.
+        mode: str
+            'uniform' draws every shape independently, 'bag' deals the seven
+            shapes in a random order before dealing them again.
+        block: int
+            Number of pieces generated at a time.
+        preview: int
+            Number of upcoming pieces that can be looked at.
+        """
+        if mode not in self.MODES:
+            raise ValueError('Unknown mode %r, expected one of %s' % (mode, self.MODES))
+        if block < 1:
+            raise ValueError('block must be at least 1, got %r' % block)
+        self.rng = np.random.RandomState(seed)
+        self.mode = mode
+        self.block = block
+        self.preview_size = preview
+        self.shapes = []
+        self.colors = []
+        self.pos = 0
+        self.drawn = 0
+        self._refill()
+
+    def _refill(self):
+        """Append blocks of pieces after the ones not drawn yet until the
+        next piece and the previewable ones after it are generated."""
+        self.shapes = self.shapes[self.pos:]
+        self.colors = self.colors[self.pos:]
+        self.pos = 0
+        while len(self.shapes) <= self.preview_size:
+            if self.mode == 'bag':
+                bags = -(-self.block//len(self.SHAPE_NAMES))
+                order = np.argsort(self.rng.random_sample((bags, len(self.SHAPE_NAMES))), axis=1)
+                shapes = order.ravel()
+            else:
+                shapes = self.rng.randint(0, len(self.SHAPE_NAMES), size=self.block)
+            colors = self.rng.randint(0, len(Tetromino.COLORS), size=len(shapes))
+            self.shapes += [self.SHAPE_NAMES[i] for i in shapes]
+            self.colors += [Tetromino.COLORS[i] for i in colors]
+
+    def next(self):
+        """Draw the next piece and return its (shape, color)."""
+        if self.pos + self.preview_size >= len(self.shapes):
+            self._refill()
+        self.pos += 1
+        self.drawn += 1
+        return self.shapes[self.pos - 1], self.colors[self.pos - 1]
+
+    def skip(self, n):
+        """Draw n pieces without returning them."""
+        while n > 0:
+            if self.pos + self.preview_size >= len(self.shapes):
+                self._refill()
+            step = min(n, len(self.shapes) - self.preview_size - self.pos)
+            self.pos += step
+            self.drawn += step
+            n -= step
+
+    def peek(self, i=0):
+        """Return the (shape, color) of the piece i draws ahead without
+        drawing it."""
+        if not 0 <= i < self.preview_size:
+            raise IndexError('Only %d pieces can be previewed' % self.preview_size)
+        return self.shapes[self.pos + i], self.colors[self.pos + i]
+
+    def preview(self, n=None):
+        """Return the shapes of the next n pieces, all previewable ones by
+        default."""
+        n = self.preview_size if n is None else min(n, self.preview_size)
+        return self.shapes[self.pos:self.pos + n]
+
+
+class Piece:
+    """Shape, color, rotation and position of a tetromino as a small value.
+
+    The board keeps its current tetromino, the shadow and the held tetromino
+    as pieces. Their geometry is shared from GEOMETRY, so a piece is five
+    fields and a move rewrites them in place instead of copying a
+    `Tetromino`.
+    """
+
+    __slots__ = ('shape', 'color', 'rotation_index', 'row', 'col')
+
+    def __init__(self, shape, color, rotation_index=0, row=3, col=6):
+        """Create a piece, by default unrotated at the spawn position."""
+        self.shape = shape
+        self.color = color
+        self.rotation_index = rotation_index
+        self.row = row
+        self.col = col
+
+    @classmethod
+    def of(cls, tetromino):
+        """Return a piece at the position of a tetromino."""
+        return cls(tetromino.shape, tetromino.color, tetromino.rotation_index,
+                   tetromino.row, tetromino.col)
+
+    def set(self, tetromino):
+        """Move the piece to the position of a tetromino."""
+        self.shape = tetromino.shape
+        self.color = tetromino.color
+        self.rotation_index = tetromino.rotation_index
+        self.row = tetromino.row
+        self.col = tetromino.col
+
+    def copy(self):
+        return Piece(self.shape, self.color, self.rotation_index, self.row, self.col)
+
+    def __repr__(self):
+        return 'Piece(%r, %r, %d, %d, %d)' % (self.shape, self.color, self.rotation_index,
+                                             self.row, self.col)
+
+    @property
+    def tetromino(self):
+        """Matrices of the shape, like `Tetromino.tetromino`."""
+        return SHAPES[self.shape]
+
+    def position(self):
+        """Return the position of the piece as tuple."""
+        return (self.row, self.col)
+
+    def block_coordinates(self):
+        """Return the board coordinates of the blocks like
+        `Tetromino.block_coordinates`."""
+        geometry = GEOMETRY[self.shape][self.rotation_index]
+        return (geometry.rows + self.row, geometry.cols + self.col)
+
+
 class Tetromino():
     """Class for the Tetrominos in Tetris."""
 
     COLORS = ['blue', 'red', 'yellow', 'orange', 'cyan', 'purple']
 
-    def __init__(self):
+    def __init__(self, pieces=None):
         """Create a random tetromino, set its position, set its left and right
         boundaries.
+
+        Parameters
+        ----------
+        pieces: PieceGenerator or None
+            Source of the shapes and colors, a new unseeded generator by
+            default. Pass a seeded one to get a reproducible sequence of
+            tetrominos.
         """
+        self.pieces = pieces if pieces is not None else PieceGenerator()
+
         # Board dimensions
         self.width = 10 + 6
 
@@ -247,18 +980,33 @@ class Tetromino():
         self.row = 3
         self.col = self.width//2 - 2
 
-        self.shape = list(SHAPES.keys())[random.randint(0, 6)]
+        self.shape, self.color = self.pieces.next()
         self.tetromino = SHAPES[self.shape]
         self.rotation_index = 0
-        self.color = self.COLORS[random.randint(0,5)]
 
-        self.next_shape = list(SHAPES.keys())[random.randint(0, 6)]
+        self.next_shape, self.next_color = self.pieces.peek()
         self.next_tetromino = SHAPES[self.next_shape]
-        self.next_color = self.COLORS[random.randint(0,5)]
 
     def reset(self):
         """Reset the tetromino."""
-        self.__init__()
+        self.__init__(self.pieces)
+
+    def __deepcopy__(self, memo):
+        """Copy the tetromino, sharing its piece generator and the shape
+        tables."""
+        memo[id(self.pieces)] = self.pieces
+        memo[id(self.tetromino)] = self.tetromino
+        memo[id(self.next_tetromino)] = self.next_tetromino
+        clone = self.__class__.__new__(self.__class__)
+        memo[id(self)] = clone
+        for name, value in self.__dict__.items():
+            setattr(clone, name, copy.deepcopy(value, memo))
+        return clone
+
+    def preview(self, n=None):
+        """Return the shapes of the next n tetrominos, see
+        `PieceGenerator.preview`."""
+        return self.pieces.preview(n)
 
     def copy_held(self, tetromino):
         self.row = 3
@@ -273,17 +1021,15 @@ class Tetromino():
         return self.tetromino[self.rotation_index]
 
     def new_shape(self):
-        """Randomly generate new shape."""
+        """Draw the next shape from the piece generator."""
         self.row = 3
         self.col = self.width//2 - 2
-        self.shape = self.next_shape
-        self.tetromino = copy.deepcopy(self.next_tetromino)
-        self.color = self.next_color
+        self.shape, self.color = self.pieces.next()
+        self.tetromino = SHAPES[self.shape]
         self.rotation_index = 0
 
-        self.next_shape = list(SHAPES.keys())[random.randint(0, 6)]
+        self.next_shape, self.next_color = self.pieces.peek()
         self.next_tetromino = SHAPES[self.next_shape]
-        self.next_color = self.COLORS[random.randint(0,5)]
 
     def position(self):
         """Return the position of the tetromino as tuple."""
@@ -295,9 +1041,8 @@ class Tetromino():
         Returns a tuple of a pair of np arrays. The first array contains the
         rows and the second array contains columns.
         """
-        rows = np.where(self.next_tetromino[0] == 1)[0]
-        cols = np.where(self.next_tetromino[0] == 1)[1]
-        return (rows, cols)
+        geometry = GEOMETRY[self.next_shape][0]
+        return (geometry.rows, geometry.cols)
 
     def block_coordinates(self):
         """Return the coordinates for every block in the tetromino matrix
@@ -306,9 +1051,8 @@ class Tetromino():
         Returns a tuple of a pair of np arrays. The first array contains the
         rows and the second array contains columns.
         """
-        rows = np.where(self.tetromino[self.rotation_index] == 1)[0] + self.row
-        cols = np.where(self.tetromino[self.rotation_index] == 1)[1] + self.col
-        return (rows, cols)
+        geometry = GEOMETRY[self.shape][self.rotation_index]
+        return (geometry.rows + self.row, geometry.cols + self.col)
 
 
 class Score:
@@ -0,0 +1,333 @@
+"""Training data from headless games.
+
+Every step of a game becomes one fixed size record of RECORD_DTYPE: the
+placed blocks as bit-packed rows, the current, next and held pieces, the
+action taken, and the lines and score it gained. `ShardWriter` streams the
+records into .npy shards of a fixed number of records and lists them in a
+JSON manifest. A background thread does the writing, so the games only
+fill small chunks in memory. `ShardReader` memory maps the shards and
+samples minibatches across all of them without loading them whole.
+
+    generate('data', n_games=1000, policy=GreedyAI())
+    reader = ShardReader('data')
+    batch = reader.sample(256)
+    boards = unpack_boards(batch['board'])
+"""
+
+import json
+import os
+import queue
+import threading
+import numpy as np
+from tetris import zobrist
+from tetris.core import BitBoard, PieceGenerator
+from tetris.simulator import Simulator, ACTIONS
+
+
+VERSION = 1
+MANIFEST = 'manifest.json'
+
+EMPTY = 0xff    # No held piece.
+LEFT = zobrist.LEFT
+PLAYFIELD = zobrist.PLAYFIELD
+
+# Shapes are indices into SHAPES, actions into tetris.simulator.ACTIONS.
+SHAPES = PieceGenerator.SHAPE_NAMES
+SHAPE_INDEX = {shape: i for i, shape in enumerate(SHAPES)}
+ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+
+RECORD_DTYPE = np.dtype([
+    ('board', '<u2', (zobrist.HEIGHT - 1,)),
+    ('shape', 'u1'), ('rotation', 'u1'), ('row', 'u1'), ('col', 'u1'),
+    ('next', 'u1'), ('held', 'u1'),
+    ('action', 'u1'), ('lines', 'u1'), ('score_delta', '<u4'),
+])
+
+
+def observe(simulator):
+    """Return the state fields of a record, the board up to 'held', for a
+    simulator, as `ShardWriter.append_fields` takes them. The board is the
+    simulator's `locked_rows()`, walls and floor included."""
+    board = simulator.board
+    tetromino = simulator.tetromino
+    held = board.held_tetromino
+    return (board.locked_rows(),
+            SHAPE_INDEX[tetromino.shape], tetromino.rotation_index,
+            tetromino.row, tetromino.col,
+            SHAPE_INDEX[tetromino.next_shape],
+            SHAPE_INDEX[held.shape] if held is not None else EMPTY)
+
+
+def unpack_boards(rows):
+    """Return bit-packed rows of shape (..., 23) as a boolean array of shape
+    (..., 23, 10), top row and left column first."""
+    rows = np.asarray(rows)
+    return (rows[..., None] >> np.arange(zobrist.COLUMNS, dtype=rows.dtype) & 1).astype(bool)
+
+
+class ShardWriter:
+    """Writes records into memory mapped .npy shards in a background thread.
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the shards and the manifest. It is created if needed,
+        and shards already listed in its manifest are kept.
+    shard_size: int
+        Records per shard. Only the last shard is cut to the records
+        written when the writer closes.
+    chunk_size: int
+        Records handed to the thread at a time.
+    queue_size: int
+        Chunks waiting for the thread. `append` only blocks when the thread
+        is this far behind, which bounds the memory used.
+
+    The manifest is replaced after every finished shard, so readers see
+    only complete shards while the export runs.
+    """
+
+    def __init__(self, directory, shard_size=1 << 20, chunk_size=4096, queue_size=64):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+        self.shards = []
+        manifest = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest) as fp:
+                self.shards = json.load(fp)['shards']
+        self.records = sum(shard['records'] for shard in self.shards)
+
+        self._new_chunk()
+        self._queue = queue.Queue(queue_size)
+        self._shard = None
+        self._shard_path = None
+        self._shard_filled = 0
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='shard-writer', daemon=True)
+        self._thread.start()
+
+    def append(self, record):
+        """Add a record, a tuple of the RECORD_DTYPE fields."""
+        self._chunk[self._filled] = record
+        self._next()
+
+    def append_fields(self, rows, shape, rotation, row, col, next_shape, held, action, lines,
+                      score_delta):
+        """Add a record from its fields, written straight into the chunk.
+
+        rows are the rows of a board with the walls and the floor, like
+        `BitBoard.rows` or `Board.locked_rows()`. They are packed like
+        `tetris.zobrist.pack` for the whole chunk at once when it is handed
+        to the thread.
+        """
+        self._chunk[self._filled] = (rows[:-1], shape, rotation, row, col, next_shape, held,
+                                     action, lines, score_delta)
+        self._unpacked[self._filled] = True
+        self._next()
+
+    def _new_chunk(self):
+        self._chunk = np.empty(self.chunk_size, dtype=RECORD_DTYPE)
+        self._unpacked = np.zeros(self.chunk_size, dtype=bool)
+        self._filled = 0
+
+    def _next(self):
+        self._filled += 1
+        if self._filled == self.chunk_size:
+            self._flush_chunk()
+
+    def _flush_chunk(self):
+        if self._error is not None:
+            raise self._error
+        if self._filled:
+            unpacked = self._unpacked[:self._filled]
+            boards = self._chunk['board'][:self._filled]
+            boards[unpacked] = boards[unpacked] >> LEFT & PLAYFIELD
+            self._queue.put(self._chunk[:self._filled])
+            self.records += self._filled
+            self._new_chunk()
+
+    def close(self):
+        """Write out the remaining records, cut the last shard and save the
+        manifest."""
+        self._flush_chunk()
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        try:
+            while True:
+                chunk = self._queue.get()
+                if chunk is None:
+                    break
+                self._write(chunk)
+            if self._shard is not None:
+                self._finish_shard()
+            else:
+                # Also list an export without records.
+                self._save_manifest()
+        except Exception as error:
+            self._error = error
+            # Keep taking chunks so append never blocks on a dead thread.
+            while self._queue.get() is not None:
+                pass
+
+    def _write(self, chunk):
+        offset = 0
+        while offset < len(chunk):
+            if self._shard is None:
+                name = 'shard-%05d.npy' % len(self.shards)
+                self._shard_path = os.path.join(self.directory, name)
+                self._shard = np.lib.format.open_memmap(
+                    self._shard_path, mode='w+', dtype=RECORD_DTYPE, shape=(self.shard_size,))
+                self._shard_filled = 0
+            n = min(len(chunk) - offset, self.shard_size - self._shard_filled)
+            self._shard[self._shard_filled:self._shard_filled + n] = chunk[offset:offset + n]
+            self._shard_filled += n
+            offset += n
+            if self._shard_filled == self.shard_size:
+                self._finish_shard()
+
+    def _finish_shard(self):
+        shard = self._shard
+        filled = self._shard_filled
+        shard.flush()
+        self._shard = None
+        if filled < len(shard):
+            temp = self._shard_path + '.tmp'
+            with open(temp, 'wb') as fp:
+                np.save(fp, shard[:filled])
+            del shard
+            os.replace(temp, self._shard_path)
+        else:
+            del shard
+        self.shards.append({'path': os.path.basename(self._shard_path), 'records': filled})
+        self._save_manifest()
+
+    def _save_manifest(self):
+        manifest = {
+            'version': VERSION,
+            'dtype': np.lib.format.dtype_to_descr(RECORD_DTYPE),
+            'shard_size': self.shard_size,
+            'records': sum(shard['records'] for shard in self.shards),
+            'shards': self.shards,
+            'shapes': list(SHAPES),
+            'actions': list(ACTIONS),
+        }
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w') as fp:
+            json.dump(manifest, fp, indent=1)
+        os.replace(path + '.tmp', path)
+
+
+class ShardReader:
+    """Random access to the shards of an export.
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the manifest.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, MANIFEST)) as fp:
+            manifest = json.load(fp)
+        if manifest['version'] != VERSION:
+            raise ValueError('Unsupported dataset version %r' % manifest['version'])
+        self.manifest = manifest
+        self.shards = [np.load(os.path.join(directory, shard['path']), mmap_mode='r')
+                       for shard in manifest['shards']]
+        self.sizes = np.array([len(shard) for shard in self.shards], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.sizes)])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, index):
+        """Return the record at a global index."""
+        shard = int(np.searchsorted(self.offsets, index, side='right')) - 1
+        return self.shards[shard][index - self.offsets[shard]]
+
+    def sample(self, batch_size, rng=None):
+        """Return a minibatch of records drawn uniformly from all shards.
+
+        Only the pages holding the drawn records are read. Raises ValueError
+        if the export has no records.
+        """
+        if len(self) == 0:
+            raise ValueError('Cannot sample from an empty export')
+        rng = rng if rng is not None else np.random
+        return self._gather(rng.randint(0, len(self), size=batch_size))
+
+    def batches(self, batch_size, rng=None):
+        """Yield minibatches that visit every record once in random order."""
+        rng = rng if rng is not None else np.random
+        order = rng.permutation(len(self))
+        for start in range(0, len(order), batch_size):
+            yield self._gather(order[start:start + batch_size])
+
+    def _gather(self, indices):
+        """Return the records at global indices, in the order of indices."""
+        shards = np.searchsorted(self.offsets, indices, side='right') - 1
+        batch = np.empty(len(indices), dtype=RECORD_DTYPE)
+        # Reading each shard in index order keeps the page accesses
+        # sequential.
+        for shard in np.unique(shards):
+            positions = np.flatnonzero(shards == shard)
+            local = indices[positions] - self.offsets[shard]
+            order = np.argsort(local)
+            batch[positions[order]] = self.shards[shard][local[order]]
+        return batch
+
+
+def generate(directory, n_games, policy, seed=0, board=BitBoard, max_steps=10000,
+             **writer_options):
+    """Play headless games and export every step.
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the export, see `ShardWriter`.
+    n_games: int
+        Number of games to play.
+    policy: callable
+        Called with the Simulator, returns the next action, like in
+        `tetris.runner.run`.
+    seed: int
+        Seed of the run. Game i is played with seed + i.
+    board: Board class
+        Board engine of the simulator.
+    max_steps: int
+        Maximum number of actions per game.
+    writer_options:
+        Passed on to `ShardWriter`.
+
+    Returns
+    -------
+    records: int
+        Total records in the export.
+    """
+    simulator = Simulator(board)
+    with ShardWriter(directory, **writer_options) as writer:
+        for game in range(n_games):
+            simulator.reset(seed + game)
+            for _ in range(max_steps):
+                action = policy(simulator)
+                if not isinstance(action, str):
+                    action = ACTIONS[action]
+                state = observe(simulator)
+                score = simulator.score.score
+                lines = simulator.act(action)[1]
+                writer.append_fields(*state, ACTION_INDEX[action], lines,
+                                     simulator.score.score - score)
+                if simulator.board.top_out:
+                    break
+    return writer.records
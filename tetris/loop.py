@@ -0,0 +1,191 @@
+"""Fixed timestep game loop.
+
+Game logic advances in ticks of 1/tick_rate seconds. Gravity, lock delay
+and key repeat are counted in ticks, so a game only depends on its seed and
+on the inputs of every tick. It can be played in real time by `game.Game`,
+several ticks per frame in turbo mode, or as fast as possible without
+pygame through `TickLoop.run`.
+"""
+
+from tetris.simulator import Simulator
+
+
+# Actions that repeat while their key is held.
+REPEATABLE = ('move_left', 'move_right', 'soft_drop')
+
+
+class TickLoop:
+    """Deterministic tick based driver of a `Simulator`.
+
+    Parameters
+    ----------
+    simulator: Simulator or None
+        Game to drive, a new BitBoard simulator by default.
+    tick_rate: int
+        Ticks per second of game time.
+    drop_interval: int
+        Milliseconds between gravity drops at level 0.
+    level_speedup: int
+        Milliseconds the drop interval shrinks by per level.
+    lock_delay: int
+        Milliseconds a landed tetromino can still move before gravity locks
+        it. Zero locks it on the next gravity drop.
+    repeat_delay, repeat_interval: int
+        Milliseconds before a held key repeats and between repeats.
+
+    All durations are converted to whole ticks once.
+
+    Attributes
+    ----------
+    recorder: tetris.replay.Recorder or None
+        Told about every reset, input and tick, see `tetris.replay`.
+    """
+
+    def __init__(self, simulator=None, tick_rate=60, drop_interval=1000,
+                 level_speedup=75, lock_delay=0, repeat_delay=150, repeat_interval=30):
+        self.simulator = simulator if simulator is not None else Simulator()
+        self.tick_rate = tick_rate
+        self.drop_interval = drop_interval
+        self.level_speedup = level_speedup
+        self.lock_delay = self.to_ticks(lock_delay) if lock_delay else 0
+        self.repeat_delay = self.to_ticks(repeat_delay)
+        self.repeat_interval = self.to_ticks(repeat_interval)
+        self.tick_count = 0
+        self.lines = 0
+        self.pressed = []
+        self.held = {}
+        self.gravity = 0
+        self.grounded = 0
+        self.recorder = None
+
+    def to_ticks(self, ms):
+        """Convert milliseconds to a whole number of ticks, at least one."""
+        return max(1, int(round(ms*self.tick_rate/1000)))
+
+    def gravity_ticks(self):
+        """Return the ticks between gravity drops at the current level."""
+        level = self.simulator.score.level
+        return self.to_ticks(self.drop_interval - self.level_speedup*level)
+
+    def reset(self, seed=None):
+        """Start a new game. See `Simulator.reset`."""
+        if self.recorder is not None:
+            seed = self.recorder.reset(self, seed)
+        self.simulator.reset(seed)
+        self.tick_count = 0
+        self.lines = 0
+        self.pressed = []
+        self.held = {}
+        self.gravity = 0
+        self.grounded = 0
+
+    def press(self, action, repeat=True):
+        """Apply an action on the next tick. With repeat, actions of
+        REPEATABLE keep repeating until released."""
+        if self.recorder is not None:
+            self.recorder.input(self, action, repeat)
+        self.pressed.append(action)
+        if repeat and action in REPEATABLE:
+            self.held[action] = 0
+
+    def release(self, action):
+        """Stop repeating an action."""
+        if self.recorder is not None and action in self.held:
+            self.recorder.input(self, action, release=True)
+        self.held.pop(action, None)
+
+    def _resting(self):
+        """Return true if the tetromino cannot move down."""
+        tetromino = self.simulator.tetromino
+        tetromino.row += 1
+        fits = self.simulator.board._fits(tetromino)
+        tetromino.row -= 1
+        return not fits
+
+    def tick(self):
+        """Advance the game by one tick.
+
+        Returns
+        -------
+        placed: list of Tetromino
+            Copies of the tetrominos locked during the tick, in order.
+        lines: int
+            Number of lines cleared during the tick.
+        done: bool
+            True once the game has topped out.
+        """
+        simulator = self.simulator
+        board = simulator.board
+        actions = self.pressed
+        self.pressed = []
+        for action, held in self.held.items():
+            if held >= self.repeat_delay and (held - self.repeat_delay)%self.repeat_interval == 0:
+                actions.append(action)
+            self.held[action] = held + 1
+
+        # Dropping by hand restarts the gravity timer.
+        self.gravity += 1
+        if 'soft_drop' in actions:
+            self.gravity = 0
+        elif self.gravity >= self.gravity_ticks():
+            self.gravity = 0
+            if self.lock_delay and self._resting():
+                if self.grounded >= self.lock_delay:
+                    actions.append('soft_drop')
+            else:
+                actions.append('soft_drop')
+
+        placed = []
+        lines = 0
+        for action in actions:
+            if board.top_out:
+                break
+            before = board.placed_tetromino
+            lines += simulator.act(action)[1]
+            if board.placed_tetromino is not before:
+                placed.append(board.placed_tetromino)
+                self.grounded = 0
+
+        if self.lock_delay:
+            self.grounded = self.grounded + 1 if self._resting() else 0
+        self.tick_count += 1
+        self.lines += lines
+        if self.recorder is not None:
+            self.recorder.after_tick(self)
+        return placed, lines, board.top_out
+
+    def run(self, policy=None, seed=None, max_ticks=None):
+        """Play a game as fast as possible.
+
+        Parameters
+        ----------
+        policy: callable or None
+            Called with the simulator every tick, returns an action or None.
+            With None the tetrominos only fall.
+        seed: int or None
+            Seed of the game.
+        max_ticks: int or None
+            Stop after this many ticks.
+
+        Returns
+        -------
+        result: dict
+            'score', 'lines', 'level', 'pieces' and 'ticks' of the game.
+        """
+        self.reset(seed)
+        simulator = self.simulator
+        while not simulator.board.top_out:
+            if max_ticks is not None and self.tick_count >= max_ticks:
+                break
+            if policy is not None:
+                action = policy(simulator)
+                if action is not None:
+                    self.press(action, repeat=False)
+            self.tick()
+        return {
+            'score': simulator.score.score,
+            'lines': self.lines,
+            'level': simulator.score.level,
+            'pieces': simulator.pieces,
+            'ticks': self.tick_count,
+        }
@@ -0,0 +1,226 @@
+"""Observation encoders for learning agents.
+
+The encoders write a board's observation into arrays the caller allocates
+once with `allocate`, instead of slicing the board, removing the current
+tetromino and rebuilding tetromino matrices on every step. An observation
+is a dict of arrays:
+
+- 'planes': (3, 20, 10) visible playfield without the current tetromino,
+  the current tetromino and its shadow, top row first.
+- 'next', 'held': (7,) one-hots of the next and held shapes in the order
+  of `PieceGenerator.SHAPE_NAMES`, all zero when nothing is held.
+- 'fill_height': (10,) `Board.fill_height` of every playfield column.
+
+With packed=True the planes are (3, 20, 2) uint8 instead: every row is its
+10 bit mask as a little endian uint16, bit c for column c, like
+`tetris.zobrist.pack`. `unpack_planes` expands them again.
+
+A batch adds a leading axis to every array. `encode_batch` fills it from a
+list of boards and `encode_batch_board` from a `tetris.batch.BatchBoard`
+with array operations.
+"""
+
+import numpy as np
+from tetris import zobrist
+from tetris.core import BitBoard, PieceGenerator
+from tetris.utils import GEOMETRY
+
+
+SHAPES = PieceGenerator.SHAPE_NAMES
+SHAPE_INDEX = {shape: i for i, shape in enumerate(SHAPES)}
+
+PLANES = ('playfield', 'piece', 'shadow')
+TOP = 3                         # First visible row of the board.
+ROWS = 20
+COLUMNS = zobrist.COLUMNS
+LEFT = zobrist.LEFT
+PLAYFIELD = zobrist.PLAYFIELD
+
+# Block offsets of every shape and rotation as tuples, so drawing a piece
+# does not touch numpy.
+CELLS = {shape: [tuple(zip(g.rows.tolist(), g.cols.tolist())) for g in rotations]
+         for shape, rotations in GEOMETRY.items()}
+
+# Columns of every 16 bit BitBoard row, walls included in the index, per
+# dtype of the planes.
+_tables = {}
+
+# Scratch buffers, so encoding a step allocates no arrays. They make the
+# encoders unsafe to call from several threads at once.
+_rows = np.zeros(ROWS, dtype=np.intp)
+_WEIGHTS = (1 << np.arange(COLUMNS)).astype(np.intp)
+
+
+def _row_table(dtype):
+    table = _tables.get(dtype)
+    if table is None:
+        masks = np.arange(1 << zobrist.WIDTH)[:, None] >> np.arange(LEFT, LEFT + COLUMNS) & 1
+        table = _tables[dtype] = masks.astype(dtype)
+    return table
+
+
+def allocate(n=None, dtype=np.float32, packed=False):
+    """Return zeroed observation arrays, for a batch of n boards if n is
+    given.
+
+    Parameters
+    ----------
+    n: int or None
+        Batch size, or None for a single board.
+    dtype: numpy dtype
+        Type of the arrays. Packed planes are always uint8.
+    packed: bool
+        Bit-pack the planes.
+    """
+    lead = () if n is None else (n,)
+    planes = (lead + (len(PLANES), ROWS, 2), np.uint8) if packed else \
+             (lead + (len(PLANES), ROWS, COLUMNS), dtype)
+    return {
+        'planes': np.zeros(*planes),
+        'next': np.zeros(lead + (len(SHAPES),), dtype),
+        'held': np.zeros(lead + (len(SHAPES),), dtype),
+        'fill_height': np.zeros(lead + (COLUMNS,), dtype),
+    }
+
+
+def unpack_planes(planes):
+    """Return packed planes of shape (..., 20, 2) as a uint8 array of shape
+    (..., 20, 10)."""
+    rows = np.ascontiguousarray(planes).view('<u2')[..., 0]
+    return (rows[..., None] >> np.arange(COLUMNS, dtype=rows.dtype) & 1).astype(np.uint8)
+
+
+def _draw(piece, plane):
+    """Set the visible cells of a piece in a plane."""
+    if piece is None:
+        return
+    row = piece.row - TOP
+    col = piece.col - LEFT
+    for dr, dc in CELLS[piece.shape][piece.rotation_index]:
+        if row + dr >= 0:
+            plane[row + dr, col + dc] = 1
+
+
+def _draw_packed(piece, rows):
+    """Set the visible cells of a piece in a plane of row masks."""
+    if piece is None:
+        return
+    geometry = GEOMETRY[piece.shape][piece.rotation_index]
+    for dr, mask in geometry.masks:
+        r = piece.row + dr - TOP
+        if r >= 0:
+            rows[r] |= (mask << piece.col) >> LEFT & PLAYFIELD
+
+
+def _one_hot(shape, out):
+    out.fill(0)
+    if shape is not None:
+        out[SHAPE_INDEX[shape]] = 1
+
+
+def _common(board, tetromino, out, index):
+    """Write the one-hots and fill heights of a board."""
+    held = board.held_tetromino
+    if index is None:
+        _one_hot(tetromino.next_shape, out['next'])
+        _one_hot(held.shape if held is not None else None, out['held'])
+        out['fill_height'][:] = board.fill_height[0, LEFT:LEFT + COLUMNS]
+    else:
+        _one_hot(tetromino.next_shape, out['next'][index])
+        _one_hot(held.shape if held is not None else None, out['held'][index])
+        out['fill_height'][index] = board.fill_height[0, LEFT:LEFT + COLUMNS]
+
+
+def encode(board, tetromino, out, index=None):
+    """Write the observation of a board into arrays from `allocate`.
+
+    Parameters
+    ----------
+    board: Board or BitBoard
+        Board to observe.
+    tetromino: Tetromino
+        The game's tetromino, for its next shape.
+    out: dict of numpy arrays
+        Arrays from `allocate(packed=False)`.
+    index: int or None
+        Position in a batch of arrays, None for the arrays of one board.
+    """
+    planes = out['planes'] if index is None else out['planes'][index]
+    playfield = planes[0]
+    if isinstance(board, BitBoard):
+        _rows[:] = board.rows[TOP:TOP + ROWS]
+        np.take(_row_table(playfield.dtype), _rows, axis=0, out=playfield, mode='clip')
+    else:
+        # The array board holds the current tetromino, take it out again.
+        np.not_equal(board.board[TOP:TOP + ROWS, LEFT:LEFT + COLUMNS], 0,
+                     out=playfield, casting='unsafe')
+        current = board.current_tetromino
+        if current is not None:
+            for dr, dc in CELLS[current.shape][current.rotation_index]:
+                if current.row + dr >= TOP:
+                    playfield[current.row + dr - TOP, current.col + dc - LEFT] = 0
+    planes[1:].fill(0)
+    _draw(board.current_tetromino, planes[1])
+    _draw(board.shadow, planes[2])
+    _common(board, tetromino, out, index)
+
+
+def encode_packed(board, tetromino, out, index=None):
+    """Write the observation of a board into arrays from
+    `allocate(packed=True)`. See `encode`."""
+    planes = out['planes'] if index is None else out['planes'][index]
+    rows = planes.view('<u2')[..., 0]
+    playfield = rows[0]
+    rows[1:] = 0
+    _draw_packed(board.current_tetromino, rows[1])
+    _draw_packed(board.shadow, rows[2])
+    if isinstance(board, BitBoard):
+        playfield[:] = board.rows[TOP:TOP + ROWS]
+        playfield >>= LEFT
+        playfield &= PLAYFIELD
+    else:
+        # The array board holds the current tetromino, whose cells are all
+        # set, so xor takes it out again.
+        np.dot(board.board[TOP:TOP + ROWS, LEFT:LEFT + COLUMNS], _WEIGHTS, out=_rows)
+        playfield[:] = _rows
+        playfield ^= rows[1]
+    _common(board, tetromino, out, index)
+
+
+def encode_batch(boards, tetrominos, out, packed=False):
+    """Write the observations of a list of boards and their tetrominos into
+    batch arrays from `allocate(len(boards), packed=packed)`."""
+    encoder = encode_packed if packed else encode
+    for i, (board, tetromino) in enumerate(zip(boards, tetrominos)):
+        encoder(board, tetromino, out, i)
+
+
+def encode_batch_board(batch, out):
+    """Write the observations of every game of a `BatchBoard` into batch
+    arrays from `allocate(batch.n)`. The planes are written with array
+    operations over all games at once."""
+    from tetris.batch import CELLS as BATCH_CELLS
+    planes = out['planes']
+    np.copyto(planes[:, 0], batch.boards[:, TOP:TOP + ROWS, LEFT:LEFT + COLUMNS], casting='unsafe')
+    planes[:, 1:] = 0
+
+    games = batch.games
+    cells = BATCH_CELLS[batch.shape, batch.rotation]
+    for plane, row in ((1, batch.row), (2, batch.shadow_rows())):
+        rows = row[:, None] + cells[:, :, 0] - TOP
+        cols = batch.col[:, None] + cells[:, :, 1] - LEFT
+        visible = rows >= 0
+        planes[np.broadcast_to(games[:, None], rows.shape)[visible], plane,
+               rows[visible], cols[visible]] = 1
+
+    out['next'].fill(0)
+    out['next'][games, batch.next_shape] = 1
+    out['held'].fill(0)
+    held = batch.held_shape >= 0
+    out['held'][games[held], batch.held_shape[held]] = 1
+    # Like Board.fill_height, counted from the floor over the whole height
+    # including the spawn rows, 0 for an empty column.
+    columns = batch.boards[:, :batch.height - 1, LEFT:LEFT + COLUMNS]
+    filled = columns.any(axis=1)
+    tops = columns.argmax(axis=1)
+    out['fill_height'][:] = np.where(filled, batch.height - 1 - tops, 0)
@@ -0,0 +1,180 @@
+"""Beam search planner over the current, next and held tetromino.
+
+Looks several placements ahead, keeping the best `beam_width` boards at
+every depth. Boards reached by different move orders are only expanded once
+thanks to a bounded transposition table keyed by the Zobrist hash of the
+board, and the search stops when the time budget of the move runs out.
+"""
+
+import time
+from collections import OrderedDict, namedtuple
+from tetris.ai import GreedyAI, candidate_boards
+from tetris.search import placements
+from tetris.utils import GEOMETRY
+from tetris import zobrist
+
+
+Node = namedtuple('Node', ['value', 'lines', 'rows', 'hash', 'held', 'queued', 'first'])
+Node.__doc__ = """Board reached by the search. `lines` is the weighted value of
+the lines cleared so far, `queued` the number of preview tetrominos taken out
+of the queue and `first` the (hold, Placement) of the first move that leads
+to it."""
+
+Piece = namedtuple('Piece', ['shape', 'rotation_index', 'row', 'col'])
+
+
+class _Rows:
+    """Board made of row bitmasks, as read by `placements` and
+    `candidate_boards`."""
+
+    def __init__(self, rows, board):
+        self.rows = rows
+        self.width = board.width
+        self.height = board.height
+        self.left_boundary = board.left_boundary
+        self.right_boundary = board.right_boundary
+
+    def locked_rows(self):
+        return self.rows
+
+
+class BeamPlanner(GreedyAI):
+    """Plans with a beam search over the current piece, the preview and the
+    hold.
+
+    Parameters
+    ----------
+    weights: dict or None
+        Evaluator weights, see `tetris.ai.Evaluator`.
+    depth: int
+        Number of placements to look ahead. The search never looks past the
+        known tetrominos, so the depth is capped by the preview length.
+    beam_width: int
+        Number of boards kept at every depth.
+    time_budget: float
+        Seconds a move may take. The best move found so far is played when
+        it runs out.
+    table_size: int
+        Maximum number of entries in the transposition table.
+    """
+
+    def __init__(self, weights=None, depth=2, beam_width=6, time_budget=0.008,
+                 table_size=1 << 16):
+        GreedyAI.__init__(self, weights)
+        self.depth = depth
+        self.beam_width = beam_width
+        self.time_budget = time_budget
+        self.table_size = table_size
+        self.table = OrderedDict()
+
+    def _seen(self, key, value):
+        """Return true if key was already reached with at least value.
+        Otherwise record it, evicting the oldest entry when full."""
+        best = self.table.get(key)
+        if best is not None and best >= value:
+            return True
+        self.table[key] = value
+        self.table.move_to_end(key)
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)
+        return False
+
+    def _lock(self, rows, h, placement, full, empty):
+        """Return the rows and their hash after locking a placement."""
+        rows = list(rows)
+        for dr, mask in GEOMETRY[placement.shape][placement.rotation].masks:
+            r = placement.row + dr
+            old = rows[r]
+            rows[r] = old | mask << placement.col
+            h = zobrist.update(h, r, old, rows[r])
+        kept = [row for row in rows[:-1] if row != full]
+        lines = len(rows) - 1 - len(kept)
+        if lines:
+            cleared = [empty]*lines + kept + rows[-1:]
+            for r in range(len(rows) - 1):
+                if rows[r] != cleared[r]:
+                    h = zobrist.update(h, r, rows[r], cleared[r])
+            rows = cleared
+        return rows, h
+
+    def _expand(self, node, piece, held, queued, first_hold, board, full, empty):
+        """Return the children of a node when placing piece."""
+        candidates = placements(_Rows(node.rows, board), piece)
+        if not candidates:
+            return []
+        boards, lines = candidate_boards(_Rows(node.rows, board), candidates)
+        values = self.evaluator.evaluate(boards, lines)
+        line_weight = self.evaluator.weights['lines']
+
+        children = []
+        for placement, value, cleared in zip(candidates, values, lines):
+            rows, h = self._lock(node.rows, node.hash, placement, full, empty)
+            first = node.first if node.first is not None else (first_hold, placement)
+            children.append(Node(node.lines + value, node.lines + line_weight*cleared,
+                                 rows, h, held, queued, first))
+        return children
+
+    def plan(self, board, tetromino):
+        """Return the actions of the first move of the best plan."""
+        deadline = time.perf_counter() + self.time_budget
+        self.table.clear()
+
+        full = (1 << board.width) - 1
+        empty = full & ~(((1 << (board.right_boundary - board.left_boundary + 1)) - 1)
+                         << board.left_boundary)
+        spawn_row, spawn_col = 3, board.width//2 - 2
+        queue = tetromino.preview(self.depth)
+        held = board.held_tetromino.shape if board.held_tetromino is not None else None
+
+        beam = [Node(0.0, 0.0, board.locked_rows(), board.hash, held, 0, None)]
+        best = None
+        for depth in range(min(self.depth, len(queue) + 1)):
+            children = []
+            for node in beam:
+                if time.perf_counter() > deadline and best is not None:
+                    break
+                if depth == 0:
+                    current = Piece(tetromino.shape, tetromino.rotation_index,
+                                    tetromino.row, tetromino.col)
+                    used = node.queued
+                    can_hold = not board.holding
+                elif node.queued < len(queue):
+                    current = Piece(queue[node.queued], 0, spawn_row, spawn_col)
+                    used = node.queued + 1
+                    can_hold = True
+                else:
+                    continue
+
+                children += self._expand(node, current, node.held, used,
+                                         False, board, full, empty)
+                if can_hold:
+                    # Holding swaps in the held piece, or the next one if
+                    # nothing is held yet.
+                    if node.held is not None:
+                        swap, queued = node.held, used
+                    elif used < len(queue):
+                        swap, queued = queue[used], used + 1
+                    else:
+                        continue
+                    piece = Piece(swap, 0, spawn_row, spawn_col)
+                    children += self._expand(node, piece, current.shape, queued,
+                                             True, board, full, empty)
+
+            children.sort(key=lambda child: child.value, reverse=True)
+            beam = []
+            for child in children:
+                key = (child.hash, child.held, child.queued)
+                if not self._seen(key, child.value):
+                    beam.append(child)
+                    if len(beam) == self.beam_width:
+                        break
+            if not beam:
+                break
+            best = beam[0]
+            if time.perf_counter() > deadline:
+                break
+
+        if best is None:
+            return ['hard_drop']
+        hold, placement = best.first
+        return (['hold'] if hold else []) + list(placement.keys)
@@ -0,0 +1,400 @@
+"""Compact binary replays of games played through a `TickLoop`.
+
+A game only depends on its seed and on the inputs of every tick, so a replay
+stores the seed, the loop settings and one 5 byte record per key press or
+release. Every `keyframe_interval` ticks a keyframe saves the bit-packed
+board and the rest of the game state, so playback can seek without replaying
+from the start.
+
+Layout of a file, all little endian:
+
+- HEADER: magic, version, flags, seed, loop settings and the outcome of the
+  game (score, lines, level, pieces, ticks and the tick it topped out on,
+  or -1).
+- The inputs, an array of INPUT_DTYPE.
+- The keyframes, an array of KEYFRAME_DTYPE.
+
+The outcome sits in the fixed size header, so `scan` reads it from a memory
+map without decoding the rest of the file.
+"""
+
+import mmap
+import random
+import struct
+from array import array
+import numpy as np
+from tetris.core import Board, BitBoard, Piece, PieceGenerator, Tetromino
+from tetris.loop import TickLoop, REPEATABLE
+from tetris.simulator import Simulator, ACTIONS
+from tetris.utils import SHAPES
+from tetris import zobrist
+
+
+MAGIC = b'TRPL'
+VERSION = 1
+
+# Header flags.
+BAG = 1         # Pieces are dealt in bags, see `PieceGenerator`.
+ARRAY_BOARD = 2 # The game ran on the numpy `Board` instead of `BitBoard`.
+
+HEADER = struct.Struct('<4sHHQHHHHHHQIHIIiIII')
+HEADER_FIELDS = ('magic', 'version', 'flags', 'seed',
+                 'tick_rate', 'drop_interval', 'level_speedup',
+                 'lock_delay', 'repeat_delay', 'repeat_interval',
+                 'score', 'lines', 'level', 'pieces', 'ticks', 'top_out_tick',
+                 'input_count', 'keyframe_count', 'keyframe_interval')
+
+# Input codes are the index of the action in ACTIONS and these flags.
+REPEAT = 0x40
+RELEASE = 0x80
+ACTION_MASK = 0x0f
+
+INPUT_DTYPE = np.dtype([('tick', '<u4'), ('code', 'u1')])
+
+EMPTY = 0xff
+KEYFRAME_DTYPE = np.dtype([
+    ('tick', '<u4'), ('input', '<u4'), ('drawn', '<u4'),
+    ('score', '<u8'), ('lines', '<u4'), ('line_count', '<u2'), ('level', '<u2'),
+    ('pieces', '<u4'),
+    ('shape', 'u1'), ('color', 'u1'), ('rotation', 'u1'), ('row', 'u1'), ('col', 'u1'),
+    ('held_shape', 'u1'), ('held_color', 'u1'), ('holding', 'u1'),
+    ('gravity', '<u4'), ('grounded', '<u4'),
+    ('keys', 'u1', (len(REPEATABLE),)), ('key_ticks', '<u4', (len(REPEATABLE),)),
+    ('rows', '<u2', (zobrist.HEIGHT - 1,)),
+])
+
+
+def read_header(buffer):
+    """Decode the header at the start of a buffer into a dict."""
+    if len(buffer) < HEADER.size:
+        raise ValueError('Not a replay, the file is too short')
+    header = dict(zip(HEADER_FIELDS, HEADER.unpack_from(buffer, 0)))
+    if header['magic'] != MAGIC:
+        raise ValueError('Not a replay, bad magic %r' % header['magic'])
+    if header['version'] != VERSION:
+        raise ValueError('Unsupported replay version %d' % header['version'])
+    return header
+
+
+def scan(path):
+    """Return the header of a replay file as a dict, without reading the
+    inputs or the keyframes.
+
+    Only the first page of the file is touched, so scanning many replays
+    for their 'score', 'lines' or 'top_out_tick' is cheap.
+    """
+    with open(path, 'rb') as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return read_header(buffer)
+
+
+class Recorder:
+    """Records the games of a `TickLoop` as replays.
+
+    Set it as the loop's `recorder` before `TickLoop.reset`. Games without
+    a seed get a random one, since a replay needs it.
+
+    Parameters
+    ----------
+    path: str or None
+        File the replay is written to once the game tops out, or None to
+        only `save` by hand.
+    keyframe_interval: int
+        Ticks between keyframes.
+    """
+
+    def __init__(self, path=None, keyframe_interval=600):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.loop = None
+        self.seed = None
+        self.ticks = array('I')
+        self.codes = array('B')
+        self.keyframes = []
+        self.top_out_tick = -1
+
+    def reset(self, loop, seed):
+        """Start recording a new game of loop. Return the seed to play it
+        with."""
+        if seed is None:
+            seed = random.SystemRandom().randrange(1 << 32)
+        self.loop = loop
+        self.seed = seed
+        self.ticks = array('I')
+        self.codes = array('B')
+        self.keyframes = []
+        self.top_out_tick = -1
+        return seed
+
+    def input(self, loop, action, repeat=False, release=False):
+        """Record a press or release of action before the current tick."""
+        code = ACTIONS.index(action)
+        if release:
+            code |= RELEASE
+        elif repeat and action in REPEATABLE:
+            code |= REPEAT
+        self.ticks.append(loop.tick_count)
+        self.codes.append(code)
+
+    def after_tick(self, loop):
+        """Take a keyframe when one is due and save the replay once the game
+        tops out."""
+        if loop.simulator.board.top_out:
+            if self.top_out_tick < 0:
+                self.top_out_tick = loop.tick_count - 1
+                if self.path is not None:
+                    self.save()
+        elif loop.tick_count%self.keyframe_interval == 0:
+            self.keyframes.append(self.keyframe(loop))
+
+    def keyframe(self, loop):
+        """Return the state of loop between two ticks as a tuple of
+        KEYFRAME_DTYPE."""
+        simulator = loop.simulator
+        board = simulator.board
+        tetromino = simulator.tetromino
+        score = simulator.score
+        held = board.held_tetromino
+        keys = [REPEATABLE.index(action) for action in loop.held]
+        ticks = list(loop.held.values())
+        blank = len(REPEATABLE) - len(keys)
+        return (
+            loop.tick_count, len(self.ticks), tetromino.pieces.drawn,
+            score.score, loop.lines, score.line_count, score.level,
+            simulator.pieces,
+            PieceGenerator.SHAPE_NAMES.index(tetromino.shape),
+            Tetromino.COLORS.index(tetromino.color),
+            tetromino.rotation_index, tetromino.row, tetromino.col,
+            EMPTY if held is None else PieceGenerator.SHAPE_NAMES.index(held.shape),
+            EMPTY if held is None else Tetromino.COLORS.index(held.color),
+            board.holding,
+            loop.gravity, loop.grounded,
+            tuple(keys + [EMPTY]*blank), tuple(ticks + [0]*blank),
+            tuple(zobrist.pack(board.locked_rows()).tolist()),
+        )
+
+    def to_bytes(self):
+        """Return the replay recorded so far."""
+        loop = self.loop
+        simulator = loop.simulator
+        flags = 0
+        if simulator.randomizer == 'bag':
+            flags |= BAG
+        if not isinstance(simulator.board, BitBoard):
+            flags |= ARRAY_BOARD
+
+        inputs = np.empty(len(self.ticks), dtype=INPUT_DTYPE)
+        inputs['tick'] = self.ticks
+        inputs['code'] = self.codes
+        keyframes = np.array(self.keyframes, dtype=KEYFRAME_DTYPE)
+        header = HEADER.pack(
+            MAGIC, VERSION, flags, self.seed,
+            loop.tick_rate, loop.drop_interval, loop.level_speedup,
+            loop.lock_delay, loop.repeat_delay, loop.repeat_interval,
+            simulator.score.score, loop.lines, simulator.score.level,
+            simulator.pieces, loop.tick_count, self.top_out_tick,
+            len(inputs), len(keyframes), self.keyframe_interval)
+        return header + inputs.tobytes() + keyframes.tobytes()
+
+    def save(self, path=None):
+        """Write the replay recorded so far to path, by default the one the
+        recorder was created with."""
+        with open(path or self.path, 'wb') as fp:
+            fp.write(self.to_bytes())
+
+
+class Replay:
+    """A decoded replay.
+
+    Attributes
+    ----------
+    header: dict
+        Fields of HEADER.
+    inputs, keyframes: numpy structured arrays
+        Of INPUT_DTYPE and KEYFRAME_DTYPE, views of the underlying buffer.
+    """
+
+    def __init__(self, buffer):
+        self.header = read_header(buffer)
+        offset = HEADER.size
+        count = self.header['input_count']
+        self.inputs = np.frombuffer(buffer, INPUT_DTYPE, count, offset)
+        offset += count*INPUT_DTYPE.itemsize
+        count = self.header['keyframe_count']
+        self.keyframes = np.frombuffer(buffer, KEYFRAME_DTYPE, count, offset)
+
+    @classmethod
+    def load(cls, path):
+        """Map a replay file into memory."""
+        with open(path, 'rb') as fp:
+            return cls(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @property
+    def seed(self):
+        return self.header['seed']
+
+    def new_loop(self):
+        """Return a `TickLoop` with the settings the game was recorded
+        with."""
+        header = self.header
+        simulator = Simulator(board=Board if header['flags'] & ARRAY_BOARD else BitBoard,
+                              randomizer='bag' if header['flags'] & BAG else 'uniform')
+        loop = TickLoop(simulator, tick_rate=header['tick_rate'],
+                        drop_interval=header['drop_interval'],
+                        level_speedup=header['level_speedup'])
+        # These are stored in ticks already.
+        loop.lock_delay = header['lock_delay']
+        loop.repeat_delay = header['repeat_delay']
+        loop.repeat_interval = header['repeat_interval']
+        return loop
+
+
+class Player:
+    """Re-executes a replay on a `TickLoop`.
+
+    Without rendering `run` plays the game as fast as possible. `game.Game`
+    renders a replay by calling `feed` before every tick of its own loop.
+
+    Parameters
+    ----------
+    replay: Replay
+        Replay to play.
+    loop: TickLoop or None
+        Loop to play on, by default a new one with the recorded settings.
+    """
+
+    def __init__(self, replay, loop=None):
+        self.replay = replay
+        self.loop = loop if loop is not None else replay.new_loop()
+        self.ticks = replay.inputs['tick'].tolist()
+        self.codes = replay.inputs['code'].tolist()
+        self.keyframe_ticks = replay.keyframes['tick']
+        self.cursor = 0
+        self.reset()
+
+    def reset(self):
+        """Start the game over."""
+        self.loop.reset(self.replay.seed)
+        self.cursor = 0
+
+    def feed(self, loop=None):
+        """Press and release the keys of the recorded inputs of the current
+        tick."""
+        loop = loop if loop is not None else self.loop
+        ticks = self.ticks
+        while self.cursor < len(ticks) and ticks[self.cursor] == loop.tick_count:
+            code = self.codes[self.cursor]
+            action = ACTIONS[code & ACTION_MASK]
+            if code & RELEASE:
+                loop.release(action)
+            else:
+                loop.press(action, repeat=bool(code & REPEAT))
+            self.cursor += 1
+
+    def step(self):
+        """Feed the inputs of the current tick and run it. See
+        `TickLoop.tick`."""
+        self.feed()
+        return self.loop.tick()
+
+    def done(self):
+        """Return true once the recorded game is over."""
+        loop = self.loop
+        return loop.simulator.board.top_out or loop.tick_count >= self.replay.header['ticks']
+
+    def run(self, verify=False):
+        """Play the rest of the game as fast as possible.
+
+        Parameters
+        ----------
+        verify: bool
+            Compare the game with every keyframe passed and the recorded
+            outcome, raising ValueError on the first difference.
+
+        Returns
+        -------
+        result: dict
+            Like `TickLoop.run`.
+        """
+        loop = self.loop
+        keyframes = self.replay.keyframes
+        index = np.searchsorted(self.keyframe_ticks, loop.tick_count, side='right')
+        while not self.done():
+            self.step()
+            if verify and index < len(keyframes) and keyframes[index]['tick'] == loop.tick_count:
+                self._verify(keyframes[index])
+                index += 1
+
+        simulator = loop.simulator
+        result = {
+            'score': simulator.score.score,
+            'lines': loop.lines,
+            'level': simulator.score.level,
+            'pieces': simulator.pieces,
+            'ticks': loop.tick_count,
+        }
+        if verify:
+            for key, value in result.items():
+                if value != self.replay.header[key]:
+                    raise ValueError('Replay diverged: %s is %d, recorded %d'
+                                     % (key, value, self.replay.header[key]))
+        return result
+
+    def _verify(self, keyframe):
+        """Raise ValueError if the board differs from a keyframe."""
+        rows = zobrist.pack(self.loop.simulator.board.locked_rows())
+        if not np.array_equal(rows, keyframe['rows']):
+            raise ValueError('Replay diverged at tick %d' % keyframe['tick'])
+
+    def seek(self, tick):
+        """Move the game to the start of a tick, restoring the last keyframe
+        before it and replaying the inputs from there."""
+        loop = self.loop
+        index = np.searchsorted(self.keyframe_ticks, tick, side='right') - 1
+        if index >= 0 and (loop.tick_count > tick or self.keyframe_ticks[index] > loop.tick_count):
+            self.restore(self.replay.keyframes[index])
+        elif loop.tick_count > tick:
+            self.reset()
+        while loop.tick_count < tick and not self.done():
+            self.step()
+
+    def restore(self, keyframe):
+        """Set the game to the state saved in a keyframe."""
+        loop = self.loop
+        simulator = loop.simulator
+        board = simulator.board
+        board.reset()
+        board.load_rows(zobrist.unpack(keyframe['rows']))
+
+        # Replay the piece stream up to the current tetromino.
+        pieces = PieceGenerator(self.replay.seed, simulator.randomizer)
+        pieces.skip(int(keyframe['drawn']) - 1)
+        tetromino = Tetromino(pieces)
+        tetromino.shape = PieceGenerator.SHAPE_NAMES[keyframe['shape']]
+        tetromino.color = Tetromino.COLORS[keyframe['color']]
+        tetromino.tetromino = SHAPES[tetromino.shape]
+        tetromino.rotation_index = int(keyframe['rotation'])
+        tetromino.row = int(keyframe['row'])
+        tetromino.col = int(keyframe['col'])
+        simulator.tetromino = tetromino
+
+        if keyframe['held_shape'] != EMPTY:
+            board.held_tetromino = Piece(PieceGenerator.SHAPE_NAMES[keyframe['held_shape']],
+                                         Tetromino.COLORS[keyframe['held_color']])
+        board.holding = bool(keyframe['holding'])
+        board.start_game(tetromino)
+
+        simulator.score.score = int(keyframe['score'])
+        simulator.score.line_count = int(keyframe['line_count'])
+        simulator.score.level = int(keyframe['level'])
+        simulator.pieces = int(keyframe['pieces'])
+
+        loop.tick_count = int(keyframe['tick'])
+        loop.lines = int(keyframe['lines'])
+        loop.gravity = int(keyframe['gravity'])
+        loop.grounded = int(keyframe['grounded'])
+        loop.pressed = []
+        loop.held = {REPEATABLE[key]: int(ticks)
+                     for key, ticks in zip(keyframe['keys'], keyframe['key_ticks'])
+                     if key != EMPTY}
+        self.cursor = int(keyframe['input'])
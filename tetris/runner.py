@@ -0,0 +1,117 @@
+"""Multi-process self-play runner.
+
+Spreads complete headless games over a process pool. Every game has its own
+seed, derived from the run seed and the game number, so results do not
+depend on how games are scheduled. Workers write their results straight into
+a shared memory array instead of pickling them back to the parent.
+"""
+
+import time
+import multiprocessing
+import numpy as np
+from tetris.core import BitBoard
+from tetris.simulator import Simulator
+
+
+# Columns of the results array.
+RESULT_FIELDS = ('score', 'lines', 'level', 'pieces', 'duration')
+
+# Set in every worker by _init_worker.
+_worker = {}
+
+
+def random_policy(simulator):
+    """Pick a random legal action."""
+    return simulator.rng.choice(simulator.legal_actions())
+
+
+def play_game(simulator, policy, seed, max_steps=10000):
+    """Play one game to top out, or until max_steps actions were taken.
+
+    Parameters
+    ----------
+    simulator: Simulator
+        Simulator to play the game on. It is reset with the seed.
+    policy: callable
+        Called with the simulator, returns the next action.
+    seed: int
+        Seed of the game.
+    max_steps: int
+        Maximum number of actions in the game.
+
+    Returns
+    -------
+    result: tuple
+        The values of RESULT_FIELDS for the game.
+    """
+    start = time.perf_counter()
+    simulator.reset(seed)
+    lines = 0
+    for _ in range(max_steps):
+        _, cleared, done = simulator.step(policy(simulator))
+        lines += cleared
+        if done:
+            break
+    return (simulator.score.score, lines, simulator.score.level,
+            simulator.pieces, time.perf_counter() - start)
+
+
+def _init_worker(results, policy, board, max_steps):
+    """Keep the shared results array and game settings in the worker."""
+    _worker['results'] = np.frombuffer(results, dtype=np.float64).reshape(-1, len(RESULT_FIELDS))
+    _worker['simulator'] = Simulator(board)
+    _worker['policy'] = policy
+    _worker['max_steps'] = max_steps
+
+
+def _play_games(games):
+    """Play the given games and write their results to the shared array."""
+    for game, seed in games:
+        _worker['results'][game] = play_game(_worker['simulator'], _worker['policy'],
+                                             seed, _worker['max_steps'])
+    return len(games)
+
+
+def run(n_games, policy=random_policy, processes=None, seed=0, board=BitBoard,
+        max_steps=10000, chunksize=8):
+    """Play n_games headless games over a pool of processes.
+
+    Parameters
+    ----------
+    n_games: int
+        Number of games to play.
+    policy: callable
+        Called with the Simulator, returns the next action. It must be
+        picklable, e.g. a function defined at module level.
+    processes: int or None
+        Number of worker processes, os.cpu_count() by default. With 1 the
+        games are played in this process.
+    seed: int
+        Seed of the run. Game i is played with seed + i.
+    board: Board class
+        Board engine of the simulators.
+    max_steps: int
+        Maximum number of actions per game.
+    chunksize: int
+        Number of games handed to a worker at a time.
+
+    Returns
+    -------
+    results: numpy array of shape (n_games, len(RESULT_FIELDS))
+        Score, lines, level, pieces placed and duration in seconds of every
+        game.
+    """
+    results = multiprocessing.RawArray('d', n_games*len(RESULT_FIELDS))
+    games = [(game, seed + game) for game in range(n_games)]
+    chunks = [games[i:i+chunksize] for i in range(0, n_games, chunksize)]
+
+    if processes == 1:
+        _init_worker(results, policy, board, max_steps)
+        for chunk in chunks:
+            _play_games(chunk)
+        _worker.clear()
+    else:
+        with multiprocessing.Pool(processes, _init_worker,
+                                  (results, policy, board, max_steps)) as pool:
+            pool.map(_play_games, chunks, chunksize=1)
+    return np.frombuffer(results, dtype=np.float64).reshape(n_games, len(RESULT_FIELDS))
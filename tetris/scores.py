@@ -0,0 +1,172 @@
+"""Append-only log of finished games with a high score index.
+
+Every game is one fixed size record appended to the log, so recording a game
+never rewrites the history and a crash can at most tear the last record,
+which is ignored. A small index file next to the log keeps the best scores
+and the number of records it covers. Opening the log only reads the index
+and the records appended since it was written, so startup does not grow with
+the history. Queries over the whole history scan the log through a memory
+map with numpy.
+"""
+
+import datetime
+import os
+import pickle
+import struct
+import time
+import numpy as np
+
+
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('score', '<u8'), ('lines', '<u4'), ('level', '<u4')])
+
+INDEX_MAGIC = b'TSIX'
+INDEX_HEADER = struct.Struct('<4sQI')   # Magic, records covered, entries.
+
+
+class ScoreLog:
+    """Scores of finished games stored in an append-only file.
+
+    Parameters
+    ----------
+    path: str
+        File of the log, created if missing. The index is kept in
+        path + '.idx'.
+    top: int
+        Number of best scores kept in the index.
+    """
+
+    def __init__(self, path='scores.log', top=10):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.top_size = top
+        if not os.path.exists(path):
+            open(path, 'ab').close()
+        self.count = os.path.getsize(path)//RECORD_DTYPE.itemsize
+        self.best = np.zeros(0, dtype=RECORD_DTYPE)
+
+        covered = self._read_index()
+        if covered != self.count:
+            self._merge(self.records()[covered:])
+            self.save_index()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def high_score(self):
+        """Best score recorded, 0 for an empty log."""
+        return int(self.best['score'][0]) if len(self.best) else 0
+
+    def _read_index(self):
+        """Load the best scores from the index. Return the number of records
+        they cover, 0 if the index is missing or does not match the log."""
+        try:
+            with open(self.index_path, 'rb') as fp:
+                data = fp.read()
+            magic, covered, entries = INDEX_HEADER.unpack_from(data, 0)
+            best = np.frombuffer(data, RECORD_DTYPE, entries, INDEX_HEADER.size)
+        except (OSError, struct.error, ValueError):
+            return 0
+        if magic != INDEX_MAGIC or covered > self.count:
+            return 0
+        self.best = best.copy()
+        return covered
+
+    def _merge(self, records):
+        """Keep the best of the indexed scores and records."""
+        best = np.concatenate((self.best, records))
+        order = np.argsort(-best['score'].astype(np.int64), kind='mergesort')
+        self.best = best[order[:self.top_size]]
+
+    def save_index(self):
+        """Write the index. It is replaced in one step, so a crash leaves
+        the old one, which is caught up from the log on the next open."""
+        temp = self.index_path + '.tmp'
+        with open(temp, 'wb') as fp:
+            fp.write(INDEX_HEADER.pack(INDEX_MAGIC, self.count, len(self.best)))
+            fp.write(self.best.tobytes())
+        os.replace(temp, self.index_path)
+
+    def add(self, score, lines=0, level=0, when=None):
+        """Append a finished game. when is a Unix time, now by default.
+
+        Only the record is written. The index follows in `save_index`, or on
+        the next open.
+        """
+        record = np.array([(time.time() if when is None else when, score, lines, level)],
+                          dtype=RECORD_DTYPE)
+        with open(self.path, 'ab') as fp:
+            # Start at a record boundary if a crash tore the last record.
+            fp.truncate(self.count*RECORD_DTYPE.itemsize)
+            fp.write(record.tobytes())
+        self.count += 1
+        self._merge(record)
+
+    def records(self):
+        """Return every record as a read-only array of RECORD_DTYPE."""
+        if self.count == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', shape=(self.count,))
+
+    def top(self, n=None):
+        """Return the n best records, best first. More than the indexed
+        number scans the log."""
+        n = self.top_size if n is None else n
+        if n <= self.top_size or len(self.best) == self.count:
+            return self.best[:n].copy()
+        records = self.records()
+        order = np.argsort(-records['score'].astype(np.int64), kind='mergesort')
+        return records[order[:n]]
+
+    def best_per_day(self):
+        """Return a list of (date, best score) for every day with a game, in
+        order. Days follow the local time zone, with the UTC offset in effect
+        when each game was played."""
+        records = self.records()
+        if len(records) == 0:
+            return []
+        # UTC offsets only change on quarter hours, so look them up once per
+        # quarter hour with a game instead of once per game.
+        quarters, inverse = np.unique(records['time']//900, return_inverse=True)
+        offsets = np.array([time.localtime(q*900).tm_gmtoff for q in quarters.tolist()])
+        days = (records['time'] + offsets[inverse])//86400
+        order = np.lexsort((records['score'], days))
+        days = days[order]
+        last = np.append(days[1:] != days[:-1], True)
+        epoch = datetime.date(1970, 1, 1)
+        return [(epoch + datetime.timedelta(days=int(day)), int(score))
+                for day, score in zip(days[last], records['score'][order][last])]
+
+    def percentile(self, q):
+        """Return the q-th percentile of the scores, or of every q of a
+        sequence. 0 for an empty log."""
+        records = self.records()
+        if len(records) == 0:
+            return np.zeros_like(q, dtype=float) if np.ndim(q) else 0.0
+        return np.percentile(records['score'], q)
+
+    def import_pickle(self, path):
+        """Append the games of a pickled {str(datetime): score} dict, the
+        format the game used to keep its scores in. Return the number
+        added, 0 for an empty or unreadable file."""
+        with open(path, 'rb') as fp:
+            try:
+                scores = pickle.load(fp)
+            except (EOFError, pickle.UnpicklingError):
+                return 0
+        games = []
+        for stamp, score in scores.items():
+            try:
+                when = datetime.datetime.strptime(stamp, '%Y-%m-%d %H:%M:%S.%f').timestamp()
+            except ValueError:
+                when = 0.0
+            games.append((when, score, 0, 0))
+        games.sort()
+        records = np.array(games, dtype=RECORD_DTYPE)
+        with open(self.path, 'ab') as fp:
+            fp.truncate(self.count*RECORD_DTYPE.itemsize)
+            fp.write(records.tobytes())
+        self.count += len(records)
+        self._merge(records)
+        self.save_index()
+        return len(records)
@@ -0,0 +1,262 @@
+"""Search for the placements a tetromino can reach.
+
+A breadth first search over (rotation, column, row) states that follows the
+rules of `Board.move_left`, `move_right`, `rotate_left`, `rotate_right` and
+`soft_drop`, so tucks and spins are found as well. It runs on a bitmask
+copy of the placed blocks and never changes the board.
+
+Nothing moves a tetromino up, so every path to a row has the same number of
+soft drops. The search is therefore layered by the number of sideways moves
+and rotations, and every layer holds, per rotation and column, a bitmask of
+the rows first reached with that many moves.
+"""
+
+from collections import namedtuple
+import numpy as np
+from tetris.utils import GEOMETRY
+
+
+Placement = namedtuple('Placement', ['shape', 'rotation', 'row', 'col', 'keys'])
+Placement.__doc__ = """Final resting position of a tetromino and the shortest
+sequence of actions from its current position that locks it there."""
+
+
+def _symmetries():
+    """Find the rotational symmetry of every shape.
+
+    Returns two dictionaries keyed by shape. PERIODS holds the number of
+    distinct rotations: rotations r and r + period behave identically, so
+    only the first period rotations are searched. CANONICAL holds, for every
+    rotation, the first rotation with the same blocks and the row and column
+    shift between the two, so placements covering the same cells compare
+    equal.
+    """
+    periods = {}
+    canonical = {}
+    for shape, rotations in GEOMETRY.items():
+        cells = [frozenset(zip(g.rows - g.top, g.cols - g.left)) for g in rotations]
+        same = [p for p in (1, 2) if all(rotations[r].masks == rotations[(r + p)%4].masks
+                                         for r in range(4))]
+        periods[shape] = same[0] if same else 4
+
+        canonical[shape] = []
+        for r, g in enumerate(rotations):
+            first = cells.index(cells[r])
+            h = rotations[first]
+            canonical[shape].append((first, g.top - h.top, g.left - h.left))
+    return periods, canonical
+
+
+PERIODS, CANONICAL = _symmetries()
+
+# Moves between (rotation, column) pairs and block offsets, keyed by shape
+# and board layout.
+_moves = {}
+_cells = {}
+
+
+def _transitions(shape, width, left_boundary, right_boundary):
+    """Return the moves of a shape between (rotation, column) pairs.
+
+    Pairs are indexed as rotation*width + col. Returns the indices every
+    index moves to, and the moves reversed, a list of (action, index) per
+    index.
+    """
+    key = (shape, width, left_boundary, right_boundary)
+    if key in _moves:
+        return _moves[key]
+
+    period = PERIODS[shape]
+    geometry = GEOMETRY[shape]
+    inside = set()
+    for rotation in range(period):
+        g = geometry[rotation]
+        for col in range(left_boundary - g.left, right_boundary - g.right + 1):
+            inside.add(rotation*width + col)
+
+    forward = [[] for _ in range(period*width)]
+    backward = [[] for _ in range(period*width)]
+    for index in inside:
+        rotation, col = divmod(index, width)
+        moves = [('move_left', index - 1), ('move_right', index + 1)]
+        if period > 1:
+            for action, turn in (('rotate_right', 1), ('rotate_left', -1)):
+                turned = (rotation + turn)%period
+                g = geometry[turned]
+
+                # Same kick as Board._kick.
+                kicked = col
+                if kicked + g.right >= right_boundary:
+                    kicked -= kicked + g.right - right_boundary
+                if kicked + g.left <= left_boundary:
+                    kicked += left_boundary - kicked - g.left
+                moves.append((action, turned*width + kicked))
+        for action, target in moves:
+            if target in inside:
+                forward[index].append(target)
+                backward[target].append((action, index))
+
+    _moves[key] = (forward, backward)
+    return forward, backward
+
+
+def _cell_tables(shape, width, left_boundary, right_boundary):
+    """Return the column and row offset of every block of a shape for every
+    (rotation, column) index, and a mask of the indices outside the walls,
+    as arrays for `_blocked_rows`."""
+    key = (shape, width, left_boundary, right_boundary)
+    if key in _cells:
+        return _cells[key]
+
+    cols = []
+    rows = []
+    outside = []
+    for rotation in range(PERIODS[shape]):
+        geometry = GEOMETRY[shape][rotation]
+        for col in range(width):
+            inside = left_boundary - geometry.left <= col <= right_boundary - geometry.right
+            cols.append(geometry.cols + col if inside else geometry.cols*0)
+            rows.append(geometry.rows)
+            outside.append(not inside)
+    _cells[key] = (np.array(cols), np.array(rows, dtype=np.int64), np.array(outside))
+    return _cells[key]
+
+
+def _blocked_rows(rows, width, shape, left_boundary, right_boundary):
+    """Return, for every (rotation, column) index, a bitmask of the rows at
+    which the tetromino would collide."""
+    everything = (1 << len(rows)) - 1
+    # Column bitmasks of the placed blocks, bit r set if row r is filled.
+    bits = np.array(rows, dtype=np.int64)[:, None] >> np.arange(width) & 1
+    cols = (bits << np.arange(len(rows))[:, None]).sum(axis=0)
+    cols[:left_boundary] = everything
+    cols[right_boundary+1:] = everything
+
+    cell_cols, cell_rows, outside = _cell_tables(shape, width, left_boundary, right_boundary)
+    blocked = np.bitwise_or.reduce(cols[cell_cols] >> cell_rows, axis=1)
+    blocked[outside] = everything
+    return blocked.tolist(), everything
+
+
+def _fall(rows, free):
+    """Extend every row in rows down through the free rows below it."""
+    rows |= free & (rows << 1)
+    free &= free << 1
+    rows |= free & (rows << 2)
+    free &= free << 2
+    rows |= free & (rows << 4)
+    free &= free << 4
+    rows |= free & (rows << 8)
+    free &= free << 8
+    rows |= free & (rows << 16)
+    return rows
+
+
+def placements(board, tetromino):
+    """Find every distinct placement the tetromino can reach.
+
+    Parameters
+    ----------
+    board: Board
+        Board to search on. It is not changed.
+    tetromino: Tetromino
+        The tetromino to place, searched from its current position.
+
+    Returns
+    -------
+    placements: list of Placement
+        One entry per distinct set of cells the tetromino can lock into,
+        with the shortest key sequence reaching it. The sequence ends with
+        'hard_drop'. Empty if the tetromino does not fit where it is.
+    """
+    shape = tetromino.shape
+    width = board.width
+    canonical = CANONICAL[shape]
+    forward, backward = _transitions(shape, width, board.left_boundary, board.right_boundary)
+    blocked, everything = _blocked_rows(board.locked_rows(), width, shape,
+                                        board.left_boundary, board.right_boundary)
+
+    start = (tetromino.rotation_index%PERIODS[shape])*width + tetromino.col
+    row = tetromino.row
+    if blocked[start] >> row & 1:
+        return []
+
+    # Layer k maps an index to the rows first reached with k moves. visits
+    # lists the (k, rows) of every layer an index is in, and unvisited the
+    # free rows not reached yet.
+    unvisited = [everything & ~mask for mask in blocked]
+    reached = [0]*len(blocked)
+    reached[start] = _fall(1 << row, unvisited[start])
+    unvisited[start] &= ~reached[start]
+    layers = [{start: reached[start]}]
+    visits = {start: [(0, reached[start])]}
+    while True:
+        found = {}
+        for index, rows in layers[-1].items():
+            for target in forward[index]:
+                new = rows & unvisited[target]
+                if new:
+                    found[target] = found.get(target, 0) | new
+        if not found:
+            break
+        moves = len(layers)
+        for index, rows in found.items():
+            rows = found[index] = _fall(rows, unvisited[index])
+            reached[index] |= rows
+            unvisited[index] &= ~rows
+            if index in visits:
+                visits[index].append((moves, rows))
+            else:
+                visits[index] = [(moves, rows)]
+        layers.append(found)
+
+    # Every reached row above a blocked row is a placement. It costs the
+    # moves, the soft drops down to the last move and the hard drop.
+    best = {}
+    for index in sorted(visits):
+        visited = visits[index]
+        below = blocked[index]
+        resting = reached[index] & (below >> 1)
+        if not resting:
+            continue
+        rotation, col = divmod(index, width)
+        first, drow, dcol = canonical[rotation]
+        col += dcol
+        while resting:
+            low = resting & -resting
+            resting ^= low
+            landing = low.bit_length() - 1
+            run = ((low << 1) - 1) & ~((1 << (below & (low - 1)).bit_length()) - 1)
+            cells = (first, landing + drow, col)
+            for moves, rows in visited:
+                entered = rows & run
+                if entered:
+                    cost = moves + (entered & -entered).bit_length() - 1
+                    if cells not in best or cost < best[cells][0]:
+                        best[cells] = (cost, index, landing, moves, cost - moves)
+
+    # Keys that enter an index at a row with a number of moves, shared by
+    # the placements whose paths meet there.
+    paths = {}
+    results = []
+    for cost, index, landing, moves, top in best.values():
+        # Walk back through the layers to the start or a known path.
+        trail = []
+        target = index
+        while moves and (target, moves, top) not in paths:
+            for action, source in backward[target]:
+                rows = layers[moves-1].get(source, 0)
+                if rows >> top & 1:
+                    break
+            # The source was entered at the first row of the run of
+            # reached rows the move starts from.
+            entry = (~rows & ((1 << top) - 1)).bit_length()
+            trail.append(((target, moves, top), action, top - entry))
+            target, moves, top = source, moves - 1, entry
+
+        keys = paths[target, moves, top] if moves else ()
+        for state, action, drops in reversed(trail):
+            keys = paths[state] = keys + ('soft_drop',)*drops + (action,)
+        rotation, col = divmod(index, width)
+        results.append(Placement(shape, rotation, landing, col, keys + ('hard_drop',)))
+    return results
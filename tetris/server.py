@@ -0,0 +1,434 @@
+"""Local multi-session game server.
+
+One asyncio process hosts many games. Every game is a `TickLoop` on a
+BitBoard, and a single scheduler task ticks all of them at the tick rate,
+so the sessions cost no threads or timers of their own. Two players can be
+matched head to head: lines cleared by one board are sent to the other as
+garbage rows.
+
+Clients talk newline-delimited JSON over TCP or a Unix socket. Client
+messages:
+
+    {"op": "join", "mode": "solo" or "versus", "seed": int or null}
+    {"op": "press", "action": "move_left", "repeat": false}
+    {"op": "release", "action": "move_left"}
+    {"op": "leave"}
+
+Server messages:
+
+    {"type": "joined", "session": int, "mode": str}
+    {"type": "start", "seed": int, "opponent": int or null}
+    {"type": "state", "tick", "piece": [shape, rotation, row, col], "next",
+     "held", "score", "lines", "level", "pieces", "garbage", "rows"}
+    {"type": "over", "winner": int or null, "score", "lines", "pieces"}
+    {"type": "error", "message": str}
+
+A state is only sent on ticks that changed the game. "rows" is only
+included when the placed blocks changed, as the 23 rows of
+`tetris.zobrist.pack`, top row first. "garbage" is the number of garbage
+rows waiting to rise on the next lock.
+"""
+
+import asyncio
+import json
+import random
+import time
+import numpy as np
+from tetris import zobrist
+from tetris.core import BitBoard
+from tetris.loop import TickLoop
+from tetris.simulator import Simulator, ACTIONS
+
+
+# Garbage rows sent to the opponent by the number of lines cleared at once.
+GARBAGE = (0, 0, 1, 2, 4)
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+class Session:
+    """One player's game on the server.
+
+    Attributes
+    ----------
+    id: int
+        Number of the session, unique in the server.
+    loop: TickLoop
+        The game, ticked by the server once the session is in a match.
+    match: Match or None
+        The match being played.
+    garbage: list of int
+        Hole columns of the garbage rows waiting for the next lock.
+    """
+
+    def __init__(self, id, writer, loop_settings=None):
+        self.id = id
+        self.writer = writer
+        self.loop = TickLoop(Simulator(BitBoard), **(loop_settings or {}))
+        self.match = None
+        self.mode = None
+        self.seed = None
+        self.garbage = []
+        self._last = None
+        self._rows_sent = False
+
+    def send(self, message):
+        self.writer.write(_encode(message))
+
+    def start(self, match, seed):
+        self.match = match
+        self.garbage = []
+        self._last = None
+        self._rows_sent = False
+        self.loop.reset(seed)
+
+    def state(self, changed):
+        """Return the state message if the game changed since the last one,
+        else None. changed forces the rows to be included."""
+        simulator = self.loop.simulator
+        tetromino = simulator.tetromino
+        board = simulator.board
+        held = board.held_tetromino
+        score = simulator.score
+        key = (tetromino.shape, tetromino.rotation_index, tetromino.row, tetromino.col,
+               held.shape if held is not None else None, score.score, len(self.garbage))
+        if key == self._last and not changed:
+            return None
+        self._last = key
+        message = {
+            'type': 'state',
+            'tick': self.loop.tick_count,
+            'piece': list(key[:4]),
+            'next': tetromino.next_shape,
+            'held': key[4],
+            'score': score.score,
+            'lines': self.loop.lines,
+            'level': score.level,
+            'pieces': simulator.pieces,
+            'garbage': key[6],
+        }
+        if changed or not self._rows_sent:
+            message['rows'] = zobrist.pack(board.locked_rows()).tolist()
+            self._rows_sent = True
+        return message
+
+
+class Match:
+    """Sessions ticked together, one for solo and two for versus.
+
+    Parameters
+    ----------
+    sessions: list of Session
+        Players of the match.
+    seed: int
+        Seed of every player's tetromino sequence, so versus players get the
+        same pieces, and of the garbage hole columns.
+    """
+
+    def __init__(self, sessions, seed):
+        self.sessions = sessions
+        self.seed = seed
+        self.rng = np.random.RandomState(seed % (1 << 32))
+        self.over = False
+        for session in sessions:
+            session.start(self, seed)
+
+    def opponent(self, session):
+        for other in self.sessions:
+            if other is not session:
+                return other
+        return None
+
+    def send_garbage(self, session, lines):
+        """Send the garbage of lines cleared by session to its opponent,
+        after cancelling garbage waiting for session itself."""
+        rows = GARBAGE[min(lines, len(GARBAGE) - 1)]
+        cancelled = min(rows, len(session.garbage))
+        del session.garbage[:cancelled]
+        rows -= cancelled
+        opponent = self.opponent(session)
+        if rows and opponent is not None:
+            hole = int(self.rng.randint(zobrist.COLUMNS))
+            opponent.garbage.extend([hole]*rows)
+
+    def tick(self):
+        """Advance every player by one tick and send the states. Return the
+        sessions that topped out."""
+        lost = []
+        for session in self.sessions:
+            loop = session.loop
+            placed, lines, done = loop.tick()
+            changed = bool(placed)
+            if lines:
+                self.send_garbage(session, lines)
+            if placed and session.garbage and not done:
+                tetromino = loop.simulator.tetromino
+                loop.simulator.board.add_garbage(tetromino, session.garbage)
+                session.garbage = []
+                done = loop.simulator.board.top_out
+            message = session.state(changed)
+            if message is not None:
+                session.send(message)
+            if done:
+                lost.append(session)
+        return lost
+
+    def finish(self, lost):
+        """End the match. The winner is the player left, or None."""
+        self.over = True
+        winners = [session for session in self.sessions if session not in lost]
+        winner = winners[0].id if len(self.sessions) > 1 and len(winners) == 1 else None
+        for session in self.sessions:
+            simulator = session.loop.simulator
+            session.send({
+                'type': 'over',
+                'winner': winner,
+                'score': simulator.score.score,
+                'lines': session.loop.lines,
+                'pieces': simulator.pieces,
+            })
+            session.match = None
+
+
+class Server:
+    """Hosts the sessions and ticks the matches.
+
+    Parameters
+    ----------
+    tick_rate: int
+        Scheduler ticks per second of real time.
+    turbo: int
+        Game ticks per scheduler tick. Load tests raise it to run games
+        faster than real time.
+    loop_settings: dict or None
+        Keyword arguments of every session's `TickLoop`, besides tick_rate.
+    max_buffer: int
+        Bytes of unsent messages a client may fall behind by before it is
+        disconnected.
+    """
+
+    def __init__(self, tick_rate=60, turbo=1, loop_settings=None, max_buffer=1 << 20):
+        self.tick_rate = tick_rate
+        self.turbo = turbo
+        self.loop_settings = dict(loop_settings or {}, tick_rate=tick_rate)
+        self.max_buffer = max_buffer
+        self.sessions = {}
+        self.matches = []
+        self.waiting = None
+        self.ticks = 0
+        self.late = 0
+        self._next_id = 0
+        self._seeds = random.SystemRandom()
+        self._scheduler = None
+
+    def join(self, session, mode='solo', seed=None):
+        """Start a solo match, or a versus match against the waiting player.
+        The first player of a versus match waits without ticking."""
+        session.mode = mode
+        session.send({'type': 'joined', 'session': session.id, 'mode': mode})
+        if mode == 'solo':
+            self._start([session], seed)
+        elif self.waiting is None or self.waiting is session:
+            self.waiting = session
+            session.seed = seed
+        else:
+            first = self.waiting
+            self.waiting = None
+            self._start([first, session], first.seed if first.seed is not None else seed)
+
+    def _start(self, sessions, seed):
+        if seed is None:
+            seed = self._seeds.getrandbits(32)
+        match = Match(sessions, seed)
+        self.matches.append(match)
+        for session in sessions:
+            opponent = match.opponent(session)
+            session.send({'type': 'start', 'seed': seed,
+                          'opponent': opponent.id if opponent is not None else None})
+
+    def leave(self, session):
+        """Remove a session. Its opponent wins the match."""
+        self.sessions.pop(session.id, None)
+        if self.waiting is session:
+            self.waiting = None
+        match = session.match
+        if match is not None and not match.over:
+            match.finish([session])
+
+    def handle(self, session, message):
+        """Apply one client message."""
+        op = message.get('op')
+        if op == 'join':
+            if session.match is not None or self.waiting is session:
+                raise ValueError('already playing')
+            mode = message.get('mode', 'solo')
+            if mode not in ('solo', 'versus'):
+                raise ValueError('unknown mode %r' % mode)
+            seed = message.get('seed')
+            self.join(session, mode, int(seed) if seed is not None else None)
+        elif op in ('press', 'release'):
+            action = message.get('action')
+            if action not in ACTIONS:
+                raise ValueError('unknown action %r' % action)
+            if session.match is None:
+                return
+            if op == 'press':
+                session.loop.press(action, bool(message.get('repeat', False)))
+            else:
+                session.loop.release(action)
+        else:
+            raise ValueError('unknown op %r' % op)
+
+    async def client(self, reader, writer):
+        """Serve one connection until it leaves or disconnects."""
+        session = Session(self._next_id, writer, self.loop_settings)
+        self._next_id += 1
+        self.sessions[session.id] = session
+        self.start()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line.decode())
+                    if message.get('op') == 'leave':
+                        break
+                    self.handle(session, message)
+                except (ValueError, AttributeError, TypeError) as error:
+                    session.send({'type': 'error', 'message': str(error)})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.leave(session)
+            writer.close()
+
+    def tick(self):
+        """Advance every match by one game tick."""
+        for match in self.matches:
+            lost = match.tick()
+            if lost and not match.over:
+                match.finish(lost)
+        self.matches = [match for match in self.matches if not match.over]
+        self.ticks += 1
+
+    def _drop_slow_clients(self):
+        for session in list(self.sessions.values()):
+            transport = session.writer.transport
+            if transport.is_closing() or transport.get_write_buffer_size() > self.max_buffer:
+                self.leave(session)
+                transport.abort()
+
+    async def schedule(self):
+        """Tick the matches at the tick rate until cancelled. A scheduler
+        tick that falls behind runs late instead of being made up for."""
+        loop = asyncio.get_event_loop()
+        interval = 1/self.tick_rate
+        deadline = loop.time()
+        while True:
+            for _ in range(self.turbo):
+                self.tick()
+            self._drop_slow_clients()
+            deadline += interval
+            delay = deadline - loop.time()
+            if delay < 0:
+                self.late += 1
+                deadline = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def start(self):
+        """Start the scheduler if it is not running."""
+        if self._scheduler is None:
+            self._scheduler = asyncio.ensure_future(self.schedule())
+
+    def stop(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+            self._scheduler = None
+
+    async def listen(self, host='127.0.0.1', port=7777, path=None, backlog=1024):
+        """Accept clients on a TCP port, or on a Unix socket with path.
+        Return the asyncio server. The backlog lets a load test connect all
+        its bots at once."""
+        self.start()
+        if path is not None:
+            return await asyncio.start_unix_server(self.client, path=path, backlog=backlog)
+        return await asyncio.start_server(self.client, host, port, backlog=backlog)
+
+
+async def bot(host='127.0.0.1', port=7777, path=None, mode='versus', seed=None):
+    """Play one match over the protocol with the scripted spreading policy
+    of `benchmarks.games` and return the 'over' message.
+
+    The policy sends all inputs of a piece at once when it appears, so a bot
+    costs the server little more than its game.
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write(_encode({'op': 'join', 'mode': mode, 'seed': seed}))
+    pieces = None
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return None
+            message = json.loads(line.decode())
+            if message['type'] == 'over':
+                return message
+            if message['type'] != 'state' or message['pieces'] == pieces:
+                continue
+            n = pieces = message['pieces']
+            shift = (n*3)%10 - 4
+            move = 'move_right' if shift > 0 else 'move_left'
+            actions = ['rotate_right']*(n%4) + [move]*abs(shift) + ['hard_drop']
+            writer.write(b''.join(_encode({'op': 'press', 'action': action})
+                                  for action in actions))
+    finally:
+        writer.close()
+
+
+async def load_test(matches, host='127.0.0.1', port=7777, path=None):
+    """Play matches of two bots at once against a server.
+
+    Returns
+    -------
+    result: dict
+        'matches', 'pieces' placed by all players, 'elapsed' seconds and
+        'pieces_per_sec'.
+    """
+    start = time.perf_counter()
+    results = await asyncio.gather(*[bot(host, port, path) for _ in range(2*matches)])
+    elapsed = time.perf_counter() - start
+    pieces = sum(result['pieces'] for result in results if result is not None)
+    return {
+        'matches': matches,
+        'pieces': pieces,
+        'elapsed': elapsed,
+        'pieces_per_sec': pieces/elapsed,
+    }
+
+
+def serve(port=7777, path=None, turbo=1):
+    """Run a server until interrupted."""
+    loop = asyncio.get_event_loop()
+    server = Server(turbo=turbo)
+    listener = loop.run_until_complete(server.listen(port=port, path=path))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        listener.close()
+
+
+def run_bots(matches, port=7777, path=None):
+    """Run `load_test` against a server and return its result."""
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(load_test(matches, port=port, path=path))
@@ -12,9 +12,24 @@ class DisplaySettings:
     width = TetrominoSettings.tile_size*27
     height = TetrominoSettings.tile_size*25
     fps = 60
+    dirty_rects = True  # Only push the changed parts of the window.
 
 class BoardSettings:
     pass
 
 class TimerSettings:
+    tick_rate = 60          # Logic ticks per second of game time.
     drop_interval = 1000
+    level_speedup = 75      # Milliseconds the drop interval shrinks per level.
+    lock_delay = 0          # Milliseconds a landed tetromino can still move.
+    max_catch_up = 10       # Most ticks run in one frame when behind.
+    window = 600            # Frames the timing percentiles cover.
+    dump_path = 'timings.json'  # Only written in debug mode.
+    dump_interval = 5000    # Milliseconds between timing dumps in debug mode.
+    time_board = True       # Time the board's moves, locks and line clears.
+    overlay_interval = 500  # Milliseconds between timing overlay redraws.
+
+class ScoreSettings:
+    path = 'scores.log'     # Append-only log of finished games.
+    legacy_path = 'scores'  # Pickled scores of older versions, imported once.
+    top = 10                # Best scores kept in the index.
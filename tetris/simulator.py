@@ -0,0 +1,145 @@
+"""Headless Tetris simulation.
+
+Drives `Board`, `Tetromino` and `Score` without pygame, a display or the
+filesystem so games can be played from scripts and worker processes.
+"""
+
+import random
+import numpy as np
+from tetris.core import BitBoard, Tetromino, Score, PieceGenerator
+
+
+ACTIONS = ('move_left', 'move_right', 'rotate_left', 'rotate_right',
+           'soft_drop', 'hard_drop', 'hold')
+
+
+class Simulator:
+    """Headless game of Tetris.
+
+    Each step applies one action to the current tetromino. There is no
+    gravity, the tetromino only moves down on 'soft_drop' and 'hard_drop'.
+    A 'hard_drop' locks the tetromino like the space bar does in `game.Game`.
+    """
+
+    # Action, column shift and rotation shift of the sideways moves.
+    SHIFTS = (
+        ('move_left', -1, 0),
+        ('move_right', 1, 0),
+        ('rotate_left', 0, -1),
+        ('rotate_right', 0, 1),
+    )
+
+    def __init__(self, board=BitBoard, randomizer='uniform'):
+        """Create the simulator.
+
+        Parameters
+        ----------
+        board: Board class
+            Board engine to simulate with, `BitBoard` by default.
+        randomizer: str
+            Mode of the `PieceGenerator`, 'uniform' or 'bag'.
+        """
+        self.board = board()
+        self.randomizer = randomizer
+        self.tetromino = None
+        self.score = Score()
+        self.pieces = 0
+        self.rng = None
+
+    def reset(self, seed=None):
+        """Start a new game and return its state.
+
+        Parameters
+        ----------
+        seed: int or None
+            Seed of the tetromino sequence. The global random module is not
+            touched, so games with the same seed and actions are identical.
+            Policies can draw from `rng` to stay reproducible as well.
+        """
+        self.board.reset()
+        self.score.reset()
+        self.rng = random.Random(seed)
+        self.tetromino = Tetromino(PieceGenerator(seed, self.randomizer))
+        self.board.start_game(self.tetromino)
+        self.pieces = 0
+        return self.state()
+
+    def state(self):
+        """Return the visible 20x10 playfield including the current
+        tetromino."""
+        board = self.board
+        return board.board[3:board.height-1, 3:board.width-3].copy()
+
+    def step(self, action):
+        """Apply an action to the current tetromino.
+
+        Parameters
+        ----------
+        action: str or int
+            One of ACTIONS or its index.
+
+        Returns
+        -------
+        state: numpy array
+            The playfield after the action.
+        lines: int
+            Number of lines cleared by the action.
+        done: bool
+            True once the game has topped out.
+        """
+        lines = self.act(action)[1]
+        return self.state(), lines, self.board.top_out
+
+    def act(self, action):
+        """Apply an action like `step` without building the state.
+
+        Returns
+        -------
+        placed: bool
+            True if the tetromino was locked.
+        lines: int
+            Number of lines cleared by the action.
+        """
+        if not isinstance(action, str):
+            action = ACTIONS[action]
+        board = self.board
+
+        if action == 'hard_drop':
+            board.hard_drop(self.tetromino)
+            placed = board.soft_drop(self.tetromino)
+        else:
+            placed = getattr(board, action)(self.tetromino)
+        if placed and not board.top_out:
+            self.pieces += 1
+
+        lines = board.filled_rows.size
+        if lines != 0:
+            self.score.add_score(lines)
+            board.filled_rows = np.array([])
+        return placed, lines
+
+    def legal_actions(self):
+        """Return the actions that change the state of the game."""
+        board = self.board
+        tetromino = self.tetromino
+        if board.top_out:
+            return []
+
+        legal = []
+        col = tetromino.col
+        rotation = tetromino.rotation_index
+        for action, dcol, drot in self.SHIFTS:
+            tetromino.col = col + dcol
+            tetromino.rotation_index = (rotation + drot)%4
+            if drot:
+                board._kick(tetromino)
+            if board._fits(tetromino):
+                legal.append(action)
+            tetromino.col = col
+            tetromino.rotation_index = rotation
+
+        legal.append('soft_drop')
+        legal.append('hard_drop')
+        if board.can_hold(tetromino):
+            legal.append('hold')
+        return legal
@@ -0,0 +1,329 @@
+"""Delta encoded stream of a game for spectators.
+
+`Encoder` turns successive states of a board into frames that only carry
+what changed since the previous frame, and `Decoder` rebuilds the board
+from them on the viewer side. The stream covers the cropped board that
+`Board.__str__` shows, the visible 20 rows and the floor, plus the current
+tetromino, its shadow, the held tetromino and the score.
+
+A frame is a FRAME header, its payload length and number, followed by
+events. Every event starts with its tag byte:
+
+- PIECE: shape, color, rotation, row and col of the current tetromino and
+  the row of its shadow.
+- LOCK: a tetromino locked with its shape, color, rotation, row and col.
+  The viewer paints its cells in its color.
+- CLEAR: the number of cleared rows and their indices.
+- ROW: index and 10 bit mask of a row that differs from what the events
+  above left on the viewer. Blocks added this way, like garbage rows or the
+  pieces of several locks in one frame, are colored UNKNOWN.
+- HOLD: shape and color of the held tetromino.
+- SCORE: score, total lines, level and lines towards the next level.
+- KEYFRAME: all rows and cell colors. It is followed by a PIECE, HOLD and
+  SCORE event and resets the viewer, who ignores frames until the first
+  one.
+
+Row indices count the visible rows, 0 being the top one. Shapes and colors
+are indices into `PieceGenerator.SHAPE_NAMES` and `Tetromino.COLORS`, EMPTY when
+there is no piece.
+"""
+
+import struct
+import numpy as np
+from tetris import zobrist
+from tetris.core import Piece, PieceGenerator, Tetromino
+
+
+# Event tags.
+PIECE = 1
+LOCK = 2
+CLEAR = 3
+ROW = 4
+HOLD = 5
+SCORE = 6
+KEYFRAME = 7
+
+FRAME = struct.Struct('<HI')          # payload length, frame number
+PIECE_EVENT = struct.Struct('<7B')
+LOCK_EVENT = struct.Struct('<6B')
+CLEAR_EVENT = struct.Struct('<2B')    # followed by the row indices
+ROW_EVENT = struct.Struct('<BBH')
+HOLD_EVENT = struct.Struct('<3B')
+SCORE_EVENT = struct.Struct('<BQIHH')
+
+TOP = 3                               # First visible row of the board.
+ROWS = zobrist.HEIGHT - 1 - TOP       # Visible rows.
+COLUMNS = zobrist.COLUMNS
+KEYFRAME_EVENT = struct.Struct('<B%dH%dB' % (ROWS, ROWS*COLUMNS))
+
+EMPTY = 0xff
+# Colors of the cells: 0 for no block, 1 + index into Tetromino.COLORS, or
+# UNKNOWN.
+UNKNOWN = 0xff
+
+SHAPES = PieceGenerator.SHAPE_NAMES
+COLORS = Tetromino.COLORS
+
+
+def _piece_fields(piece):
+    """Return the shape, color, rotation, row and col of a piece as byte
+    values."""
+    if piece is None:
+        return (EMPTY,)*5
+    return (SHAPES.index(piece.shape), COLORS.index(piece.color),
+            piece.rotation_index, piece.row, piece.col)
+
+
+def _piece(shape, color, rotation, row, col):
+    if shape == EMPTY:
+        return None
+    return Piece(SHAPES[shape], COLORS[color], rotation, row, col)
+
+
+class Decoder:
+    """Viewer side of the stream.
+
+    Attributes
+    ----------
+    rows: numpy array
+        Bit mask of the locked blocks of every visible row, top row first.
+    colors: numpy array
+        Color of every visible cell, see UNKNOWN.
+    current, shadow, held: Piece or None
+        The tetrominos.
+    score, lines, level, line_count: int
+        The score.
+    frame: int
+        Number of the last frame applied.
+    synced: bool
+        True once a keyframe arrived. Earlier frames are ignored.
+    """
+
+    def __init__(self):
+        self.rows = np.zeros(ROWS, dtype=np.uint16)
+        self.colors = np.zeros((ROWS, COLUMNS), dtype=np.uint8)
+        self.current = None
+        self.shadow = None
+        self.held = None
+        self.score = 0
+        self.lines = 0
+        self.level = 0
+        self.line_count = 0
+        self.frame = -1
+        self.synced = False
+        self._buffer = b''
+
+    def feed(self, data):
+        """Apply the frames in a chunk of the stream. A frame cut at the end
+        of the chunk waits for the next one. Return the number of frames
+        applied."""
+        buffer = self._buffer + data
+        offset = 0
+        frames = 0
+        while len(buffer) - offset >= FRAME.size:
+            length, number = FRAME.unpack_from(buffer, offset)
+            end = offset + FRAME.size + length
+            if end > len(buffer):
+                break
+            self.apply(memoryview(buffer)[offset + FRAME.size:end], number)
+            offset = end
+            frames += 1
+        self._buffer = buffer[offset:]
+        return frames
+
+    def apply(self, payload, number):
+        """Apply the events of one frame."""
+        payload = bytes(payload)
+        if not self.synced:
+            if not payload or payload[0] != KEYFRAME:
+                return
+            self.synced = True
+        offset = 0
+        while offset < len(payload):
+            tag = payload[offset]
+            if tag == PIECE:
+                fields = PIECE_EVENT.unpack_from(payload, offset)
+                self.current = _piece(*fields[1:6])
+                self.shadow = None
+                if self.current is not None and fields[6] != EMPTY:
+                    self.shadow = self.current.copy()
+                    self.shadow.row = fields[6]
+                offset += PIECE_EVENT.size
+            elif tag == LOCK:
+                piece = _piece(*LOCK_EVENT.unpack_from(payload, offset)[1:])
+                self._lock(piece)
+                offset += LOCK_EVENT.size
+            elif tag == CLEAR:
+                count = payload[offset + 1]
+                start = offset + CLEAR_EVENT.size
+                self._clear(list(payload[start:start + count]))
+                offset = start + count
+            elif tag == ROW:
+                _, row, mask = ROW_EVENT.unpack_from(payload, offset)
+                self._set_row(row, mask)
+                offset += ROW_EVENT.size
+            elif tag == HOLD:
+                shape, color = HOLD_EVENT.unpack_from(payload, offset)[1:]
+                self.held = _piece(shape, color, 0, 3, 6)
+                offset += HOLD_EVENT.size
+            elif tag == SCORE:
+                (_, self.score, self.lines,
+                 self.level, self.line_count) = SCORE_EVENT.unpack_from(payload, offset)
+                offset += SCORE_EVENT.size
+            elif tag == KEYFRAME:
+                fields = KEYFRAME_EVENT.unpack_from(payload, offset)
+                self.rows[:] = fields[1:ROWS + 1]
+                self.colors[:] = np.reshape(fields[ROWS + 1:], (ROWS, COLUMNS))
+                offset += KEYFRAME_EVENT.size
+            else:
+                raise ValueError('Unknown event %d at byte %d of frame %d' % (tag, offset, number))
+        self.frame = number
+
+    def _lock(self, piece):
+        color = COLORS.index(piece.color) + 1
+        p = piece.block_coordinates()
+        for r, c in zip(p[0].tolist(), p[1].tolist()):
+            r -= TOP
+            c -= zobrist.LEFT
+            if 0 <= r < ROWS and 0 <= c < COLUMNS:
+                self.rows[r] |= 1 << c
+                self.colors[r, c] = color
+
+    def _clear(self, cleared):
+        kept = [r for r in range(ROWS) if r not in cleared]
+        n = len(cleared)
+        self.rows[n:] = self.rows[kept]
+        self.rows[:n] = 0
+        self.colors[n:] = self.colors[kept]
+        self.colors[:n] = 0
+
+    def _set_row(self, row, mask):
+        old = int(self.rows[row])
+        self.rows[row] = mask
+        for c in range(COLUMNS):
+            bit = 1 << c
+            if mask & bit and not old & bit:
+                self.colors[row, c] = UNKNOWN
+            elif not mask & bit:
+                self.colors[row, c] = 0
+
+    @property
+    def board(self):
+        """Return the board like `str(board)` crops it: the visible rows
+        and the floor, 1 for blocks including the current tetromino and 9
+        for the floor."""
+        board = np.zeros((ROWS + 1, COLUMNS), dtype=int)
+        board[:ROWS] = self.rows[:, None] >> np.arange(COLUMNS) & 1
+        board[ROWS] = 9
+        if self.current is not None:
+            p = self.current.block_coordinates()
+            rows = p[0] - TOP
+            cols = p[1] - zobrist.LEFT
+            visible = rows >= 0
+            board[rows[visible], cols[visible]] = 1
+        return board
+
+
+class Encoder:
+    """Game side of the stream.
+
+    The encoder mirrors what a viewer has rebuilt with a `Decoder` of its
+    own, so every frame only holds the events that bring the viewer from
+    the last frame to the current board.
+
+    Parameters
+    ----------
+    keyframe_interval: int
+        Frames between keyframes, which let viewers join in the middle of
+        the stream and correct any drift.
+    """
+
+    def __init__(self, keyframe_interval=120):
+        self.keyframe_interval = keyframe_interval
+        self.mirror = Decoder()
+        self.frame = 0
+        self._placed = None
+        self._hash = None
+
+    def encode(self, board, score=None, lines=0):
+        """Return the next frame for the state of a board, or b'' if nothing
+        changed and no keyframe is due.
+
+        Parameters
+        ----------
+        board: Board or BitBoard
+            The game's board.
+        score: Score or None
+            The game's score.
+        lines: int
+            Total lines cleared, `TickLoop.lines` for example.
+        """
+        mirror = self.mirror
+        number = self.frame
+        self.frame += 1
+        keyframe = not mirror.synced or number % self.keyframe_interval == 0
+        mirror.synced = True
+        events = []
+
+        # Board events go straight into the mirror, so the next ones are
+        # computed against what the viewer has after them.
+        placed = board.placed_tetromino
+        if placed is not self._placed and placed is not None:
+            events.append(LOCK_EVENT.pack(LOCK, *_piece_fields(placed)))
+            mirror._lock(placed)
+            full = [r for r in range(ROWS) if mirror.rows[r] == zobrist.PLAYFIELD]
+            if full:
+                events.append(CLEAR_EVENT.pack(CLEAR, len(full)) + bytes(full))
+                mirror._clear(full)
+        self._placed = placed
+
+        if board.hash != self._hash or events:
+            self._hash = board.hash
+            rows = zobrist.pack(board.locked_rows())[TOP:]
+            for r in np.flatnonzero(rows != mirror.rows).tolist():
+                events.append(ROW_EVENT.pack(ROW, r, int(rows[r])))
+                mirror._set_row(r, int(rows[r]))
+
+        current = board.current_tetromino
+        shadow = board.shadow
+        piece = _piece_fields(current) + (shadow.row if current is not None and shadow is not None
+                                          else EMPTY,)
+        mirror_shadow = mirror.shadow.row if mirror.shadow is not None else EMPTY
+        if piece != _piece_fields(mirror.current) + (mirror_shadow,):
+            events.append(self._apply(PIECE_EVENT.pack(PIECE, *piece), number))
+
+        held = _piece_fields(board.held_tetromino)[:2]
+        if held != _piece_fields(mirror.held)[:2]:
+            events.append(self._apply(HOLD_EVENT.pack(HOLD, *held), number))
+
+        totals = ((score.score, lines, score.level, score.line_count)
+                  if score is not None else (0, lines, 0, 0))
+        if totals != (mirror.score, mirror.lines, mirror.level, mirror.line_count):
+            events.append(self._apply(SCORE_EVENT.pack(SCORE, *totals), number))
+
+        mirror.frame = number
+        payload = self._keyframe(piece, held, totals) if keyframe else b''.join(events)
+        if not payload:
+            return b''
+        return FRAME.pack(len(payload), number) + payload
+
+    def _apply(self, event, number):
+        self.mirror.apply(event, number)
+        return event
+
+    def _keyframe(self, piece, held, totals):
+        mirror = self.mirror
+        return (KEYFRAME_EVENT.pack(KEYFRAME, *mirror.rows.tolist(), *mirror.colors.ravel().tolist())
+                + PIECE_EVENT.pack(PIECE, *piece)
+                + HOLD_EVENT.pack(HOLD, *held)
+                + SCORE_EVENT.pack(SCORE, *totals))
+
+    def keyframe(self):
+        """Return a keyframe of the last encoded state for a viewer joining
+        between keyframes, without advancing the stream."""
+        mirror = self.mirror
+        shadow = mirror.shadow.row if mirror.shadow is not None else EMPTY
+        payload = self._keyframe(_piece_fields(mirror.current) + (shadow,),
+                                 _piece_fields(mirror.held)[:2],
+                                 (mirror.score, mirror.lines, mirror.level, mirror.line_count))
+        return FRAME.pack(len(payload), max(mirror.frame, 0)) + payload
@@ -0,0 +1,93 @@
+"""Debug telemetry that does not block the game loop.
+
+Records go into a bounded in-memory ring buffer. A background thread drains
+the buffer at a capped rate, appends the records to a log file as JSON lines
+and keeps the latest ones as text for an on-screen overlay.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+
+class Telemetry:
+    """Ring buffer of debug records drained by a background thread.
+
+    Parameters
+    ----------
+    path: str or None
+        File the records are appended to, or None to only keep the overlay
+        lines.
+    capacity: int
+        Maximum number of records waiting to be drained. The oldest ones are
+        dropped when the buffer is full.
+    rate: float
+        Maximum number of drains per second.
+    overlay_lines: int
+        Number of latest records kept as text for the overlay.
+    """
+
+    def __init__(self, path=None, capacity=1024, rate=10, overlay_lines=6):
+        self.path = path
+        self.buffer = deque(maxlen=capacity)
+        self.interval = 1/rate
+        self.overlay = deque(maxlen=overlay_lines)
+        self.version = 0
+        self.recorded = 0
+        self.drained = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def dropped(self):
+        """Number of records dropped because the buffer was full."""
+        return self.recorded - self.drained - len(self.buffer)
+
+    def record(self, kind, **fields):
+        """Add a record. Values must be JSON serializable."""
+        # Appending to a deque is atomic, so no lock is needed.
+        self.buffer.append((time.time(), kind, fields))
+        self.recorded += 1
+
+    def overlay_text(self):
+        """Return the latest records as lines of text."""
+        return list(self.overlay)
+
+    def start(self):
+        """Start draining in a daemon thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the thread and drain what is left."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.drain()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.drain()
+
+    def drain(self):
+        """Write out every buffered record. Return the number written."""
+        lines = []
+        while True:
+            try:
+                stamp, kind, fields = self.buffer.popleft()
+            except IndexError:
+                break
+            lines.append(json.dumps(dict(fields, time=stamp, kind=kind), sort_keys=True, default=str))
+            self.overlay.append(' '.join([kind] + ['%s=%s' % item for item in fields.items()]))
+        if not lines:
+            return 0
+        if self.path is not None:
+            with open(self.path, 'a') as fp:
+                fp.write('\n'.join(lines) + '\n')
+        self.drained += len(lines)
+        self.version += 1
+        return len(lines)
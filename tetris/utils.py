@@ -1,22 +1,110 @@
-
+import json
+import time
 import numpy as np
-import pygame
+from collections import namedtuple, deque, Counter
 
 class Timer:
+    """Per-phase timings and counters of a loop.
+
+    Call `lap(phase)` when a phase ends: the time since the previous lap is
+    added to that phase. `end_frame` stores the sums of the frame, so
+    percentiles are per frame over the last `window` frames. Times are in
+    milliseconds.
+    """
 
-    def __init__(self):
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window=600):
+        self.window = window
         self.time = 0
-        self.clock = pygame.time.Clock()
+        self.phases = {}
+        self.current = {}
+        self.counters = Counter()
+        self.frames = 0
+        self.last = time.perf_counter()
+        self.frame_start = self.last
 
     def add(self, ms):
         self.time += ms
 
     def reset(self):
-        self.time = 0
+        self.__init__(self.window)
 
     def get(self):
         return self.time
 
+    def lap(self, phase):
+        """Add the time since the previous lap to phase."""
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0) + (now - self.last)*1000
+        self.last = now
+
+    def instrument(self, obj, phases):
+        """Time method calls of an object.
+
+        Parameters
+        ----------
+        obj: object
+            The object whose methods are wrapped. Only this instance is
+            changed, its class keeps the plain methods.
+        phases: dict
+            Phase name of every method name. The time spent in the calls is
+            added to the phase without ending a lap, so it is also part of
+            the phase of the lap the calls happen in, and calls made by a
+            timed method count towards both phases.
+        """
+        for name, phase in phases.items():
+            setattr(obj, name, self._timed(getattr(obj, name), phase))
+
+    def _timed(self, method, phase):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.current[phase] = self.current.get(phase, 0) + (time.perf_counter() - start)*1000
+        return timed
+
+    def count(self, name, n=1):
+        """Add n to a counter."""
+        self.counters[name] += n
+
+    def end_frame(self):
+        """Store the phase times of the frame and start the next one."""
+        self.lap('other')
+        self.current['frame'] = (self.last - self.frame_start)*1000
+        for phase in self.phases.keys() | self.current.keys():
+            if phase not in self.phases:
+                self.phases[phase] = deque([0.0]*min(self.frames, self.window), maxlen=self.window)
+            self.phases[phase].append(self.current.get(phase, 0.0))
+        self.add(self.current['frame'])
+        self.current = {}
+        self.frames += 1
+        self.frame_start = self.last
+
+    def stats(self):
+        """Return the mean and percentiles of every phase and the counters.
+
+        Returns
+        -------
+        stats: dict
+            'frames', the number of frames timed, 'counters', and 'phases',
+            a dict of {'mean', 'p50', 'p95', 'p99'} in milliseconds per
+            phase.
+        """
+        phases = {}
+        for phase, samples in self.phases.items():
+            times = np.array(samples)
+            values = np.percentile(times, self.PERCENTILES)
+            phases[phase] = dict(mean=float(times.mean()),
+                                 **{'p%d' % p: float(v) for p, v in zip(self.PERCENTILES, values)})
+        return {'frames': self.frames, 'counters': dict(self.counters), 'phases': phases}
+
+    def dump(self, path):
+        """Write the stats to a JSON file."""
+        with open(path, 'w') as fp:
+            json.dump(self.stats(), fp, indent=2, sort_keys=True)
+
 
 """Standard tetromino shapes in Tetris. Each shape and their rotations are
 stored as 4x4 matricies within a dictionary.
@@ -181,3 +269,32 @@ SHAPES = {
     ]
 }
 
+
+"""Geometry of every tetromino rotation, computed once from SHAPES.
+
+GEOMETRY[shape][rotation_index] is a PieceGeometry holding:
+    rows, cols: read-only numpy arrays with the offsets of every block.
+    top, bottom, left, right: bounding box of the blocks in the 4x4 matrix.
+    bottoms: (column offset, lowest row offset) for every occupied column.
+    masks: (row offset, column bitmask) for every occupied row.
+"""
+
+PieceGeometry = namedtuple('PieceGeometry',
+        ['rows', 'cols', 'top', 'bottom', 'left', 'right', 'bottoms', 'masks'])
+
+
+def _piece_geometry(matrix):
+    """Return the PieceGeometry of a 4x4 tetromino matrix."""
+    rows, cols = np.where(matrix == 1)
+    rows.flags.writeable = False
+    cols.flags.writeable = False
+    bottoms = tuple((int(c), int(rows[cols == c].max())) for c in np.unique(cols))
+    masks = tuple((int(r), sum(1 << int(c) for c in cols[rows == r]))
+                  for r in np.unique(rows))
+    return PieceGeometry(rows, cols, int(rows.min()), int(rows.max()),
+                         int(cols.min()), int(cols.max()), bottoms, masks)
+
+
+GEOMETRY = {shape: [_piece_geometry(matrix) for matrix in rotations]
+            for shape, rotations in SHAPES.items()}
+
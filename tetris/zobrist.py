@@ -0,0 +1,178 @@
+"""Zobrist hashing of Tetris boards and a deduplicated position store.
+
+Every cell of the board has a random 64-bit key and the hash of a board is
+the XOR of the keys of its placed blocks. Locking a tetromino XORs in its
+cells. The keys of every possible row are tabulated, so shifting rows after a
+line clear only XORs the old and new value of the rows that moved.
+"""
+
+import random
+import numpy as np
+
+
+HEIGHT = 20 + 4   # Rows of the board including spawn rows and floor.
+WIDTH = 10 + 6    # Columns of the board including the sides.
+LEFT = 3          # First column of the playfield.
+COLUMNS = 10      # Columns of the playfield.
+PLAYFIELD = (1 << COLUMNS) - 1
+
+_rng = random.Random(0x7e7215)
+KEYS = [[_rng.getrandbits(64) for c in range(WIDTH)] for r in range(HEIGHT)]
+
+
+def _row_keys(keys):
+    """Return the key of every playfield bitmask of a row."""
+    table = [0]*(1 << COLUMNS)
+    for mask in range(1, 1 << COLUMNS):
+        low = mask & -mask
+        table[mask] = table[mask ^ low] ^ keys[LEFT + low.bit_length() - 1]
+    return table
+
+
+ROW_KEYS = [_row_keys(KEYS[r]) for r in range(HEIGHT)]
+
+
+def update(h, r, old, new):
+    """Return the hash h after row r changed from old to new.
+
+    Rows are bitmasks laid out like the rows of `BitBoard`, bit c set if
+    column c is filled. The walls are ignored.
+    """
+    keys = ROW_KEYS[r]
+    return h ^ keys[old >> LEFT & PLAYFIELD] ^ keys[new >> LEFT & PLAYFIELD]
+
+
+def board_hash(rows):
+    """Compute the hash of a list of row bitmasks from scratch."""
+    h = 0
+    for r, row in enumerate(rows[:HEIGHT-1]):
+        h ^= ROW_KEYS[r][row >> LEFT & PLAYFIELD]
+    return h
+
+
+def pack(rows):
+    """Return the playfield of row bitmasks as a uint16 array, one row per
+    entry and the floor left out."""
+    return np.array([row >> LEFT & PLAYFIELD for row in rows[:HEIGHT-1]], dtype=np.uint16)
+
+
+def unpack(packed):
+    """Return the row bitmasks, with walls and floor, of a playfield packed
+    by `pack`."""
+    full = (1 << WIDTH) - 1
+    walls = full & ~(PLAYFIELD << LEFT)
+    return [int(row) << LEFT | walls for row in packed] + [full]
+
+
+class PositionStore:
+    """Fixed size table of positions keyed by their hash.
+
+    Every entry keeps the bit-packed rows of the position, how often it was
+    seen and the best outcome recorded for it. Memory is bounded by the
+    capacity: entries are found by probing a few slots after hash % capacity
+    and, when all of them are taken, the least visited one is replaced.
+    """
+
+    def __init__(self, capacity=1 << 20, probe=8):
+        """Allocate the table.
+
+        Parameters
+        ----------
+        capacity: int
+            Number of slots, rounded up to a power of two.
+        probe: int
+            Number of slots searched for a position.
+        """
+        capacity = 1 << max(capacity - 1, 1).bit_length()
+        self.mask = capacity - 1
+        self.probe = probe
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+        self.rows = np.zeros((capacity, HEIGHT-1), dtype=np.uint16)
+        self.visits = np.zeros(capacity, dtype=np.uint32)
+        self.best = np.full(capacity, -np.inf)
+        self.size = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, h):
+        return self._find(h)[1]
+
+    def _find(self, h):
+        """Return the slot of a hash and whether it holds the hash. When the
+        hash is missing the slot is where it should be added."""
+        key = h or 1  # Zero marks an empty slot.
+        start = key & self.mask
+        for i in range(self.probe):
+            slot = (start + i) & self.mask
+            stored = int(self.keys[slot])
+            if stored == key:
+                return slot, True
+            if stored == 0:
+                return slot, False
+        window = (start + np.arange(self.probe)) & self.mask
+        return int(window[np.argmin(self.visits[window])]), False
+
+    def add(self, h, rows, outcome=None):
+        """Record a visit of a position.
+
+        Parameters
+        ----------
+        h: int
+            Hash of the position, e.g. `Board.hash`.
+        rows: list of int
+            Row bitmasks of the position, e.g. `Board.locked_rows()`.
+        outcome: float or None
+            Outcome reached from the position, the best one is kept.
+
+        Returns
+        -------
+        visits: int
+            Number of visits of the position, including this one.
+        """
+        slot, found = self._find(h)
+        if not found:
+            if self.keys[slot] != 0:
+                self.evictions += 1
+            else:
+                self.size += 1
+            self.keys[slot] = h or 1
+            self.rows[slot] = pack(rows)
+            self.visits[slot] = 0
+            self.best[slot] = -np.inf
+        self.visits[slot] += 1
+        if outcome is not None and outcome > self.best[slot]:
+            self.best[slot] = outcome
+        return int(self.visits[slot])
+
+    def get(self, h):
+        """Return the (visits, best outcome) of a position, or None if it is
+        not in the store."""
+        slot, found = self._find(h)
+        if not found:
+            return None
+        return int(self.visits[slot]), float(self.best[slot])
+
+    def packed_rows(self, h):
+        """Return the bit-packed playfield rows of a position, or None."""
+        slot, found = self._find(h)
+        return self.rows[slot].copy() if found else None
+
+    def save(self, path):
+        """Write the store to a .npz file."""
+        np.savez(path, keys=self.keys, rows=self.rows, visits=self.visits,
+                 best=self.best, probe=self.probe, evictions=self.evictions)
+
+    @classmethod
+    def load(cls, path):
+        """Read a store written by save."""
+        data = np.load(path)
+        store = cls(len(data['keys']), int(data['probe']))
+        store.keys[:] = data['keys']
+        store.rows[:] = data['rows']
+        store.visits[:] = data['visits']
+        store.best[:] = data['best']
+        store.size = int(np.count_nonzero(store.keys))
+        store.evictions = int(data['evictions'])
+        return store